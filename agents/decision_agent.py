@@ -4,15 +4,17 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import asyncio
 import json
-from typing import Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 from dataclasses import dataclass
 
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
-
 from utils.apis import Qwen3_235B_A22B
+from utils.retry import DECISION_RETRY_POLICY, RetryPolicy
+
+# langchain 导入较慢，在创建LLM客户端、构造消息时才导入
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
 
-@dataclass
+@dataclass(slots=True)
 class WarehouseInfo:
     """仓库信息数据类"""
     name: str
@@ -24,7 +26,7 @@ class WarehouseInfo:
     travel_time_to_incident: Optional[int] = None
     travel_time_to_departure: Optional[int] = None
 
-@dataclass
+@dataclass(slots=True)
 class BattlePlan:
     """作战计划数据类"""
     plan_id: str
@@ -37,23 +39,31 @@ class BattlePlan:
     estimated_time: int
     special_instructions: str
 
+def create_decision_llm() -> "ChatOpenAI":
+    """创建决策代理使用的LLM客户端（可在多个DecisionAgent之间共享连接池）"""
+    from langchain_openai import ChatOpenAI
+    
+    # 初始化Qwen模型（开启思考模式）
+    qwen_config = Qwen3_235B_A22B()
+    return ChatOpenAI(
+        openai_api_base=qwen_config.api_base,
+        openai_api_key=qwen_config.api_key,
+        model_name=qwen_config.model,
+        temperature=0.2,  # 稍高的温度以增加创造性
+        max_tokens=8000,  # 更大的token限制用于详细规划
+        streaming=True,
+        extra_body={
+            "enable_thinking": True,  # 开启思考模式
+        }
+    )
+
 class DecisionAgent:
     """基于Qwen3-235B-A22B的作战决策智能代理"""
     
-    def __init__(self):
-        # 初始化Qwen模型（开启思考模式）
-        qwen_config = Qwen3_235B_A22B()
-        self.llm = ChatOpenAI(
-            openai_api_base=qwen_config.api_base,
-            openai_api_key=qwen_config.api_key,
-            model_name=qwen_config.model,
-            temperature=0.2,  # 稍高的温度以增加创造性
-            max_tokens=8000,  # 更大的token限制用于详细规划
-            streaming=True,
-            extra_body={
-                "enable_thinking": True,  # 开启思考模式
-            }
-        )
+    def __init__(self, llm: Optional["ChatOpenAI"] = None, retry_policy: Optional[RetryPolicy] = None):
+        # 复用外部传入的LLM客户端，避免每次决策重新建立连接
+        self.llm = llm if llm is not None else create_decision_llm()
+        self.retry_policy = retry_policy or DECISION_RETRY_POLICY
         
         # 消息历史
         self.messages = []
@@ -63,6 +73,8 @@ class DecisionAgent:
     
     def _initialize_system_prompt(self):
         """初始化系统提示"""
+        from langchain_core.messages import SystemMessage
+        
         system_prompt = """
 你是一个专业的消防应急作战决策专家，具备丰富的火灾扑救和应急救援经验。你的任务是基于提供的信息制定科学、高效的作战规划。
 
@@ -142,12 +154,17 @@ class DecisionAgent:
 """
         
         # 调用LLM进行分析
-        self.messages.append(HumanMessage(content=analysis_prompt))
-        response = await self.llm.ainvoke(self.messages)
-        
-        # 保存响应到消息历史
-        self.messages.append(response)
+        return await self._invoke_llm(analysis_prompt, 'llm.analyze_situation')
+    
+    async def _invoke_llm(self, prompt: str, operation: str, llm=None, retry_policy: Optional[RetryPolicy] = None) -> str:
+        """按重试策略调用LLM，成功后将提示和回复写入消息历史"""
+        from langchain_core.messages import HumanMessage
         
+        llm = llm or self.llm
+        policy = retry_policy or self.retry_policy
+        messages = self.messages + [HumanMessage(content=prompt)]
+        response, _ = await policy.run(operation, lambda: llm.ainvoke(messages))
+        self.messages = messages + [response]
         return response.content
     
     def _format_distances(self, distances: Dict) -> str:
@@ -160,7 +177,10 @@ class DecisionAgent:
             if isinstance(info, dict):
                 distance = info.get('distance', '未知')
                 time = info.get('time', '未知')
-                formatted.append(f"- {warehouse}：{distance}公里，预计{time}分钟")
+                line = f"- {warehouse}：{distance}公里，预计{time}分钟"
+                if info.get('estimated'):
+                    line += "（地图服务不可用，按直线距离估算）"
+                formatted.append(line)
             else:
                 formatted.append(f"- {warehouse}：{info}")
         
@@ -190,13 +210,9 @@ class DecisionAgent:
 请以JSON格式输出方案列表。
 """
         
-        self.messages.append(HumanMessage(content=plans_prompt))
-        response = await self.llm.ainvoke(self.messages)
-        self.messages.append(response)
-        
         # 这里可以添加JSON解析逻辑来创建BattlePlan对象
         # 目前返回文本格式
-        return response.content
+        return await self._invoke_llm(plans_prompt, 'llm.generate_battle_plans')
     
     async def optimize_resource_allocation(self, 
                                          battle_plans: str,
@@ -225,11 +241,7 @@ class DecisionAgent:
 - 风险控制措施
 """
         
-        self.messages.append(HumanMessage(content=optimization_prompt))
-        response = await self.llm.ainvoke(self.messages)
-        self.messages.append(response)
-        
-        return response.content
+        return await self._invoke_llm(optimization_prompt, 'llm.optimize_resource_allocation')
     
     async def format_command_output(self, 
                                    analysis: str, 
@@ -294,11 +306,7 @@ class DecisionAgent:
 请确保方案具有可操作性和实用性。
 """
         
-        self.messages.append(HumanMessage(content=format_prompt))
-        response = await self.llm.ainvoke(self.messages)
-        self.messages.append(response)
-        
-        return response.content
+        return await self._invoke_llm(format_prompt, 'llm.format_command_output')
     
     async def make_decision(self, 
                            incident_location: str,
@@ -308,12 +316,39 @@ class DecisionAgent:
                            fire_description: str,
                            warehouse_distances: Dict,
                            warehouse_info: str,
-                           inter_warehouse_distances: str) -> str:
-        """简化的决策方法，专注于物资获取和路径规划"""
+                           inter_warehouse_distances: str,
+                           route_options_text: Optional[str] = None,
+                           timeline_text: Optional[str] = None,
+                           thinking_budget: Optional[int] = None,
+                           retry_policy: Optional[RetryPolicy] = None,
+                           raise_on_error: bool = False) -> str:
+        """简化的决策方法，专注于物资获取和路径规划
+        
+        Args:
+            thinking_budget: 可选的思考token上限，时间紧迫时用于缩短思考过程
+            route_options_text: 可选的取物资仓库组合（build_route_options 精确计算的最佳组合及访问顺序）
+            timeline_text: 可选的参考时间线（build_reference_timeline 模拟结果），提供时直接作为作战时间节点
+            retry_policy: 可选的重试策略（如限定单次超时），默认使用代理的策略
+            raise_on_error: 为True时向调用方抛出异常，而不是返回错误文本
+        """
         
         try:
             print("[决策代理] 正在生成物资获取和路径规划方案...")
             
+            if timeline_text:
+                timeline_section = ("以下时间节点由调度程序按距离和装载时间精确计算，请直接采用，"
+                                    "如调整车辆分配请保持同样的计算方法：\n" + timeline_text)
+            else:
+                timeline_section = """- T+0分钟：队伍出发
+- T+X分钟：到达仓库开始装载（严格按照"出发地点到各仓库距离"的时间）
+- T+X分钟：完成装载前往现场
+- T+X分钟：到达现场开始救援（严格按照"事发地点到各仓库距离"的时间）"""
+            
+            route_options_section = ""
+            if route_options_text:
+                route_options_section = ("\n### 取物资仓库组合（调度程序按上述距离对全部组合精确计算，请优先从中选择）：\n"
+                                         + route_options_text + "\n")
+            
             # 构建简化的决策提示
             decision_prompt = f"""
 请根据以下信息，制定详细的消防作战指挥方案：
@@ -339,7 +374,7 @@ class DecisionAgent:
 
 ### 仓库间距离：
 {inter_warehouse_distances}
-
+{route_options_section}
 请按以下格式提供详细的作战指挥方案：
 
 **重要提醒：请严格按照上述提供的距离信息来计算时间，不要随意估算！**
@@ -378,22 +413,23 @@ class DecisionAgent:
 - **建议调配**：从总部或其他支队调配XX资源
 
 ## 四、作战时间节点
-- T+0分钟：队伍出发
-- T+X分钟：到达仓库开始装载（严格按照"出发地点到各仓库距离"的时间）
-- T+X分钟：完成装载前往现场
-- T+X分钟：到达现场开始救援（严格按照"事发地点到各仓库距离"的时间）
+{timeline_section}
 
 **请务必使用上述提供的准确距离和时间信息，不要自行估算或使用不合理的时间（如0分钟、1分钟等）。**
 """
             
             # 调用LLM生成方案
-            self.messages.append(HumanMessage(content=decision_prompt))
-            response = await self.llm.ainvoke(self.messages)
-            self.messages.append(response)
-            
-            return response.content
+            llm = self.llm
+            if thinking_budget is not None:
+                llm = self.llm.bind(extra_body={
+                    "enable_thinking": True,
+                    "thinking_budget": thinking_budget
+                })
+            return await self._invoke_llm(decision_prompt, 'llm.decision', llm=llm, retry_policy=retry_policy)
             
         except Exception as e:
+            if raise_on_error:
+                raise
             error_msg = f"决策过程中发生错误: {str(e)}"
             print(error_msg)
             return error_msg
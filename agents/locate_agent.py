@@ -4,44 +4,99 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import asyncio
 import json
-import re
-from typing import Optional
+import time
+from collections import deque
+from dataclasses import dataclass, field, replace
+from typing import TYPE_CHECKING, List, Optional, Tuple
 from contextlib import AsyncExitStack
 
-from mcp import ClientSession
-from mcp.client.sse import sse_client
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
-
 from utils.apis import Qwen3_235B_A22B
+from utils.retry import latency_registry
+from utils.tool_results import MAX_TOOL_RESULT_CHARS, compact_tool_result, format_route, route_measurement
+
+# mcp 和 langchain 导入较慢，在真正建立连接、调用模型时才导入
+if TYPE_CHECKING:
+    from mcp import ClientSession
+
+@dataclass(frozen=True)
+class ToolLoopBudget:
+    """单次查询的工具循环预算：最多max_steps轮工具调用，每次模型调用和工具调用各自限时（秒），
+    每个工具结果交给模型时最多result_chars个字符"""
+    max_steps: int = 6
+    llm_timeout: Optional[float] = 30.0
+    tool_timeout: Optional[float] = 15.0
+    result_chars: int = MAX_TOOL_RESULT_CHARS
+
+    def with_options(self, **changes) -> "ToolLoopBudget":
+        """返回修改部分参数后的新预算"""
+        return replace(self, **changes)
+
+DEFAULT_TOOL_BUDGET = ToolLoopBudget()
+
+@dataclass
+class QueryResult:
+    """process_query(detailed=True) 的结果
 
-def format_tools_for_llm(tool) -> str:
-    """对tool进行格式化"""
-    args_desc = []
-    if "properties" in tool.inputSchema:
-        for param_name, param_info in tool.inputSchema["properties"].items():
-            arg_desc = (
-                f"- {param_name}: {param_info.get('description', 'No description')}"
-            )
-            if param_name in tool.inputSchema.get("required", []):
-                arg_desc += " (required)"
-            args_desc.append(arg_desc)
-    return f"Tool: {tool.name}\nDescription: {tool.description}\nArguments:\n{chr(10).join(args_desc)}"
+    stop_reason: answered（模型给出最终回复）、route（路线工具已返回距离和时间，见stop_on_route）、
+    max_steps（工具轮数用尽）、llm_timeout、error；未完成时 text 为已获得的工具结果汇总，供调用方尽量提取信息。
+    route 为第一个成功的路线工具结果中的 (距离米, 时间秒)，直接取自工具返回的JSON。
+    """
+    text: str
+    complete: bool
+    stop_reason: str
+    steps: int = 0
+    llm_calls: int = 0
+    tool_calls: int = 0
+    llm_seconds: List[float] = field(default_factory=list)
+    tool_seconds: List[tuple] = field(default_factory=list)  # [(工具名, 秒, 状态), ...]
+    tool_results: List[tuple] = field(default_factory=list)  # [(工具名, 参数, 交给模型的结果文本), ...]
+    raw_results: List[tuple] = field(default_factory=list)  # [(工具名, 原始结果文本), ...]，仅用于调试
+    route: Optional[Tuple[float, float]] = None
+    total_seconds: float = 0.0
+
+    def stats(self) -> dict:
+        """步数与各步耗时（秒）"""
+        return {
+            'stop_reason': self.stop_reason,
+            'steps': self.steps,
+            'llm_calls': self.llm_calls,
+            'tool_calls': self.tool_calls,
+            'llm_seconds': [round(seconds, 3) for seconds in self.llm_seconds],
+            'tool_seconds': [(name, round(seconds, 3), status) for name, seconds, status in self.tool_seconds],
+            'total_seconds': round(self.total_seconds, 3)
+        }
+
+def tool_to_function_schema(tool) -> dict:
+    """MCP工具描述转换为OpenAI兼容的函数调用格式（供 bind_tools 使用）"""
+    parameters = dict(tool.inputSchema or {})
+    parameters.setdefault("type", "object")
+    parameters.setdefault("properties", {})
+    return {
+        "type": "function",
+        "function": {
+            "name": tool.name,
+            "description": tool.description or "",
+            "parameters": parameters
+        }
+    }
 
 class LocationAgent:
     """基于Qwen3-235B-A22B的地图定位智能代理"""
     
-    def __init__(self, server_config_path="configs/servers_config.json"):
+    def __init__(self, server_config_path="configs/servers_config.json", budget: Optional[ToolLoopBudget] = None):
+        self.budget = budget or DEFAULT_TOOL_BUDGET
+        
         # 加载服务器配置
         with open(server_config_path) as f:
             self.server_config = json.load(f)
         
         # MCP连接相关
         self._exit_stack: Optional[AsyncExitStack] = None
-        self.session: Optional[ClientSession] = None
+        self.session: Optional["ClientSession"] = None
         self.tools = {}
         
         # 初始化Qwen模型
+        from langchain_openai import ChatOpenAI
         qwen_config = Qwen3_235B_A22B()
         self.llm = ChatOpenAI(
             openai_api_base=qwen_config.api_base,
@@ -55,11 +110,21 @@ class LocationAgent:
             }
         )
         
+        # 绑定MCP工具后的模型（连接后创建），工具调用走OpenAI兼容的函数调用接口
+        self.llm_with_tools = None
+        
         # 消息历史
         self.messages = []
+        
+        # 最近的原始工具结果（调试用旁路，不进入对话历史）
+        self.raw_tool_results = deque(maxlen=20)
     
     async def connect_to_amap_server(self):
         """连接到高德地图MCP服务器"""
+        from mcp import ClientSession
+        from mcp.client.sse import sse_client
+        from langchain_core.messages import SystemMessage
+        
         url = self.server_config["mcpServers"]["amap-amap-sse"]["url"]
         print(f"尝试连接到: {url}")
         
@@ -83,12 +148,16 @@ class LocationAgent:
             print(f"  - {name}: {tool.description[:50]}...")
         print("连接成功并准备就绪。")
         
+        # 工具以函数调用方式绑定到模型，允许一轮中并行调用多个工具
+        self.llm_with_tools = self.llm.bind_tools(
+            [tool_to_function_schema(tool) for tool in response.tools],
+            parallel_tool_calls=True
+        )
+        
         # 设置系统提示
-        tools_description = "\n".join([format_tools_for_llm(tool) for tool in response.tools])
         system_prompt = (
-            "You are a helpful assistant specialized in Chengdu, China with access to these tools:\n\n"
-            f"{tools_description}\n"
-            "Choose the appropriate tool based on the user's question. "
+            "You are a helpful assistant specialized in Chengdu, China with access to map tools. "
+            "Choose the appropriate tools based on the user's question. "
             "If no tool is needed, reply directly.\n\n"
             "IMPORTANT LOCATION CONTEXT:\n"
             "- You are specifically designed to help with locations in Chengdu, Sichuan Province, China\n"
@@ -96,34 +165,22 @@ class LocationAgent:
             "- For ambiguous place names that exist in multiple cities, prioritize Chengdu locations\n"
             "- Always provide responses in Chinese unless specifically requested otherwise\n\n"
             "CRITICAL TOOL USAGE STRATEGY:\n"
-            "For route planning queries (A到B怎么走, A到B出行), you MUST follow this EXACT sequence:\n"
-            "1. First call: maps_geo with origin location name\n"
-            "2. Second call: maps_geo with destination location name\n"
-            "3. Third call: maps_direction_transit_integrated with the coordinates from steps 1&2\n"
-            "\n"
-            "EXAMPLE for '文化宫到省骨科医院':\n"
-            "Step 1: {\"tool\": \"maps_geo\", \"arguments\": {\"address\": \"文化宫\"}}\n"
-            "Step 2: {\"tool\": \"maps_geo\", \"arguments\": {\"address\": \"省骨科医院\"}}\n"
-            "Step 3: {\"tool\": \"maps_direction_transit_integrated\", \"arguments\": {\"origin\": \"lat1,lng1\", \"destination\": \"lat2,lng2\"}}\n"
-            "\n"
-            "NEVER skip the coordinate lookup steps. ALWAYS get coordinates for BOTH locations first.\n\n"
-            "IMPORTANT: When you need to use a tool, you must ONLY respond with "
-            "the exact JSON object format below, nothing else:\n"
-            "{\n"
-            '    "tool": "tool-name",\n'
-            '    "arguments": {\n'
-            '        "argument-name": "value"\n'
-            "    }\n"
-            "}\n\n"
-            '"```json" is not allowed\n'
-            "After receiving a tool's response:\n"
+            "For route planning queries (A到B怎么走, A到B出行, A到B的距离):\n"
+            "1. If a location is given as a place name, call maps_geo for it. When BOTH locations are names, "
+            "call maps_geo for both IN THE SAME TURN (two parallel tool calls), never one per turn.\n"
+            "2. Once both coordinates are known, call the direction tool (maps_direction_driving for vehicles) "
+            "with origin and destination as \"longitude,latitude\".\n"
+            "3. If both locations are already given as \"longitude,latitude\" coordinates, skip maps_geo and "
+            "call the direction tool directly in the first turn.\n"
+            "Independent tool calls must always be issued together in one turn.\n\n"
+            "After receiving the tools' responses:\n"
             "1. Transform the raw data into a natural, conversational response\n"
             "2. Keep responses concise but informative\n"
-            "3. Focus on the most relevant information\n"
+            "3. Focus on the most relevant information; for routes always state the distance and the duration\n"
             "4. Use appropriate context from the user's question\n"
             "5. Avoid simply repeating the raw data\n"
             "6. When providing location information, prioritize Chengdu-based results\n\n"
-            "Please use only the tools that are explicitly defined above."
+            "Please use only the tools that are provided."
         )
         self.messages.append(SystemMessage(content=system_prompt))
     
@@ -132,76 +189,194 @@ class LocationAgent:
         if self._exit_stack:
             await self._exit_stack.aclose()
             print("MCP连接已断开")
+        # 会话关闭后不能再使用，ping/probe 据此直接返回False
+        self.session = None
+    
+    async def ping(self, timeout: float = 5.0) -> bool:
+        """检查MCP会话是否存活"""
+        if self.session is None:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout)
+            return True
+        except Exception as e:
+            print(f"MCP健康检查失败: {e}")
+            return False
     
-    async def call_llm(self, prompt, role="user"):
-        """调用LLM"""
+    async def probe(self) -> bool:
+        """探测地图服务是否可用（直接调用MCP工具，不经过LLM）"""
+        if self.session is None:
+            return False
+        if "maps_geo" in self.tools:
+            result = await self.session.call_tool("maps_geo", {"address": "天府广场", "city": "成都"})
+            return not getattr(result, "isError", False)
+        await self.session.list_tools()
+        return True
+    
+    def reset_conversation(self):
+        """重置对话历史（保留系统提示）"""
+        self.messages = self.messages[:1]
+    
+    async def call_llm(self, prompt, role="user", messages=None):
+        """调用LLM（不带工具），返回回复文本
+        
+        Args:
+            messages: 可选的消息历史列表，默认使用代理自身的对话历史
+        """
+        from langchain_core.messages import HumanMessage, SystemMessage
+        
+        if messages is None:
+            messages = self.messages
         if role == "user":
-            self.messages.append(HumanMessage(content=prompt))
+            messages.append(HumanMessage(content=prompt))
         else:
-            self.messages.append(SystemMessage(content=prompt))
+            messages.append(SystemMessage(content=prompt))
         
-        response = await self.llm.ainvoke(self.messages)
-        llm_response = response.content
-        return llm_response
+        response = await self.llm.ainvoke(messages)
+        messages.append(response)
+        return response.content
     
-    async def call_tool(self, llm_response: str):
-        """调用工具"""
+    async def call_tool(self, name: str, arguments: dict, timeout: Optional[float] = None, record=None,
+                        max_chars: Optional[int] = None) -> str:
+        """调用一个MCP工具，返回交给模型的结果文本（超时或出错时返回错误说明）
+        
+        结果按工具只保留模型需要的字段（compact_tool_result），原始结果记入 raw_tool_results 和 record。
+        
+        Args:
+            timeout: 单次调用的超时（秒），默认使用代理的工具循环预算
+            record: 可选的 QueryResult，记录调用耗时和结果
+            max_chars: 结果文本的长度上限，默认使用代理的工具循环预算
+        """
+        if name not in self.tools:
+            return f"No server found with tool: {name}"
+        timeout = self.budget.tool_timeout if timeout is None else timeout
+        histogram = latency_registry.get(f"location.tool.{name}")
+        started = time.perf_counter()
+        status = 'ok'
         try:
-            # 移除可能的 ```json 标记
-            pattern = r"```json\n(.*?)\n?```"
-            match = re.search(pattern, llm_response, re.DOTALL)
-            if match:
-                llm_response = match.group(1)
-            
-            # 解析工具调用
-            tool_call = json.loads(llm_response)
-            if "tool" in tool_call and "arguments" in tool_call:
-                response = await self.session.list_tools()
-                tools = response.tools
-                if any(tool.name == tool_call["tool"] for tool in tools):
-                    try:
-                        print(f"[提示]：正在调用工具 {tool_call['tool']}")
-                        result = await self.session.call_tool(
-                            tool_call["tool"], tool_call["arguments"]
-                        )
-                        # 处理进度信息
-                        if isinstance(result, dict) and "progress" in result:
-                            progress = result["progress"]
-                            total = result["total"]
-                            percentage = (progress / total) * 100
-                            print(f"Progress: {progress}/{total} ({percentage:.1f}%)")
-                        return f"Tool execution result: {result}"
-                    except Exception as e:
-                        error_msg = f"Error executing tool: {str(e)}"
-                        print(error_msg)
-                        return error_msg
-                return f"No server found with tool: {tool_call['tool']}"
-            return llm_response
-        except json.JSONDecodeError:
-            return llm_response
+            print(f"[提示]：正在调用工具 {name}")
+            result = await asyncio.wait_for(self.session.call_tool(name, arguments), timeout)
+            histogram.observe(time.perf_counter() - started)
+            text, raw = compact_tool_result(name, result, max_chars or self.budget.result_chars)
+            self.raw_tool_results.append((name, arguments, raw))
+            if getattr(result, "isError", False):
+                histogram.errors += 1
+                status = 'error'
+            if record is not None:
+                record.raw_results.append((name, raw))
+                if status == 'ok' and record.route is None:
+                    record.route = route_measurement(name, raw)
+        except asyncio.TimeoutError:
+            histogram.timeouts += 1
+            status = 'timeout'
+            text = f"Error executing tool: {name} 超过 {timeout} 秒未返回"
+            print(text)
+        except Exception as e:
+            histogram.errors += 1
+            status = 'error'
+            text = f"Error executing tool: {str(e)}"
+            print(text)
+        if record is not None:
+            record.tool_calls += 1
+            record.tool_seconds.append((name, time.perf_counter() - started, status))
+            record.tool_results.append((name, arguments, text))
+        return text
+    
+    async def run_tool_calls(self, tool_calls, timeout: Optional[float] = None, record=None,
+                             max_chars: Optional[int] = None) -> list:
+        """并发执行模型在同一轮中发出的全部工具调用，按原顺序返回 ToolMessage"""
+        from langchain_core.messages import ToolMessage
+        
+        results = await asyncio.gather(*(
+            self.call_tool(tool_call["name"], tool_call.get("args") or {}, timeout, record, max_chars)
+            for tool_call in tool_calls
+        ))
+        return [
+            ToolMessage(content=result, tool_call_id=tool_call["id"], name=tool_call["name"])
+            for tool_call, result in zip(tool_calls, results)
+        ]
     
-    async def process_query(self, user_query: str) -> str:
-        """处理用户查询的主要方法"""
+    async def process_query(self, user_query: str, isolated: bool = False,
+                            budget: Optional[ToolLoopBudget] = None, detailed: bool = False,
+                            stop_on_route: bool = False):
+        """处理用户查询的主要方法
+        
+        模型通过函数调用接口请求工具；同一轮中的多个工具调用（如起点、终点的地理编码）并发执行，
+        结果全部返回后再进入下一轮，直到模型给出不含工具调用的回复。工具轮数、每次模型调用和
+        工具调用的耗时受 budget 限制，预算用尽时返回已获得的工具结果（部分结果），不会无限循环。
+        
+        Args:
+            isolated: 为True时只基于系统提示处理本次查询，不读写共享的对话历史，
+                      同一代理上的多个独立查询（如重试、对冲请求）可以安全并发执行
+            budget: 本次查询的工具循环预算，默认使用代理的预算
+            detailed: 为True时返回 QueryResult（含是否完成、步数和各步耗时），否则返回回复文本
+            stop_on_route: 为True时路线工具一返回距离和时间就结束（不再让模型转述结果），
+                           text 为由数值生成的 "距离X公里，预计时间N分钟"，数值见 QueryResult.route
+        """
+        from langchain_core.messages import HumanMessage
+        
+        budget = budget or self.budget
+        messages = self.messages[:1] if isolated else self.messages
+        llm = self.llm_with_tools or self.llm
+        record = QueryResult(text="", complete=False, stop_reason="error")
+        started = time.perf_counter()
+        llm_histogram = latency_registry.get("location.llm")
         try:
-            # 调用LLM分析查询
-            response = await self.call_llm(user_query)
-            self.messages.append(HumanMessage(content=response))
-            
-            # 尝试调用工具
-            result = await self.call_tool(response)
-            
-            # 如果工具调用返回了不同的结果，继续对话
-            while result != response:
-                response = await self.call_llm(result, "system")
-                self.messages.append(HumanMessage(content=response))
-                result = await self.call_tool(response)
-            
-            return response
-            
+            messages.append(HumanMessage(content=user_query))
+            while True:
+                step_start = time.perf_counter()
+                try:
+                    response = await asyncio.wait_for(llm.ainvoke(messages), budget.llm_timeout)
+                except asyncio.TimeoutError:
+                    llm_histogram.timeouts += 1
+                    record.stop_reason = "llm_timeout"
+                    break
+                record.llm_calls += 1
+                record.llm_seconds.append(time.perf_counter() - step_start)
+                llm_histogram.observe(record.llm_seconds[-1])
+                messages.append(response)
+                
+                tool_calls = getattr(response, "tool_calls", None)
+                if not tool_calls:
+                    record.text, record.complete, record.stop_reason = response.content, True, "answered"
+                    break
+                if record.steps >= budget.max_steps:
+                    # 未执行的工具调用不留在对话历史中（否则后续请求缺少对应的工具结果）
+                    messages.pop()
+                    record.stop_reason = "max_steps"
+                    break
+                record.steps += 1
+                messages.extend(await self.run_tool_calls(tool_calls, budget.tool_timeout, record, budget.result_chars))
+                if stop_on_route and record.route is not None:
+                    distance, duration = format_route(*record.route)
+                    record.text, record.complete, record.stop_reason = f"距离{distance}，预计时间{duration}", True, "route"
+                    break
+        
         except Exception as e:
-            error_msg = f"处理查询时发生错误: {str(e)}"
-            print(error_msg)
-            return error_msg
+            record.text = f"处理查询时发生错误: {str(e)}"
+            print(record.text)
+        
+        record.total_seconds = time.perf_counter() - started
+        query_histogram = latency_registry.get("location.query")
+        if record.complete:
+            query_histogram.observe(record.total_seconds)
+        elif record.stop_reason != "error":
+            # 预算用尽：返回已获得的工具结果，并打印步数和耗时便于排查
+            query_histogram.timeouts += 1
+            record.text = self._partial_text(record)
+            print(f"[地图代理] 查询未完成（{record.stop_reason}）: {user_query} {record.stats()}")
+        else:
+            query_histogram.errors += 1
+        return record if detailed else record.text
+    
+    @staticmethod
+    def _partial_text(record: QueryResult) -> str:
+        """预算用尽时的部分结果：按调用顺序列出已获得的工具结果"""
+        reason = {"max_steps": f"工具调用超过 {record.steps} 轮", "llm_timeout": "模型响应超时"}[record.stop_reason]
+        lines = [f"查询未完成（{reason}），已获得的工具结果："]
+        lines += [f"- {name} {json.dumps(arguments, ensure_ascii=False)}: {text}"
+                  for name, arguments, text in record.tool_results]
+        return "\n".join(lines)
     
     async def interactive_mode(self):
         """交互模式"""
@@ -231,9 +406,10 @@ class LocationAgent:
                 continue
 
 # 便捷函数
-async def create_location_agent(server_config_path="configs/servers_config.json") -> LocationAgent:
+async def create_location_agent(server_config_path="configs/servers_config.json",
+                                budget: Optional[ToolLoopBudget] = None) -> LocationAgent:
     """创建并初始化地图定位代理"""
-    agent = LocationAgent(server_config_path)
+    agent = LocationAgent(server_config_path, budget)
     await agent.connect_to_amap_server()
     return agent
 
@@ -6,300 +6,95 @@
 
 import sys
 import os
-import asyncio
+import queue
 import streamlit as st
-import re
-import pandas as pd
 from datetime import datetime
 
 # 添加项目根目录到路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from agents.locate_agent import create_location_agent
-from utils.utils import read_warehouse_data_from_xlsx
+from utils.runtime import create_dispatch_runtime
+from utils.utils import load_warehouse_data
+from utils.geo import DEFAULT_TRAVEL_ESTIMATOR
+from utils.dispatch import (
+    calculate_distances_to_warehouses,
+    analyze_fire_impact,
+    build_warehouse_distances,
+    build_reference_timeline,
+    build_route_options,
+    nearest_warehouse,
+    run_anytime_dispatch
+)
 
-def is_coordinates(location_str):
-    """检测输入是否为经纬度格式"""
-    coord_pattern = r'^\s*(-?\d+\.?\d*)\s*,\s*(-?\d+\.?\d*)\s*$'
-    return bool(re.match(coord_pattern, location_str.strip()))
+@st.cache_resource
+def get_dispatch_runtime():
+    """进程级共享的调度运行时（后台事件循环 + 预连接的代理），只创建一次
 
-async def get_location_coordinates(agent, location_name):
-    """获取地点的经纬度坐标"""
-    try:
-        query = f"请提供{location_name}的经纬度坐标"
-        response = await agent.process_query(query)
-        
-        coord_pattern = r'(-?\d+\.\d+)\s*,\s*(-?\d+\.\d+)'
-        match = re.search(coord_pattern, response)
-        
-        if match:
-            longitude = match.group(1)
-            latitude = match.group(2)
-            return f"{longitude},{latitude}"
-        else:
-            return location_name
-    except Exception as e:
-        st.error(f"获取{location_name}坐标时出错: {e}")
-        return location_name
-
-def parse_distance_info(response_text):
-    """解析距离信息，提取关键数据"""
-    if not response_text:
-        return {
-            'distance': '无响应',
-            'duration': '无响应',
-            'success': False,
-            'raw_response': '空响应'
-        }
-    
-    # 尝试多种距离格式
-    distance_patterns = [
-        r'(\d+\.?\d*)公里',
-        r'(\d+\.?\d*)\s*km',
-        r'(\d+\.?\d*)米',
-        r'(\d+\.?\d*)\s*m(?!in)',  # 匹配米但不匹配min
-        r'距离[：:]?\s*(\d+\.?\d*)\s*公里',
-        r'距离[：:]?\s*(\d+\.?\d*)\s*km',
-        r'距离[：:]?\s*(\d+\.?\d*)\s*米',
-        r'约\s*(\d+\.?\d*)\s*公里',
-        r'约\s*(\d+\.?\d*)\s*米',
-        r'大约\s*(\d+\.?\d*)\s*公里',
-        r'大约\s*(\d+\.?\d*)\s*米'
-    ]
-    
-    # 尝试多种时间格式，包括小时、分钟和秒
-    time_patterns = [
-        r'(\d+)分钟',
-        r'(\d+)\s*分钟',
-        r'(\d+)小时(\d+)分钟',
-        r'(\d+)\s*小时\s*(\d+)\s*分钟',
-        r'(\d+)秒',
-        r'(\d+)\s*秒',
-        r'时间[：:]?\s*(\d+)\s*分钟',
-        r'时间[：:]?\s*(\d+)\s*秒',
-        r'需要[：:]?\s*(\d+)\s*分钟',
-        r'需要[：:]?\s*(\d+)\s*秒',
-        r'约\s*(\d+)\s*分钟',
-        r'约\s*(\d+)\s*秒',
-        r'大约\s*(\d+)\s*分钟',
-        r'大约\s*(\d+)\s*秒',
-        r'耗时[：:]?\s*(\d+)\s*分钟',
-        r'耗时[：:]?\s*(\d+)\s*秒',
-        r'用时[：:]?\s*(\d+)\s*分钟',
-        r'用时[：:]?\s*(\d+)\s*秒'
-    ]
-    
-    distance_match = None
-    time_match = None
-    parsed_time = None
-    
-    # 尝试匹配距离
-    for pattern in distance_patterns:
-        distance_match = re.search(pattern, response_text)
-        if distance_match:
-            break
-    
-    # 处理距离单位转换
-    parsed_distance = None
-    if distance_match:
-        distance_value = float(distance_match.group(1))
-        # 检查是否为米单位
-        if '米' in pattern or 'm(?!in)' in pattern:
-            # 将米转换为公里
-            distance_value = distance_value / 1000
-            parsed_distance = f"{distance_value:.2f}公里"
-        else:
-            parsed_distance = f"{distance_value}公里"
-    
-    # 尝试匹配时间
-    for pattern in time_patterns:
-        time_match = re.search(pattern, response_text)
-        if time_match:
-            # 处理小时+分钟格式
-            if '小时' in pattern and len(time_match.groups()) >= 2:
-                hours = int(time_match.group(1))
-                minutes = int(time_match.group(2))
-                total_minutes = hours * 60 + minutes
-                parsed_time = f"{total_minutes}分钟"
-            # 处理秒转分钟格式
-            elif '秒' in pattern:
-                seconds = int(time_match.group(1))
-                minutes = round(seconds / 60)
-                parsed_time = f"{minutes}分钟"
-            else:
-                parsed_time = f"{time_match.group(1)}分钟"
-            break
-    
-    # 如果没有找到标准格式，尝试查找数字+时间单位的组合
-    if not time_match:
-        # 查找任何数字后跟时间相关词汇
-        fallback_time_pattern = r'(\d+)(?:分钟|小时|秒|min|hour|sec|h|m|s)'
-        fallback_match = re.search(fallback_time_pattern, response_text, re.IGNORECASE)
-        if fallback_match:
-            # 检查是否为秒单位
-            if '秒' in fallback_match.group(0) or 'sec' in fallback_match.group(0).lower() or fallback_match.group(0).endswith('s'):
-                seconds = int(fallback_match.group(1))
-                minutes = round(seconds / 60)
-                parsed_time = f"{minutes}分钟"
-            else:
-                parsed_time = f"{fallback_match.group(1)}分钟"
-            time_match = fallback_match
-    
-    if distance_match and time_match:
-        return {
-            'distance': parsed_distance,
-            'duration': parsed_time or f"{time_match.group(1)}分钟",
-            'success': True
-        }
-    elif distance_match:
-        return {
-            'distance': parsed_distance,
-            'duration': '时间未知',
-            'success': True
-        }
-    else:
-        return {
-            'distance': '解析失败',
-            'duration': '解析失败',
-            'success': False,
-            'raw_response': response_text,
-            'debug_info': f"响应长度: {len(response_text)}, 前200字符: {response_text[:200]}",
-            'distance_patterns_tried': len(distance_patterns),
-            'time_patterns_tried': len(time_patterns)
-        }
-
-async def calculate_single_warehouse_distance(agent, user_location, warehouse, max_retries=3):
-    """计算单个仓库的距离，支持重试机制"""
-    warehouse_lng = warehouse['location']['longitude']
-    warehouse_lat = warehouse['location']['latitude']
-    warehouse_location = f"{warehouse_lng},{warehouse_lat}"
-    warehouse_address = warehouse['location']['address']
-    
-    query = f"从{user_location}到{warehouse_location}的车辆行驶距离"
-    
-    for attempt in range(max_retries):
-        try:
-            response = await agent.process_query(query)
-            parsed_info = parse_distance_info(response)
-            
-            if parsed_info['success']:
-                return {
-                    'warehouse_name': warehouse['name'],
-                    'warehouse_address': warehouse_address,
-                    'warehouse_coordinates': warehouse_location,
-                    'origin': user_location,
-                    'destination': f"{warehouse_address} ({warehouse_location})",
-                    'distance': parsed_info['distance'],
-                    'duration': parsed_info['duration'],
-                    'success': True,
-                    'attempts': attempt + 1
-                }
-            else:
-                if attempt == max_retries - 1:
-                    return {
-                        'warehouse_name': warehouse['name'],
-                        'warehouse_address': warehouse_address,
-                        'warehouse_coordinates': warehouse_location,
-                        'origin': user_location,
-                        'destination': f"{warehouse_address} ({warehouse_location})",
-                        'distance': '解析失败',
-                        'duration': '解析失败',
-                        'success': False,
-                        'attempts': attempt + 1,
-                        'raw_response': response
-                    }
-        except Exception as e:
-            if attempt == max_retries - 1:
-                return {
-                    'warehouse_name': warehouse['name'],
-                    'warehouse_address': warehouse_address,
-                    'warehouse_coordinates': warehouse_location,
-                    'origin': user_location,
-                    'destination': f"{warehouse_address} ({warehouse_location})",
-                    'distance': '计算失败',
-                    'duration': '计算失败',
-                    'success': False,
-                    'attempts': attempt + 1,
-                    'error': str(e)
-                }
-            await asyncio.sleep(1)
-    
-    return None
+    连接池保留两个代理，限时模式下事发地点和出发地点的距离可以并发计算
+    """
+    return create_dispatch_runtime(pool_size=2)
 
-async def calculate_distances_to_warehouses(agent, user_location, warehouses):
-    """计算用户位置到所有仓库的距离"""
+def run_distance_pass(runtime, user_location, warehouses):
+    """在后台事件循环中计算距离，同时在当前脚本线程中刷新进度条"""
     progress_bar = st.progress(0)
     status_text = st.empty()
+    updates = queue.Queue()
     
-    status_text.text(f"正在计算从 '{user_location}' 到各仓库的距离...")
+    def report(progress, message):
+        updates.put((progress, message))
     
-    # 检测用户输入是否为经纬度格式
-    if not is_coordinates(user_location):
-        status_text.text(f"检测到地点名称，正在获取 '{user_location}' 的经纬度坐标...")
-        user_coordinates = await get_location_coordinates(agent, user_location)
-        if user_coordinates != user_location:
-            status_text.text(f"已获取坐标: {user_coordinates}")
-            actual_user_location = user_coordinates
-        else:
-            status_text.text(f"无法获取坐标，将使用原始地点名称进行计算")
-            actual_user_location = user_location
-    else:
-        status_text.text(f"检测到经纬度格式，直接使用坐标进行计算")
-        actual_user_location = user_location
-    
-    distances = []
-    
-    for i, warehouse in enumerate(warehouses):
-        progress = (i + 1) / len(warehouses)
-        progress_bar.progress(progress)
-        status_text.text(f"正在计算第 {i+1}/{len(warehouses)} 个仓库: {warehouse['name']}")
+    async def task():
+        from utils.stations import get_station_registry
         
-        result = await calculate_single_warehouse_distance(agent, actual_user_location, warehouse)
-        if result:
-            result['origin'] = user_location
-            distances.append(result)
+        # 已登记出发地点的路线全部预计算时不租用代理（不做健康检查），地图服务故障时照常使用路线表
+        if get_station_registry().covers(user_location, warehouses):
+            return await calculate_distances_to_warehouses(None, user_location, warehouses, progress_callback=report)
+        async with runtime.location_agent() as agent:
+            return await calculate_distances_to_warehouses(
+                agent, user_location, warehouses, progress_callback=report, probe=runtime.pool.probe
+            )
     
-    progress_bar.empty()
-    status_text.empty()
+    future = runtime.submit(task())
+    try:
+        while True:
+            try:
+                progress, message = updates.get(timeout=0.1)
+            except queue.Empty:
+                if future.done():
+                    break
+                continue
+            if progress is not None:
+                progress_bar.progress(progress)
+            if message:
+                status_text.text(message)
+    finally:
+        progress_bar.empty()
+        status_text.empty()
     
-    return distances
+    return future.result()
 
-def analyze_fire_impact(fire_details, personnel_count, fire_truck_count):
-    """分析火灾详情对作战计划的影响"""
-    impact_analysis = {
-        'risk_level': '中等',
-        'recommended_equipment': [],
-        'personnel_adjustment': personnel_count,
-        'fire_truck_adjustment': fire_truck_count,
-        'special_considerations': []
-    }
-    
-    fire_details_lower = fire_details.lower()
-    
-    # 分析火灾规模
-    if any(keyword in fire_details_lower for keyword in ['大火', '重大', '严重', '高层']):
-        impact_analysis['risk_level'] = '高危'
-        impact_analysis['personnel_adjustment'] = max(personnel_count, 30)
-        impact_analysis['fire_truck_adjustment'] = max(fire_truck_count, 5)
-        impact_analysis['recommended_equipment'].extend(['重型消防车', '云梯车', '大功率水泵'])
-        impact_analysis['special_considerations'].append('需要增派人员和重型设备')
-    elif any(keyword in fire_details_lower for keyword in ['小火', '初期', '轻微']):
-        impact_analysis['risk_level'] = '低危'
-        impact_analysis['personnel_adjustment'] = min(personnel_count, 15)
-        impact_analysis['fire_truck_adjustment'] = min(fire_truck_count, 2)
-    
-    # 分析人口密度
-    if any(keyword in fire_details_lower for keyword in ['人口密集', '医院', '学校', '商场']):
-        impact_analysis['special_considerations'].append('人员疏散优先，需要救护车待命')
-        impact_analysis['recommended_equipment'].extend(['救护车', '疏散设备'])
-    
-    # 分析火灾性质
-    if any(keyword in fire_details_lower for keyword in ['化学', '危险品', '油类']):
-        impact_analysis['risk_level'] = '高危'
-        impact_analysis['recommended_equipment'].extend(['化学防护服', '泡沫灭火剂'])
-        impact_analysis['special_considerations'].append('需要化学防护措施')
-    
-    return impact_analysis
+def show_distance_results(distances):
+    """显示单个地点到各仓库的距离计算结果"""
+    for dist in distances:
+        if dist['success'] and dist.get('estimated'):
+            st.warning(f"⚠️ {dist['warehouse_name']}: {dist['distance']}, {dist['duration']}（估算值）")
+        elif dist['success'] and dist.get('precomputed'):
+            st.success(f"✅ {dist['warehouse_name']}: {dist['distance']}, {dist['duration']}（预计算路线）")
+        elif dist['success']:
+            st.success(f"✅ {dist['warehouse_name']}: {dist['distance']}, {dist['duration']}")
+        else:
+            st.error(f"❌ {dist['warehouse_name']}: {dist['distance']}")
+            if 'raw_response' in dist:
+                with st.expander(f"查看详细信息 - {dist['warehouse_name']}"):
+                    st.text("原始响应:")
+                    st.code(dist['raw_response'])
+                    if 'debug_info' in dist:
+                        st.text("调试信息:")
+                        st.info(dist['debug_info'])
+                        if 'distance_patterns_tried' in dist:
+                            st.text(f"尝试的距离模式数: {dist['distance_patterns_tried']}")
+                        if 'time_patterns_tried' in dist:
+                            st.text(f"尝试的时间模式数: {dist['time_patterns_tried']}")
 
 def main():
     """Streamlit主界面"""
@@ -357,6 +152,22 @@ def main():
             help="请描述火灾的规模、性质、人员情况等关键信息"
         )
         
+        # 限时模式：在总时间预算内给出方案，超时的查询使用估算值
+        time_limited = st.checkbox(
+            "⏱️ 限时模式",
+            value=False,
+            help="在时间预算内返回方案：优先查询最有希望的仓库，超时部分按直线距离估算"
+        )
+        time_budget = None
+        if time_limited:
+            time_budget = st.number_input(
+                "总时间预算（秒）",
+                min_value=5,
+                max_value=300,
+                value=30,
+                step=5
+            )
+        
         # 计算按钮
         calculate_button = st.button(
             "🔍 开始计算调度方案",
@@ -405,9 +216,17 @@ def main():
         # 加载仓库信息
         try:
             xlsx_path = os.path.join(os.path.dirname(__file__), 'data', 'resource.xlsx')
-            warehouse_data = read_warehouse_data_from_xlsx(xlsx_path)
+            warehouse_data = load_warehouse_data(xlsx_path)
             warehouses = warehouse_data['warehouses']
             
+            # 紧凑的列式库存，用于向量化统计各仓库的防护装备数量（NumPy在此时才导入）
+            from utils.records import WarehouseTable, PROTECTIVE_GEAR_KEYWORDS
+            warehouse_table = WarehouseTable.from_warehouse_data(warehouse_data)
+            gear_totals = warehouse_table.protective_gear_totals()
+            
+            # 用仓库间实测路线标定直线距离估算参数（地图服务熔断时使用）
+            DEFAULT_TRAVEL_ESTIMATOR.calibrate_from_warehouse_data(warehouse_data)
+            
             # 获取格式化的仓库信息文本，用于LLM输入
             from utils.utils import format_warehouse_data_for_llm
             warehouse_text, distance_text = format_warehouse_data_for_llm(warehouse_data)
@@ -417,70 +236,53 @@ def main():
             st.error(f"❌ 加载仓库信息失败: {e}")
             return
         
-        # 异步计算距离
-        async def run_calculation():
-            try:
-                agent = await create_location_agent()
+        # 在共享的后台事件循环中计算距离（复用已建立的MCP连接）
+        runtime = get_dispatch_runtime()
+        incident_distances, departure_distances = None, None
+        anytime_result = None
+        try:
+            if time_budget:
+                # 限时模式：距离计算和作战决策共用一个总时间预算
+                with st.spinner(f"限时模式：正在 {time_budget} 秒内生成调度方案..."):
+                    anytime_result = runtime.run(run_anytime_dispatch(
+                        runtime.pool,
+                        runtime.decision_llm,
+                        warehouse_data,
+                        incident_location=incident_location,
+                        departure_location=departure_location,
+                        personnel_count=personnel_count,
+                        vehicle_count=fire_truck_count,
+                        fire_description=fire_details,
+                        budget_seconds=time_budget,
+                        warehouse_texts=(warehouse_text, distance_text)
+                    ))
+                incident_distances = anytime_result['incident_distances']
+                departure_distances = anytime_result['departure_distances']
                 
-                # 使用可展开的区域显示距离计算结果
-                with st.expander("📍 距离计算结果", expanded=False):
-                    # 创建两列布局
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        st.markdown("### 🏥 事发地点 → 仓库")
-                        incident_distances = await calculate_distances_to_warehouses(agent, incident_location, warehouses)
-                        
-                        # 显示事发地点距离结果
-                        for dist in incident_distances:
-                            if dist['success']:
-                                st.success(f"✅ {dist['warehouse_name']}: {dist['distance']}, {dist['duration']}")
-                            else:
-                                st.error(f"❌ {dist['warehouse_name']}: {dist['distance']}")
-                                if 'raw_response' in dist:
-                                    with st.expander(f"查看详细信息 - {dist['warehouse_name']}"):
-                                        st.text("原始响应:")
-                                        st.code(dist['raw_response'])
-                                        if 'debug_info' in dist:
-                                             st.text("调试信息:")
-                                             st.info(dist['debug_info'])
-                                             if 'distance_patterns_tried' in dist:
-                                                 st.text(f"尝试的距离模式数: {dist['distance_patterns_tried']}")
-                                             if 'time_patterns_tried' in dist:
-                                                 st.text(f"尝试的时间模式数: {dist['time_patterns_tried']}")
-                    
-                    with col2:
-                        st.markdown("### 🚗 出发地点 → 仓库")
-                        departure_distances = await calculate_distances_to_warehouses(agent, departure_location, warehouses)
-                        
-                        # 显示出发地点距离结果
-                        for dist in departure_distances:
-                            if dist['success']:
-                                st.success(f"✅ {dist['warehouse_name']}: {dist['distance']}, {dist['duration']}")
-                            else:
-                                st.error(f"❌ {dist['warehouse_name']}: {dist['distance']}")
-                                if 'raw_response' in dist:
-                                    with st.expander(f"查看详细信息 - {dist['warehouse_name']}"):
-                                        st.text("原始响应:")
-                                        st.code(dist['raw_response'])
-                                        if 'debug_info' in dist:
-                                            st.text("调试信息:")
-                                            st.info(dist['debug_info'])
-                                            if 'distance_patterns_tried' in dist:
-                                                st.text(f"尝试的距离模式数: {dist['distance_patterns_tried']}")
-                                            if 'time_patterns_tried' in dist:
-                                                st.text(f"尝试的时间模式数: {dist['time_patterns_tried']}")
+                deadline = anytime_result['deadline']
+                st.info(f"⏱️ 用时 {deadline['elapsed_seconds']:.1f} 秒 / 预算 {deadline['budget_seconds']} 秒")
+                if anytime_result['skipped']:
+                    with st.expander(f"⚠️ {len(anytime_result['skipped'])} 项查询因超出时间预算而降级", expanded=False):
+                        st.dataframe(anytime_result['skipped'], use_container_width=True)
+            
+            # 使用可展开的区域显示距离计算结果
+            with st.expander("📍 距离计算结果", expanded=False):
+                # 创建两列布局
+                col1, col2 = st.columns(2)
                 
-                await agent.disconnect()
-                return incident_distances, departure_distances
+                with col1:
+                    st.markdown("### 🏥 事发地点 → 仓库")
+                    if anytime_result is None:
+                        incident_distances = run_distance_pass(runtime, incident_location, warehouses)
+                    show_distance_results(incident_distances)
                 
-            except Exception as e:
-                st.error(f"计算过程中出错: {e}")
-                return None, None
-        
-        # 运行异步计算
-        with st.spinner("正在计算距离信息..."):
-            incident_distances, departure_distances = asyncio.run(run_calculation())
+                with col2:
+                    st.markdown("### 🚗 出发地点 → 仓库")
+                    if anytime_result is None:
+                        departure_distances = run_distance_pass(runtime, departure_location, warehouses)
+                    show_distance_results(departure_distances)
+        except Exception as e:
+            st.error(f"计算过程中出错: {e}")
         
         if incident_distances and departure_distances:
             # 显示详细结果
@@ -490,17 +292,12 @@ def main():
                     warehouse = warehouses[i]
                     
                     # 计算装备支撑能力
-                    equipment_capacity = 0
-                    equipment_details = []
-                    
-                    # 处理resources列表格式（从Excel加载的数据）
-                    for resource in warehouse.get('resources', []):
-                        item_name = resource.get('name', '')
-                        quantity = resource.get('quantity', 0)
-                        
-                        if any(keyword in item_name for keyword in ['呼吸器', '防护服', '面罩']):
-                            equipment_capacity += quantity
-                            equipment_details.append(f"{item_name}:{quantity}套")
+                    equipment_capacity = int(gear_totals[i])
+                    equipment_details = [
+                        f"{resource['name']}:{resource['quantity']}套"
+                        for resource in warehouse.get('resources', [])
+                        if any(keyword in resource.get('name', '') for keyword in PROTECTIVE_GEAR_KEYWORDS)
+                    ]
                     
                     # 判断装备支撑能力
                     if equipment_capacity >= personnel_count:
@@ -527,6 +324,8 @@ def main():
                             if inc_dist['success']:
                                 st.metric("距离", inc_dist['distance'])
                                 st.metric("时间", inc_dist['duration'])
+                                if inc_dist.get('estimated'):
+                                    st.caption("⚠️ 地图服务不可用，按直线距离估算")
                             else:
                                 st.error(f"计算失败: {inc_dist['distance']}")
                         
@@ -535,6 +334,8 @@ def main():
                             if dep_dist['success']:
                                 st.metric("距离", dep_dist['distance'])
                                 st.metric("时间", dep_dist['duration'])
+                                if dep_dist.get('estimated'):
+                                    st.caption("⚠️ 地图服务不可用，按直线距离估算")
                             else:
                                 st.error(f"计算失败: {dep_dist['distance']}")
                         
@@ -557,26 +358,10 @@ def main():
                     with col2:
                         st.metric("出发地点查询成功", f"{successful_departure}/{len(departure_distances)}")
                 
-                    # 装备支撑统计
-                    adequate_warehouses = 0
-                    basic_warehouses = 0
-                    insufficient_warehouses = 0
-                    
-                    for warehouse in warehouses:
-                        equipment_capacity = 0
-                        # 处理resources列表格式（从Excel加载的数据）
-                        for resource in warehouse.get('resources', []):
-                            item_name = resource.get('name', '')
-                            quantity = resource.get('quantity', 0)
-                            if any(keyword in item_name for keyword in ['呼吸器', '防护服', '面罩']):
-                                equipment_capacity += quantity
-                        
-                        if equipment_capacity >= personnel_count:
-                            adequate_warehouses += 1
-                        elif equipment_capacity >= personnel_count * 0.7:
-                            basic_warehouses += 1
-                        else:
-                            insufficient_warehouses += 1
+                    # 装备支撑统计（向量化）
+                    adequate_warehouses = int((gear_totals >= personnel_count).sum())
+                    insufficient_warehouses = int((gear_totals < personnel_count * 0.7).sum())
+                    basic_warehouses = len(warehouses) - adequate_warehouses - insufficient_warehouses
                     
                     with col3:
                         st.metric("装备充足仓库", f"{adequate_warehouses}/{len(warehouses)}")
@@ -589,16 +374,14 @@ def main():
                         
                         col1, col2 = st.columns(2)
                         
-                        if successful_incident > 0:
-                            nearest_incident = min([d for d in incident_distances if d['success']], 
-                                                 key=lambda x: float(x['distance'].replace('公里', '').replace('km', '')))
+                        nearest_incident = nearest_warehouse(incident_distances)
+                        if nearest_incident is not None:
                             with col1:
                                 st.success(f"**距离事发地点最近:** {nearest_incident['warehouse_name']}")
                                 st.text(f"距离: {nearest_incident['distance']} | 时间: {nearest_incident['duration']}")
                         
-                        if successful_departure > 0:
-                            nearest_departure = min([d for d in departure_distances if d['success']], 
-                                                  key=lambda x: float(x['distance'].replace('公里', '').replace('km', '')))
+                        nearest_departure = nearest_warehouse(departure_distances)
+                        if nearest_departure is not None:
                             with col2:
                                 st.success(f"**距离出发地点最近:** {nearest_departure['warehouse_name']}")
                                 st.text(f"距离: {nearest_departure['distance']} | 时间: {nearest_departure['duration']}")            
@@ -608,42 +391,44 @@ def main():
             st.subheader("🎯 作战指挥部署")
             
             # 调用决策代理进行作战规划
-            async def run_decision_analysis():
-                try:
-                    from agents.decision_agent import DecisionAgent
-                    
-                    # 创建决策代理
-                    decision_agent = DecisionAgent()
-                    
-                    # 准备距离数据
-                    warehouse_distances = {
-                        'incident': {d['warehouse_name']: {'distance': d['distance'], 'time': d['duration']} 
-                                   for d in incident_distances if d['success']},
-                        'departure': {d['warehouse_name']: {'distance': d['distance'], 'time': d['duration']} 
-                                    for d in departure_distances if d['success']}
-                    }
-                    
-                    # 调用决策代理的主要决策方法
-                    battle_plan = await decision_agent.make_decision(
-                        incident_location=incident_location,
-                        departure_location=departure_location,
-                        personnel_count=personnel_count,
-                        vehicle_count=fire_truck_count,
-                        fire_description=fire_details,
-                        warehouse_distances=warehouse_distances,
-                        warehouse_info=warehouse_text,
-                        inter_warehouse_distances=distance_text
-                    )
-                    
-                    return battle_plan
-                    
-                except Exception as e:
-                    st.error(f"作战规划生成失败: {e}")
-                    return None
+            async def run_decision_analysis(timeline_text, route_options_text):
+                # 创建复用共享LLM客户端的决策代理
+                decision_agent = runtime.new_decision_agent()
+                
+                # 准备距离数据
+                warehouse_distances = build_warehouse_distances(incident_distances, departure_distances)
+                
+                # 调用决策代理的主要决策方法
+                battle_plan = await decision_agent.make_decision(
+                    incident_location=incident_location,
+                    departure_location=departure_location,
+                    personnel_count=personnel_count,
+                    vehicle_count=fire_truck_count,
+                    fire_description=fire_details,
+                    warehouse_distances=warehouse_distances,
+                    warehouse_info=warehouse_text,
+                    inter_warehouse_distances=distance_text,
+                    route_options_text=route_options_text,
+                    timeline_text=timeline_text
+                )
+                
+                return battle_plan
             
-            # 运行决策分析
-            with st.spinner("正在生成物资获取和路径规划方案..."):
-                battle_plan = asyncio.run(run_decision_analysis())
+            # 运行决策分析（限时模式下已在时间预算内生成）
+            if anytime_result is not None:
+                battle_plan = anytime_result['battle_plan']
+            else:
+                with st.spinner("正在生成物资获取和路径规划方案..."):
+                    try:
+                        # 参考时间线和取物资组合在当前脚本线程中计算，不占用后台事件循环
+                        timeline_text = build_reference_timeline(warehouses, incident_distances, departure_distances,
+                                                                 personnel_count, fire_truck_count)
+                        route_options_text = build_route_options(warehouse_data, incident_distances,
+                                                                 departure_distances, personnel_count)
+                        battle_plan = runtime.run(run_decision_analysis(timeline_text, route_options_text))
+                    except Exception as e:
+                        st.error(f"作战规划生成失败: {e}")
+                        battle_plan = None
             
             if battle_plan:
                 # 显示物资获取和路径规划方案
@@ -669,7 +454,7 @@ def main():
                 st.download_button(
                     label="📄 下载规划方案",
                     data=battle_plan,
-                    file_name=f"物资获取路径规划_{incident_location}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.md",
+                    file_name=f"物资获取路径规划_{incident_location}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
                     mime="text/markdown"
                 )
     
@@ -0,0 +1,235 @@
+import json
+import os
+import sys
+import time
+import asyncio
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.decision_agent import create_decision_llm
+from agents.locate_agent import DEFAULT_TOOL_BUDGET
+from utils.cache import DistanceCache
+from utils.runtime import LocationAgentPool
+from utils.utils import load_warehouse_data, format_warehouse_data_for_llm
+from utils.dispatch import run_dispatch, run_anytime_dispatch
+from utils.retry import latency_registry
+from utils.geo import DEFAULT_TRAVEL_ESTIMATOR
+
+def _json_default(obj):
+    """将pandas/numpy标量等对象转换为可序列化的值"""
+    if hasattr(obj, 'item'):
+        return obj.item()
+    return str(obj)
+
+def iter_incidents(jsonl_file_path):
+    """逐行读取JSONL格式的事件队列，返回 (行号, 事件) 元组"""
+    with open(jsonl_file_path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                incident = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, {'_parse_error': str(e)}
+                continue
+            if isinstance(incident, dict):
+                yield line_no, incident
+            else:
+                yield line_no, {'_parse_error': f"事件必须为JSON对象，实际为 {type(incident).__name__}"}
+
+async def process_incident(line_no, incident, context):
+    """处理单个事件，返回写入结果文件的记录"""
+    record = {
+        'line': line_no,
+        'id': incident.get('id', line_no),
+        'success': False
+    }
+    if '_parse_error' in incident:
+        record['error'] = f"JSON解析失败: {incident['_parse_error']}"
+        return record
+
+    missing = [field for field in ('incident_location', 'departure_location') if not incident.get(field)]
+    if missing:
+        record['error'] = f"缺少字段: {', '.join(missing)}"
+        return record
+
+    async def dispatch():
+        dispatch_args = dict(
+            incident_location=incident['incident_location'],
+            departure_location=incident['departure_location'],
+            personnel_count=int(incident.get('personnel_count', 25)),
+            vehicle_count=int(incident.get('vehicle_count', 3)),
+            fire_description=incident.get('fire_description', ''),
+            cache=context['cache'],
+            warehouse_texts=context['warehouse_texts'],
+            decision_semaphore=context['decision_semaphore']
+        )
+        # 事件中的 budget_seconds 优先于命令行的 --budget
+        budget_seconds = incident.get('budget_seconds', context['budget_seconds'])
+        if budget_seconds and context['make_decision']:
+            # 限时模式等待LLM信号量的时间同样计入预算
+            return await run_anytime_dispatch(
+                context['pool'],
+                context['decision_llm'],
+                context['warehouse_data'],
+                budget_seconds=float(budget_seconds),
+                **dispatch_args
+            )
+        return await run_dispatch(
+            context['pool'],
+            context['decision_llm'],
+            context['warehouse_data'],
+            make_decision=context['make_decision'],
+            **dispatch_args
+        )
+
+    # 事件在独立任务中处理：事件内部的取消（如等待的共享查询被取消）只记为该事件失败，
+    # 只有工作任务本身被取消时才向上传递
+    task = asyncio.ensure_future(dispatch())
+    try:
+        result = await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if not task.done():
+            task.cancel()
+            raise
+        record['error'] = '事件处理被取消'
+    except Exception as e:
+        record['error'] = str(e)
+    else:
+        record.update(result)
+        record['success'] = True
+    return record
+
+async def run_batch(input_path,
+                    output_path,
+                    xlsx_file_path,
+                    server_config_path="configs/servers_config.json",
+                    concurrency: int = 8,
+                    amap_concurrency: int = 4,
+                    llm_concurrency: int = 4,
+                    make_decision: bool = True,
+                    budget_seconds: float = None,
+                    tool_budget=None):
+    """并发处理事件队列，结果按完成顺序流式写入输出JSONL
+
+    Args:
+        concurrency: 同时处理的事件数量
+        amap_concurrency: LocationAgent连接池大小（即地图服务并发上限）
+        llm_concurrency: 决策LLM的并发调用上限
+        budget_seconds: 每个事件的总时间预算（秒），设置后使用限时调度模式
+        tool_budget: 地图代理单次查询的工具循环预算（ToolLoopBudget）
+    """
+    warehouse_data = load_warehouse_data(xlsx_file_path)
+    if warehouse_data is None:
+        raise RuntimeError(f"无法加载仓库数据: {xlsx_file_path}")
+    DEFAULT_TRAVEL_ESTIMATOR.calibrate_from_warehouse_data(warehouse_data)
+
+    pool = LocationAgentPool(server_config_path, size=amap_concurrency, tool_budget=tool_budget)
+    context = {
+        'pool': pool,
+        'decision_llm': create_decision_llm() if make_decision else None,
+        'warehouse_data': warehouse_data,
+        'warehouse_texts': format_warehouse_data_for_llm(warehouse_data),
+        'cache': DistanceCache(),
+        'decision_semaphore': asyncio.Semaphore(llm_concurrency),
+        'make_decision': make_decision,
+        'budget_seconds': budget_seconds
+    }
+
+    stats = {'processed': 0, 'succeeded': 0, 'failed': 0}
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    started = time.perf_counter()
+
+    try:
+        with open(output_path, 'w', encoding='utf-8') as out:
+            async def worker():
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        break
+                    record = await process_incident(item[0], item[1], context)
+                    out.write(json.dumps(record, ensure_ascii=False, default=_json_default) + '\n')
+                    out.flush()
+
+                    stats['processed'] += 1
+                    stats['succeeded' if record['success'] else 'failed'] += 1
+                    status = '✓' if record['success'] else f"✗ {record.get('error', '')}"
+                    print(f"[{stats['processed']}] 事件 {record['id']} {status}")
+
+            workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+            for item in iter_incidents(input_path):
+                await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+    finally:
+        await pool.close()
+
+    elapsed = time.perf_counter() - started
+    stats['elapsed_seconds'] = round(elapsed, 3)
+    stats['throughput_per_minute'] = round(stats['processed'] / elapsed * 60, 2) if elapsed > 0 else 0.0
+    stats['cache'] = context['cache'].stats()
+    stats['latency'] = latency_registry.report()
+    return stats
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='从JSONL事件队列批量并发执行调度（历史事件回放/演练）')
+    parser.add_argument('--input', '-i', required=True, help='输入JSONL文件，每行一个事件')
+    parser.add_argument('--output', '-o', required=True, help='输出JSONL文件路径')
+    parser.add_argument('--xlsx', help='仓库数据Excel文件路径')
+    parser.add_argument('--config', default='configs/servers_config.json', help='MCP服务器配置文件路径')
+    parser.add_argument('--concurrency', type=int, default=8, help='同时处理的事件数量')
+    parser.add_argument('--amap-concurrency', type=int, default=4, help='地图服务并发上限（连接池大小）')
+    parser.add_argument('--llm-concurrency', type=int, default=4, help='决策LLM并发上限')
+    parser.add_argument('--no-decision', action='store_true', help='只计算距离，不生成作战方案')
+    parser.add_argument('--budget', type=float, help='每个事件的总时间预算（秒），超时部分使用估算值和快速方案')
+    parser.add_argument('--max-tool-steps', type=int, default=DEFAULT_TOOL_BUDGET.max_steps,
+                        help='地图代理单次查询最多的工具调用轮数')
+    parser.add_argument('--llm-timeout', type=float, default=DEFAULT_TOOL_BUDGET.llm_timeout,
+                        help='地图代理单次模型调用超时（秒）')
+    parser.add_argument('--tool-timeout', type=float, default=DEFAULT_TOOL_BUDGET.tool_timeout,
+                        help='地图代理单次工具调用超时（秒）')
+
+    args = parser.parse_args()
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    xlsx_file = args.xlsx or os.path.join(project_root, "data", "resource.xlsx")
+
+    if not os.path.exists(args.input):
+        print(f"错误: 找不到文件 {args.input}")
+        return
+
+    print(f"输入文件: {args.input}")
+    print(f"输出文件: {args.output}")
+    print(f"并发: 事件{args.concurrency} / 地图{args.amap_concurrency} / LLM{args.llm_concurrency}")
+    print("-" * 50)
+
+    stats = asyncio.run(run_batch(
+        args.input,
+        args.output,
+        xlsx_file,
+        server_config_path=args.config,
+        concurrency=args.concurrency,
+        amap_concurrency=args.amap_concurrency,
+        llm_concurrency=args.llm_concurrency,
+        make_decision=not args.no_decision,
+        budget_seconds=args.budget,
+        tool_budget=DEFAULT_TOOL_BUDGET.with_options(
+            max_steps=args.max_tool_steps, llm_timeout=args.llm_timeout, tool_timeout=args.tool_timeout
+        )
+    ))
+
+    print("\n批量处理统计:")
+    print(f"- 处理事件数: {stats['processed']} (成功 {stats['succeeded']}, 失败 {stats['failed']})")
+    print(f"- 总耗时: {stats['elapsed_seconds']}秒")
+    print(f"- 吞吐量: {stats['throughput_per_minute']} 个/分钟")
+    for name, cache_stats in stats['cache'].items():
+        print(f"- {name}缓存: {cache_stats['entries']}条, 命中率 {cache_stats['hit_rate']:.1%}")
+    print(f"\n延迟统计:\n{latency_registry.format_report()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.generate_resources import write_resource_json
+
+# 测量的函数（按数据流顺序）
+CASES = ['convert_json_to_xlsx', 'read_warehouse_data_from_xlsx', 'format_warehouse_data_for_llm',
+         'parse_distance_info', 'analyze_fire_impact']
+
+# 地图代理回复的几种常见写法，用于 parse_distance_info（另有一部分为带结构化路线数值的结果）
+RESPONSE_TEMPLATES = [
+    "从出发地到{name}驾车距离约{km:.1f}公里，预计需要{minutes}分钟。",
+    "路线规划完成：全程{meters}米，耗时约{minutes}分钟，途经{district}主干道。",
+    "{name}距离事发地点{km:.2f}km，驾车约{hours}小时{rest}分钟到达",
+    "Driving distance: {km:.1f} km, estimated time {minutes} min."
+]
+
+FIRE_DESCRIPTIONS = [
+    "高层住宅楼发生大火，楼内人口密集，已有人员被困",
+    "化工厂仓库起火，现场存放危险品和油类，火势严重",
+    "商场一楼初期火灾，火势轻微，正在组织疏散",
+    "学校食堂厨房小火，已初步控制",
+    "老旧小区电动车充电起火，浓烟较大",
+    "Warehouse fire near the hospital, chemical smell reported"
+]
+
+def parse_sizes(text):
+    """"10x20,100x20" 形式的规模列表 → [(仓库数, 每仓物资种类数)]"""
+    sizes = []
+    for value in text.split(','):
+        if value.strip():
+            warehouses, _, items = value.strip().lower().partition('x')
+            sizes.append((int(warehouses), int(items or 20)))
+    return sizes
+
+def sample_responses(warehouses, seed=0):
+    """每个仓库两条路线结果（事发地点、出发地点），一半为结构化数值，一半为各种写法的文本"""
+    import random
+
+    rng = random.Random(seed)
+    responses = []
+    for index, warehouse in enumerate(warehouses * 2):
+        meters = rng.uniform(1500, 60000)
+        seconds = meters / rng.uniform(6, 15)
+        text = RESPONSE_TEMPLATES[index % len(RESPONSE_TEMPLATES)].format(
+            name=warehouse['name'], district=warehouse['location']['district'], km=meters / 1000,
+            meters=round(meters), minutes=round(seconds / 60), hours=int(seconds // 3600),
+            rest=round(seconds % 3600 / 60)
+        )
+        responses.append(SimpleNamespace(route=(meters, seconds), text=text) if index % 2 else text)
+    return responses
+
+def time_call(func, repeat):
+    """重复调用 func，返回各次耗时（秒）；屏蔽被测函数的打印输出"""
+    samples = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - started)
+    return samples
+
+def benchmark_size(warehouses, items, workdir, repeat=5, seed=0, province=False):
+    """生成一个规模的 resource.json，测量各函数的耗时"""
+    from utils.utils import convert_json_to_xlsx, read_warehouse_data_from_xlsx, format_warehouse_data_for_llm
+    from utils.dispatch import parse_distance_info, analyze_fire_impact
+
+    json_path = os.path.join(workdir, f"resource_{warehouses}x{items}.json")
+    xlsx_path = os.path.join(workdir, f"resource_{warehouses}x{items}.xlsx")
+    data = write_resource_json(json_path, warehouses, items, seed=seed, province=province)
+    with contextlib.redirect_stdout(io.StringIO()):
+        convert_json_to_xlsx(json_path, xlsx_path)
+        warehouse_data = read_warehouse_data_from_xlsx(xlsx_path)
+    responses = sample_responses(data['warehouses'], seed)
+    descriptions = [FIRE_DESCRIPTIONS[i % len(FIRE_DESCRIPTIONS)] for i in range(warehouses)]
+
+    calls = {
+        'convert_json_to_xlsx': (lambda: convert_json_to_xlsx(json_path, xlsx_path), 1),
+        'read_warehouse_data_from_xlsx': (lambda: read_warehouse_data_from_xlsx(xlsx_path), 1),
+        'format_warehouse_data_for_llm': (lambda: format_warehouse_data_for_llm(warehouse_data), 1),
+        'parse_distance_info': (lambda: [parse_distance_info(response) for response in responses], len(responses)),
+        'analyze_fire_impact': (lambda: [analyze_fire_impact(text, 20, 3) for text in descriptions], len(descriptions))
+    }
+    results = []
+    for case in CASES:
+        func, count = calls[case]
+        samples = time_call(func, repeat)
+        median = statistics.median(samples)
+        results.append({
+            'case': case,
+            'warehouses': warehouses,
+            'items': items,
+            'calls': count,
+            'median_seconds': round(median, 6),
+            'min_seconds': round(min(samples), 6),
+            'per_call_us': round(median / count * 1e6, 2)
+        })
+    return results
+
+def scaling_exponents(results):
+    """各函数耗时随仓库数增长的幂次（同一物资种类数下对数坐标最小二乘拟合）：1 为线性，2 为平方级"""
+    exponents = {}
+    for case in CASES:
+        groups = {}
+        for result in results:
+            if result['case'] == case and result['median_seconds'] > 0:
+                groups.setdefault(result['items'], []).append(result)
+        for items, group in groups.items():
+            points = [(math.log(r['warehouses']), math.log(r['median_seconds'])) for r in group]
+            if len({x for x, _ in points}) < 2:
+                continue
+            mean_x = statistics.fmean(x for x, _ in points)
+            mean_y = statistics.fmean(y for _, y in points)
+            slope = (sum((x - mean_x) * (y - mean_y) for x, y in points) /
+                     sum((x - mean_x) ** 2 for x, _ in points))
+            exponents.setdefault(case, {})[str(items)] = round(slope, 2)
+    return exponents
+
+def add_thresholds(results, tolerance, slack):
+    """回归阈值：中位数 × tolerance + slack（slack 吸收微秒级函数的计时抖动）"""
+    for result in results:
+        result['threshold_seconds'] = round(result['median_seconds'] * tolerance + slack, 6)
+
+def compare_with_baseline(results, baseline):
+    """与基线文件中相同函数、相同规模的阈值比较，返回超出阈值的结果"""
+    thresholds = {(r['case'], r['warehouses'], r['items']): r['threshold_seconds'] for r in baseline['results']}
+    regressions = []
+    for result in results:
+        threshold = thresholds.get((result['case'], result['warehouses'], result['items']))
+        if threshold is not None and result['median_seconds'] > threshold:
+            regressions.append({**result, 'baseline_threshold_seconds': threshold})
+    return regressions
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='在合成的 resource.json 上测量数据读写、格式化和解析函数随规模的耗时')
+    parser.add_argument('--sizes', default='10x20,100x20,500x20,100x60',
+                        help='测试规模，格式 仓库数x每仓物资种类数（逗号分隔）')
+    parser.add_argument('--repeat', type=int, default=5, help='每个函数的重复次数（取中位数）')
+    parser.add_argument('--province', action='store_true', help='仓库分布在全省各市')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='回归阈值相对中位数的倍数')
+    parser.add_argument('--slack', type=float, default=0.002, help='回归阈值的绝对余量（秒）')
+    parser.add_argument('--baseline', help='基线结果JSON：超出其中阈值时以状态码1退出')
+    parser.add_argument('--json', help='将结果（含回归阈值）写入JSON文件，可作为之后的基线')
+
+    args = parser.parse_args()
+    sizes = parse_sizes(args.sizes)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for warehouses, items in sizes:
+            print(f"测量 {warehouses} 个仓库 × {items} 种物资 ...")
+            results.extend(benchmark_size(warehouses, items, workdir, args.repeat, args.seed, args.province))
+    add_thresholds(results, args.tolerance, args.slack)
+    exponents = scaling_exponents(results)
+
+    print(f"\n{'函数':<32}{'规模':>12}{'中位数':>12}{'最小值':>12}{'单次调用':>14}{'阈值':>12}")
+    print("-" * 96)
+    for result in results:
+        print(f"{result['case']:<32}{result['warehouses']:>7}x{result['items']:<4}"
+              f"{result['median_seconds'] * 1000:>10.2f}ms{result['min_seconds'] * 1000:>10.2f}ms"
+              f"{result['per_call_us']:>12.1f}us{result['threshold_seconds'] * 1000:>10.2f}ms")
+    if exponents:
+        print("\n耗时随仓库数增长的幂次（1 为线性，2 为平方级）:")
+        for case, by_items in exponents.items():
+            print(f"  {case:<32}" + "，".join(f"{items}种物资: {slope}" for items, slope in by_items.items()))
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'tolerance': args.tolerance,
+        'slack_seconds': args.slack,
+        'results': results,
+        'scaling_exponents': exponents
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_with_baseline(results, json.load(f))
+        report['regressions'] = regressions
+        if regressions:
+            print(f"\n{len(regressions)} 项超出基线阈值:")
+            for result in regressions:
+                print(f"  {result['case']} {result['warehouses']}x{result['items']}: "
+                      f"{result['median_seconds'] * 1000:.2f}ms > {result['baseline_threshold_seconds'] * 1000:.2f}ms")
+        else:
+            print(f"\n全部结果均在基线阈值内: {args.baseline}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {args.json}")
+
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# 项目根目录
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 默认测量的模块（冷启动时各入口实际导入的模块）
+DEFAULT_MODULES = [
+    'app',
+    'service',
+    'agents.locate_agent',
+    'agents.decision_agent',
+    'utils.utils',
+    'utils.dispatch',
+    'utils.runtime',
+    'scripts.json_to_xlsx_converter'
+]
+
+# 关注的重量级依赖
+HEAVY_DEPENDENCIES = ['pandas', 'numpy', 'openpyxl', 'langchain_openai', 'langchain_core', 'mcp', 'aiohttp', 'streamlit']
+
+# 在独立子进程中执行的测量代码：导入耗时、进程峰值常驻内存、已加载的重量级依赖
+_PROBE = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+sys.path.insert(0, {scripts!r})
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    'seconds': elapsed,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'loaded': [name for name in {heavy!r} if name in sys.modules]
+}}))
+"""
+
+def measure_import(module, repeat=5):
+    """在全新的解释器中重复导入模块，返回耗时和内存统计"""
+    code = _PROBE.format(
+        root=PROJECT_ROOT,
+        scripts=os.path.join(PROJECT_ROOT, 'scripts'),
+        module=module,
+        heavy=HEAVY_DEPENDENCIES
+    )
+    samples = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, '-c', code], capture_output=True, text=True, cwd=PROJECT_ROOT
+        )
+        if completed.returncode != 0:
+            return {'module': module, 'error': completed.stderr.strip().splitlines()[-1:]}
+        samples.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    seconds = [sample['seconds'] for sample in samples]
+    return {
+        'module': module,
+        'median_seconds': round(statistics.median(seconds), 4),
+        'min_seconds': round(min(seconds), 4),
+        'max_rss_mb': round(statistics.median(sample['max_rss_mb'] for sample in samples), 1),
+        'loaded': samples[-1]['loaded']
+    }
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='测量各模块的冷启动导入耗时和常驻内存')
+    parser.add_argument('modules', nargs='*', help='要测量的模块，默认测量主要入口')
+    parser.add_argument('--repeat', type=int, default=5, help='每个模块的重复次数（取中位数）')
+    parser.add_argument('--json', help='将结果写入JSON文件')
+
+    args = parser.parse_args()
+
+    results = [measure_import(module, args.repeat) for module in (args.modules or DEFAULT_MODULES)]
+
+    print(f"{'模块':<36}{'导入耗时(中位数)':>16}{'峰值内存':>12}  已加载的重量级依赖")
+    print("-" * 100)
+    for result in results:
+        if 'error' in result:
+            print(f"{result['module']:<36}导入失败: {result['error']}")
+            continue
+        print(
+            f"{result['module']:<36}{result['median_seconds'] * 1000:>14.0f}ms{result['max_rss_mb']:>10.1f}MB  "
+            f"{', '.join(result['loaded']) or '-'}"
+        )
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {args.json}")
+
+if __name__ == "__main__":
+    main()
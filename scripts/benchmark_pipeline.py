@@ -0,0 +1,329 @@
+"""
+调度流程与转换脚本的延迟基准测试
+
+在本地模拟的高德地图MCP服务和OpenAI兼容模型服务（scripts/mock_services.py，自动在子进程中启动）上，
+以 data/resource.json 为模板生成不同数量的仓库，测量调度流程（双地点距离计算 + 作战决策）和
+转换脚本（仓库间距离计算）的端到端耗时及各阶段延迟。模拟服务的延迟、抖动和错误比例可配置。
+
+用法:
+    python scripts/benchmark_pipeline.py --sizes 5,20,50 --converter-sizes 5,10,20 --runs 3 --json benchmark.json
+    python scripts/benchmark_pipeline.py --amap-latency 0.2 --amap-error-rate 0.1 --no-converter
+    # 测量已运行的服务（不启动模拟服务）
+    python scripts/benchmark_pipeline.py --server-config configs/servers_config.json --llm-base http://127.0.0.1:8766/v1
+"""
+
+import asyncio
+import contextlib
+import copy
+import io
+import json
+import multiprocessing
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.retry import latency_registry
+from scripts.mock_services import CHENGDU_BOUNDS
+
+# 项目根目录
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 出发地点轮流使用的地点名称（经过地理编码），事发地点使用随机坐标
+DEPARTURE_NAMES = ['天府广场', '成都东站', '春熙路', '武侯祠', '成都双流国际机场']
+
+def scale_resource(source_path, count, seed=0) -> dict:
+    """以 source_path 中的仓库为模板生成 count 个仓库（物资相同，坐标在成都市区内随机分布）"""
+    with open(source_path, 'r', encoding='utf-8') as f:
+        source = json.load(f)
+    templates = source['warehouses']
+    rng = random.Random(seed)
+    min_lng, min_lat, max_lng, max_lat = CHENGDU_BOUNDS
+    warehouses = []
+    for index in range(count):
+        warehouse = copy.deepcopy(templates[index % len(templates)])
+        warehouse['id'] = f"WH{index + 1:04d}"
+        warehouse['name'] = f"{warehouse['name']}{index + 1}"
+        warehouse['location'].update({
+            'address': f"{warehouse['location']['address']}{index + 1}号",
+            'longitude': round(rng.uniform(min_lng, max_lng), 6),
+            'latitude': round(rng.uniform(min_lat, max_lat), 6)
+        })
+        warehouses.append(warehouse)
+    return {'warehouses': warehouses, 'metadata': source.get('metadata', {})}
+
+def free_port(host) -> int:
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+def wait_for_port(host, port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1.0):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"{host}:{port} 在 {timeout} 秒内未就绪")
+
+def start_mock_services(args, workdir, host='127.0.0.1'):
+    """在子进程中启动 scripts/mock_services.py，返回 (进程, 地图服务配置路径, 模型服务地址)"""
+    from scripts.mock_services import write_servers_config
+
+    amap_port, llm_port = free_port(host), free_port(host)
+    command = [
+        sys.executable, os.path.join(PROJECT_ROOT, 'scripts', 'mock_services.py'),
+        '--host', host, '--amap-port', str(amap_port), '--llm-port', str(llm_port),
+        '--amap-latency', str(args.amap_latency), '--amap-jitter', str(args.amap_jitter),
+        '--amap-error-rate', str(args.amap_error_rate),
+        '--llm-latency', str(args.llm_latency), '--llm-jitter', str(args.llm_jitter),
+        '--llm-error-rate', str(args.llm_error_rate), '--seed', str(args.seed)
+    ]
+    log = open(os.path.join(workdir, 'mock_services.log'), 'w')
+    process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, cwd=PROJECT_ROOT)
+    try:
+        wait_for_port(host, amap_port)
+        wait_for_port(host, llm_port)
+    except TimeoutError:
+        process.terminate()
+        raise
+    config_path = os.path.join(workdir, 'servers_config.json')
+    write_servers_config(config_path, host, amap_port)
+    return process, config_path, f"http://{host}:{llm_port}/v1"
+
+def summarize(values) -> dict:
+    """耗时列表（秒）的中位数、p95、最大值和平均值"""
+    values = sorted(values)
+    if not values:
+        return {}
+    return {
+        'p50': round(statistics.median(values), 4),
+        'p95': round(values[min(len(values) - 1, max(0, int(0.95 * len(values) + 0.5) - 1))], 4),
+        'max': round(values[-1], 4),
+        'mean': round(statistics.fmean(values), 4)
+    }
+
+def stage_report() -> dict:
+    """当前延迟统计中各阶段的次数、分位数和错误/超时次数"""
+    keys = ('count', 'mean', 'p50', 'p95', 'errors', 'timeouts', 'retries', 'hedges')
+    return {name: {key: stats[key] for key in keys} for name, stats in latency_registry.report().items()}
+
+@contextlib.contextmanager
+def quiet(enabled=True):
+    """屏蔽代理和转换脚本的逐步输出"""
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def benchmark_converter(json_path, workdir, count, server_config_path, verbose=False) -> dict:
+    """转换脚本：计算仓库间距离的完整转换耗时，以及不计算距离时的写出耗时
+
+    转换脚本内部用 asyncio.run 运行距离计算，而模型客户端的HTTP连接池在进程内按事件循环外共享，
+    因此每次测量都在独立的子进程中运行（见 run_converter_benchmark）。
+    """
+    from scripts.json_to_xlsx_converter import convert_json_to_xlsx
+    # 代理依赖的导入耗时由 scripts/benchmark_imports.py 单独测量，不计入转换耗时
+    import agents.locate_agent  # noqa: F401
+
+    latency_registry.reset()
+    started = time.perf_counter()
+    with quiet(not verbose):
+        convert_json_to_xlsx(json_path, os.path.join(workdir, f"converted_{count}.xlsx"), True, None,
+                             server_config_path=server_config_path)
+    total = time.perf_counter() - started
+    stages = stage_report()
+
+    started = time.perf_counter()
+    with quiet(not verbose):
+        convert_json_to_xlsx(json_path, os.path.join(workdir, f"written_{count}.xlsx"), False, None)
+    write_seconds = time.perf_counter() - started
+
+    pairs = count * (count - 1) // 2
+    return {
+        'warehouses': count,
+        'pairs': pairs,
+        'seconds': round(total, 3),
+        'write_seconds': round(write_seconds, 3),
+        'distance_seconds': round(total - write_seconds, 3),
+        'pairs_per_second': round(pairs / max(total - write_seconds, 1e-9), 2),
+        'stages': stages
+    }
+
+def run_converter_benchmark(*args) -> dict:
+    """在新的子进程中运行 benchmark_converter"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(benchmark_converter, *args).result()
+
+async def benchmark_dispatch(warehouse_data, runs, server_config_path, pool_size=2, make_decision=True, seed=0,
+                             verbose=False) -> dict:
+    """调度流程（与界面相同的双地点距离计算 + 作战决策），每次使用不同的事发地点和出发地点"""
+    from agents.decision_agent import create_decision_llm
+    from utils.dispatch import LOCATION_BREAKER, run_dispatch
+    from utils.runtime import LocationAgentPool
+    from utils.utils import format_warehouse_data_for_llm
+
+    rng = random.Random(seed)
+    min_lng, min_lat, max_lng, max_lat = CHENGDU_BOUNDS
+    pool = LocationAgentPool(server_config_path, size=pool_size)
+    try:
+        with quiet(not verbose):
+            decision_llm = create_decision_llm() if make_decision else None
+            warehouse_texts = format_warehouse_data_for_llm(warehouse_data)
+            # 建立MCP连接不计入调度耗时
+            for _ in range(pool_size):
+                async with pool.lease():
+                    pass
+        latency_registry.reset()
+
+        timings = {'distances': [], 'decision': [], 'total': []}
+        routes = failed = estimated = 0
+        for run in range(runs):
+            incident = f"{rng.uniform(min_lng, max_lng):.6f},{rng.uniform(min_lat, max_lat):.6f}"
+            departure = DEPARTURE_NAMES[run % len(DEPARTURE_NAMES)]
+            with quiet(not verbose):
+                result = await run_dispatch(
+                    pool, decision_llm, warehouse_data, incident, departure,
+                    personnel_count=20, vehicle_count=4, fire_description='居民楼火灾，火势中等，有人员被困',
+                    warehouse_texts=warehouse_texts, make_decision=make_decision
+                )
+            for stage, seconds in result['timings'].items():
+                timings[stage].append(seconds)
+            for distance in result['incident_distances'] + result['departure_distances']:
+                routes += 1
+                failed += not distance['success']
+                estimated += bool(distance.get('estimated'))
+        return {
+            'warehouses': len(warehouse_data['warehouses']),
+            'runs': runs,
+            'routes': routes,
+            'failed_routes': failed,
+            'estimated_routes': estimated,
+            'timings': {stage: summarize(values) for stage, values in timings.items() if values},
+            'stages': stage_report(),
+            'location_breaker': LOCATION_BREAKER.stats()
+        }
+    finally:
+        with quiet(not verbose):
+            await pool.close()
+
+def print_dispatch(result):
+    timings = result['timings']
+    print(f"  {result['warehouses']}个仓库: 总耗时 p50={timings['total']['p50']}s p95={timings['total']['p95']}s，"
+          f"距离 p50={timings['distances']['p50']}s" +
+          (f"，决策 p50={timings['decision']['p50']}s" if 'decision' in timings else '') +
+          f"（{result['routes']}条路线，失败{result['failed_routes']}，估算{result['estimated_routes']}）")
+    print_stages(result['stages'])
+
+def print_stages(stages):
+    for name, stats in stages.items():
+        print(f"    {name:<40}{stats['count']:>6}次  p50={stats['p50']}s  p95={stats['p95']}s"
+              f"  错误{stats['errors']}  超时{stats['timeouts']}  重试{stats['retries']}  对冲{stats['hedges']}")
+
+def parse_sizes(text):
+    return [int(value) for value in text.split(',') if value.strip()]
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='5,20,50', help='调度流程测试的仓库数量（逗号分隔）')
+    parser.add_argument('--converter-sizes', default='5,10,20', help='转换脚本测试的仓库数量（逗号分隔，距离计算为平方级）')
+    parser.add_argument('--runs', type=int, default=3, help='每个仓库数量下的调度次数')
+    parser.add_argument('--pool-size', type=int, default=2, help='地图代理连接池大小')
+    parser.add_argument('--no-decision', action='store_true', help='调度流程只计算距离，不调用决策模型')
+    parser.add_argument('--no-converter', action='store_true', help='不测试转换脚本')
+    parser.add_argument('--no-dispatch', action='store_true', help='不测试调度流程')
+    parser.add_argument('--template', help='仓库模板JSON，默认为 data/resource.json')
+    parser.add_argument('--amap-latency', type=float, default=0.05, help='模拟地图工具的固定延迟（秒）')
+    parser.add_argument('--amap-jitter', type=float, default=0.02, help='模拟地图工具的随机抖动上限（秒）')
+    parser.add_argument('--amap-error-rate', type=float, default=0.0, help='模拟地图工具的错误比例')
+    parser.add_argument('--llm-latency', type=float, default=0.2, help='模拟模型的固定延迟（秒）')
+    parser.add_argument('--llm-jitter', type=float, default=0.1, help='模拟模型的随机抖动上限（秒）')
+    parser.add_argument('--llm-error-rate', type=float, default=0.0, help='模拟模型的错误比例')
+    parser.add_argument('--server-config', help='使用已运行的地图服务（servers_config.json），不启动模拟服务')
+    parser.add_argument('--llm-base', help='使用已运行的OpenAI兼容服务地址（需同时指定 --server-config）')
+    parser.add_argument('--seed', type=int, default=0, help='仓库坐标、事发地点和故障注入的随机数种子')
+    parser.add_argument('--verbose', action='store_true', help='显示代理和转换脚本的逐步输出')
+    parser.add_argument('--json', help='将结果写入JSON文件')
+
+    args = parser.parse_args()
+    if bool(args.server_config) != bool(args.llm_base):
+        parser.error('--server-config 和 --llm-base 需要同时指定')
+
+    template = args.template or os.path.join(PROJECT_ROOT, "data", "resource.json")
+    report = {'config': vars(args), 'converter': [], 'dispatch': []}
+    with tempfile.TemporaryDirectory(prefix='benchmark_') as workdir:
+        process = None
+        if args.server_config:
+            server_config_path, llm_base = args.server_config, args.llm_base
+        else:
+            process, server_config_path, llm_base = start_mock_services(args, workdir)
+            print(f"模拟服务已启动（地图 {server_config_path}，模型 {llm_base}）")
+        os.environ['MODELSCOPE_API_BASE'] = llm_base
+        os.environ.setdefault('MODELSCOPE_API_KEY', 'mock')
+
+        def resource_path(count):
+            path = os.path.join(workdir, f"resource_{count}.json")
+            if not os.path.exists(path):
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(scale_resource(template, count, args.seed), f, ensure_ascii=False)
+            return path
+
+        try:
+            if not args.no_converter:
+                print("\n转换脚本（计算仓库间距离）:")
+                for count in parse_sizes(args.converter_sizes):
+                    result = run_converter_benchmark(resource_path(count), workdir, count, server_config_path,
+                                                     args.verbose)
+                    report['converter'].append(result)
+                    print(f"  {count}个仓库 / {result['pairs']}对: 共{result['seconds']}s（写出{result['write_seconds']}s），"
+                          f"{result['pairs_per_second']}对/秒")
+                    print_stages(result['stages'])
+
+            if not args.no_dispatch:
+                from scripts.json_to_xlsx_converter import convert_json_to_xlsx
+                from utils.utils import load_warehouse_data
+
+                datasets = []
+                for count in parse_sizes(args.sizes):
+                    xlsx_path = os.path.join(workdir, f"dispatch_{count}.xlsx")
+                    with quiet(not args.verbose):
+                        convert_json_to_xlsx(resource_path(count), xlsx_path, False, None)
+                        datasets.append(load_warehouse_data(xlsx_path))
+
+                async def run_dispatch_benchmarks():
+                    # 全部规模在同一个事件循环中运行（模型客户端的连接池不能跨事件循环复用）
+                    for warehouse_data in datasets:
+                        result = await benchmark_dispatch(
+                            warehouse_data, args.runs, server_config_path, args.pool_size,
+                            make_decision=not args.no_decision, seed=args.seed, verbose=args.verbose
+                        )
+                        report['dispatch'].append(result)
+                        print_dispatch(result)
+
+                print(f"\n调度流程（每个规模{args.runs}次，{'含' if not args.no_decision else '不含'}作战决策）:")
+                asyncio.run(run_dispatch_benchmarks())
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=10)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import asyncio
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.utils import load_warehouse_data
+from utils.geo import DEFAULT_TRAVEL_ESTIMATOR
+from utils.coverage import DEFAULT_GRID_PATH, build_coverage_grid, route_coverage_grid
+
+def parse_bounds(text):
+    """解析服务区域：最小经度,最小纬度,最大经度,最大纬度"""
+    values = [float(value) for value in text.split(',')]
+    if len(values) != 4:
+        raise ValueError(f"服务区域格式应为 最小经度,最小纬度,最大经度,最大纬度: {text}")
+    return tuple(values)
+
+async def route_grid_async(grid, warehouses, server_config_path, candidates):
+    """用地图服务实测网格中心到候选仓库的路线"""
+    from agents.locate_agent import create_location_agent
+
+    agent = await create_location_agent(server_config_path)
+    try:
+        def report(done, total):
+            if done % 50 == 0 or done == total:
+                print(f"  进度: {done}/{total} 个网格")
+
+        return await route_coverage_grid(grid, agent, warehouses, candidates, progress_callback=report)
+    finally:
+        if hasattr(agent, 'disconnect'):
+            await agent.disconnect()
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='离线生成服务区域覆盖网格：每个网格预先计算最快的K个仓库及行驶时间')
+    parser.add_argument('--xlsx', help='仓库数据Excel文件路径')
+    parser.add_argument('--output', '-o', default=DEFAULT_GRID_PATH, help='输出 .npz 文件路径')
+    parser.add_argument('--cell-km', type=float, default=1.0, help='网格边长（公里）')
+    parser.add_argument('-k', type=int, default=5, help='每个网格保存的仓库数')
+    parser.add_argument('--margin-km', type=float, default=5.0, help='仓库分布范围外扩的距离（公里）')
+    parser.add_argument('--bounds', help='服务区域 最小经度,最小纬度,最大经度,最大纬度（默认按仓库分布外扩）')
+    parser.add_argument('--backend', choices=['estimate', 'map'], default='estimate',
+                        help='estimate: 直线距离估算（使用仓库间实测路线标定）；map: 地图服务实测')
+    parser.add_argument('--candidates', type=int, help='map模式下每个网格实测的仓库数，默认2K')
+    parser.add_argument('--config', default='configs/servers_config.json', help='MCP服务器配置文件路径')
+
+    args = parser.parse_args()
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    xlsx_file = args.xlsx or os.path.join(project_root, "data", "resource.xlsx")
+
+    warehouse_data = load_warehouse_data(xlsx_file)
+    if not warehouse_data:
+        print(f"错误: 无法读取仓库数据 {xlsx_file}")
+        return
+    warehouses = warehouse_data['warehouses']
+    if DEFAULT_TRAVEL_ESTIMATOR.calibrate_from_warehouse_data(warehouse_data):
+        print(f"估算参数已标定: 绕行系数 {DEFAULT_TRAVEL_ESTIMATOR.detour_factor:.2f}, "
+              f"平均车速 {DEFAULT_TRAVEL_ESTIMATOR.speed_kmh:.1f}km/h")
+
+    started = time.perf_counter()
+    grid = build_coverage_grid(
+        warehouses, cell_km=args.cell_km, k=args.k, margin_km=args.margin_km,
+        bounds=parse_bounds(args.bounds) if args.bounds else None
+    )
+    print(f"网格: {grid.rows}行 × {grid.cols}列 = {len(grid)} 个（边长 {grid.cell_km}公里），每格 {grid.k} 个仓库")
+
+    if args.backend == 'map':
+        print(f"开始用地图服务实测路线（约 {len(grid) * (args.candidates or grid.k * 2)} 次查询）...")
+        routed = asyncio.run(route_grid_async(grid, warehouses, args.config, args.candidates))
+        print(f"实测成功 {routed} 条路线，其余保留估算值")
+
+    grid.save(args.output)
+    print(f"\n覆盖网格已保存到: {args.output}")
+    print(f"- 数组大小: {grid.nbytes / 1024:.1f}KB")
+    print(f"- 用时: {time.perf_counter() - started:.2f}秒")
+
+if __name__ == "__main__":
+    main()
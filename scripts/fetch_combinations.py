@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+import time
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.utils import load_warehouse_data
+from utils.geo import DEFAULT_TRAVEL_ESTIMATOR
+from utils.dispatch import offline_distance_results
+from utils.records import WarehouseTable
+from utils.rebalance import warehouse_travel_matrix
+from utils.robustness import RouteLegs
+from utils.combinations import evaluate_combinations, requirement_stock
+
+def parse_requirements(values, personnel):
+    """--need 呼吸器=20 形式的需求；指定 --personnel 时默认每人一套呼吸器和防护服"""
+    requirements = {}
+    if personnel:
+        requirements.update({'呼吸器': personnel, '防护服': personnel})
+    for value in values or []:
+        keyword, _, quantity = value.partition('=')
+        if not keyword or not quantity:
+            raise ValueError(f"无法解析需求 {value}，格式应为 物资名称=数量")
+        requirements[keyword.strip()] = float(quantity)
+    return requirements
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='计算出发地→若干仓库→事发地的全部仓库组合的最优访问顺序，按物资满足程度和到场时间排名')
+    parser.add_argument('--xlsx', help='仓库数据Excel文件路径')
+    parser.add_argument('--incident', required=True, help='事发地点坐标（经度,纬度）')
+    parser.add_argument('--departure', required=True, help='出发地点坐标或已登记的出发地点名称')
+    parser.add_argument('--personnel', type=int, help='出动人数（每人一套呼吸器和防护服）')
+    parser.add_argument('--need', action='append', help='物资需求，格式 物资名称=数量，可重复指定')
+    parser.add_argument('--max-stops', type=int, default=3, help='一条路线最多经过的仓库数')
+    parser.add_argument('--stop-minutes', type=float, default=5.0, help='每个仓库的装载时间（分钟）')
+    parser.add_argument('--max-minutes', type=float, help='只保留到场时间不超过该值（分钟）的组合')
+    parser.add_argument('--pool-size', type=int, help='只考虑时间下界最小的若干仓库')
+    parser.add_argument('--top', type=int, default=10, help='输出排名前几的组合')
+    parser.add_argument('--output', '-o', help='将结果写入JSON文件')
+
+    args = parser.parse_args()
+    try:
+        requirements = parse_requirements(args.need, args.personnel)
+    except ValueError as e:
+        parser.error(str(e))
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    xlsx_file = args.xlsx or os.path.join(project_root, "data", "resource.xlsx")
+    warehouse_data = load_warehouse_data(xlsx_file)
+    if not warehouse_data:
+        print(f"错误: 无法读取仓库数据 {xlsx_file}")
+        return
+    warehouses = warehouse_data['warehouses']
+    DEFAULT_TRAVEL_ESTIMATOR.calibrate_from_warehouse_data(warehouse_data)
+    table = WarehouseTable.from_warehouse_data(warehouse_data)
+    between, _ = warehouse_travel_matrix(table, warehouse_data)
+    legs = RouteLegs.from_distance_results(offline_distance_results(args.incident, warehouses),
+                                           offline_distance_results(args.departure, warehouses), between)
+    stock, need = requirement_stock(table, requirements) if requirements else (None, None)
+
+    started = time.perf_counter()
+    try:
+        results, stats = evaluate_combinations(
+            legs, max_stops=args.max_stops, stock=stock, need=need, stop_minutes=args.stop_minutes,
+            top=args.top, pool_size=args.pool_size, max_minutes=args.max_minutes
+        )
+    except ValueError as e:
+        print(f"错误: {e}")
+        return
+    seconds = time.perf_counter() - started
+
+    print(f"{stats['candidates']} 个候选仓库，评估 {stats['evaluated']} 个组合（各规模 {stats['levels']}），"
+          f"用时 {seconds:.3f}秒")
+    if requirements:
+        print("需求: " + "，".join(f"{keyword}{quantity:g}" for keyword, quantity in requirements.items()))
+    for rank, result in enumerate(results, 1):
+        note = "满足需求" if result['shortfall'] == 0 else f"缺口{result['shortfall']:g}件"
+        print(f"{rank:>3}. {' → '.join(result['warehouses'])}：{result['minutes']:.1f}分钟" +
+              (f"，{note}" if requirements else ''))
+
+    if args.output:
+        report = {'requirements': requirements, 'seconds': round(seconds, 3), 'stats': stats, 'combinations': results}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import json
+import os
+import random
+
+# 成都市区的行政区及其大致中心坐标（经度, 纬度）
+CHENGDU_DISTRICTS = [
+    ('青羊区', 104.06, 30.67), ('锦江区', 104.08, 30.65), ('金牛区', 104.05, 30.70),
+    ('武侯区', 104.04, 30.63), ('成华区', 104.10, 30.68), ('高新区', 104.07, 30.58),
+    ('郫都区', 103.90, 30.80), ('双流区', 103.92, 30.57), ('龙泉驿区', 104.27, 30.56),
+    ('新都区', 104.16, 30.82), ('温江区', 103.84, 30.69)
+]
+
+# 全省网络：各地级市的主城区及其大致中心坐标
+SICHUAN_CITIES = [
+    ('成都市', '青羊区', 104.06, 30.67), ('绵阳市', '涪城区', 104.74, 31.46), ('德阳市', '旌阳区', 104.40, 31.13),
+    ('宜宾市', '翠屏区', 104.64, 28.75), ('南充市', '顺庆区', 106.11, 30.84), ('泸州市', '江阳区', 105.44, 28.87),
+    ('乐山市', '市中区', 103.77, 29.55), ('达州市', '通川区', 107.47, 31.21), ('自贡市', '自流井区', 104.78, 29.34),
+    ('内江市', '市中区', 105.06, 29.58), ('遂宁市', '船山区', 105.59, 30.53), ('眉山市', '东坡区', 103.85, 30.08),
+    ('广安市', '广安区', 106.63, 30.46), ('攀枝花市', '东区', 101.72, 26.58), ('西昌市', '西昌市', 102.26, 27.89)
+]
+
+ADDRESS_SUFFIXES = ['路', '大道', '街', '巷', '物流园', '工业园']
+SURNAMES = '张王李赵刘陈杨黄周吴徐孙马朱胡郭何林罗高'
+GIVEN_NAMES = '明华强伟军芳敏静丽勇杰涛磊洋艳斌'
+
+def load_catalog(template_path):
+    """从真实的 resource.json 中收集物资目录：[(类别键, 物资键, 物资信息)]，按首次出现的顺序"""
+    with open(template_path, 'r', encoding='utf-8') as f:
+        source = json.load(f)
+    catalog, seen = [], set()
+    for warehouse in source['warehouses']:
+        for category, items in warehouse['resources'].items():
+            for key, item in items.items():
+                if (category, key) not in seen:
+                    seen.add((category, key))
+                    catalog.append((category, key, item))
+    return catalog, source.get('metadata', {})
+
+def expand_catalog(catalog, size):
+    """物资目录扩充到至少 size 种：超出真实目录的部分为编号型号（键加 _2、名称加 (2型)）"""
+    expanded = list(catalog)
+    variant = 2
+    while len(expanded) < size:
+        for category, key, item in catalog:
+            expanded.append((category, f"{key}_{variant}", {
+                **item, 'type': f"{item['type']}({variant}型)", 'specification': f"{item['specification']} {variant}型"
+            }))
+        variant += 1
+    return expanded
+
+def generate_resource_data(warehouses, items_per_warehouse, seed=0, province=False, template_path=None):
+    """生成与 data/resource.json 结构相同的数据：warehouses 个仓库，每个仓库 items_per_warehouse 种物资
+
+    province 为 True 时仓库分布在全省各市主城区，否则分布在成都市各区
+    """
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    catalog, metadata = load_catalog(template_path or os.path.join(project_root, "data", "resource.json"))
+    catalog = expand_catalog(catalog, items_per_warehouse)
+    rng = random.Random(seed)
+    places = SICHUAN_CITIES if province else [('成都市', *district) for district in CHENGDU_DISTRICTS]
+    spread = 0.08 if province else 0.04
+
+    generated = []
+    for index in range(warehouses):
+        city, district, lng, lat = places[index % len(places)]
+        total_area = rng.randrange(1000, 10001, 100)
+        phone_prefix = f"0{rng.randint(28, 839)}"
+        resources = {}
+        for position in sorted(rng.sample(range(len(catalog)), items_per_warehouse)):
+            category, key, item = catalog[position]
+            quantity = max(1, round(item['quantity'] * rng.uniform(0.3, 2.0)))
+            resources.setdefault(category, {})[key] = {**item, 'quantity': quantity}
+        generated.append({
+            'id': f"WH{index + 1:03d}",
+            'name': f"{district}{index + 1}号应急仓库",
+            'location': {
+                'address': f"{district}{rng.choice('东南西北')}{rng.randint(1, 9)}{rng.choice(ADDRESS_SUFFIXES)}"
+                           f"{rng.randint(1, 999)}号",
+                'longitude': round(lng + rng.uniform(-spread, spread), 6),
+                'latitude': round(lat + rng.uniform(-spread, spread), 6),
+                'city': city,
+                'district': district
+            },
+            'capacity': {
+                'total_area': total_area,
+                'available_area': round(total_area * rng.uniform(0.5, 0.95)),
+                'max_weight': rng.randrange(200, 2001, 50)
+            },
+            'resources': resources,
+            'contact': {
+                'manager': rng.choice(SURNAMES) + ''.join(rng.sample(GIVEN_NAMES, rng.randint(1, 2))),
+                'phone': f"{phone_prefix}-{rng.randint(10000000, 99999999)}",
+                'emergency_phone': f"{phone_prefix}-{rng.randint(10000000, 99999999)}"
+            }
+        })
+
+    description = "四川省火灾应急物资仓库信息数据库（合成）" if province else "成都市火灾应急物资仓库信息数据库（合成）"
+    return {'warehouses': generated, 'metadata': {**metadata, 'description': description}}
+
+def write_resource_json(path, warehouses, items_per_warehouse, seed=0, province=False, template_path=None):
+    """生成数据并写入 path，返回写出的数据"""
+    data = generate_resource_data(warehouses, items_per_warehouse, seed=seed, province=province,
+                                  template_path=template_path)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return data
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='生成指定规模的合成 resource.json（结构与真实数据相同）')
+    parser.add_argument('--warehouses', '-n', type=int, required=True, help='仓库数量')
+    parser.add_argument('--items', '-m', type=int, default=20, help='每个仓库的物资种类数')
+    parser.add_argument('--province', action='store_true', help='仓库分布在全省各市，而不是只在成都市')
+    parser.add_argument('--template', help='提供物资目录的 resource.json，默认 data/resource.json')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+    parser.add_argument('--output', '-o', help='输出路径，默认 data/resource_<仓库数>x<物资种类数>.json')
+
+    args = parser.parse_args()
+    if args.warehouses < 1 or args.items < 1:
+        parser.error('仓库数量和物资种类数必须为正数')
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = args.output or os.path.join(project_root, "data", f"resource_{args.warehouses}x{args.items}.json")
+    data = write_resource_json(output, args.warehouses, args.items, seed=args.seed, province=args.province,
+                               template_path=args.template)
+    resources = sum(len(items) for warehouse in data['warehouses'] for items in warehouse['resources'].values())
+    print(f"已生成 {len(data['warehouses'])} 个仓库、{resources} 条物资记录: {output}")
+
+if __name__ == "__main__":
+    main()
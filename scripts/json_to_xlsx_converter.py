@@ -1,43 +1,16 @@
 import json
-import pandas as pd
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
-from openpyxl.utils.dataframe import dataframe_to_rows
 import os
 import sys
 import asyncio
-import re
 
 # 添加项目根目录到路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from agents.locate_agent import create_location_agent
+from utils.retry import LOCATION_RETRY_POLICY, RetryError, latency_registry
+from utils.utils import write_warehouse_xlsx, print_conversion_stats
+from utils.json_stream import StreamingResourceJson
 
-def parse_distance_info(response_text):
-    """解析距离信息，提取关键数据"""
-    # 尝试从响应中提取距离和时间信息
-    distance_match = re.search(r'(\d+\.?\d*)公里', response_text)
-    time_match = re.search(r'(\d+)分钟', response_text)
-    
-    if distance_match and time_match:
-        return {
-            'distance': f"{distance_match.group(1)}公里",
-            'duration': f"{time_match.group(1)}分钟",
-            'distance_km': float(distance_match.group(1)),
-            'duration_min': int(time_match.group(1)),
-            'success': True
-        }
-    else:
-        return {
-            'distance': '未知',
-            'duration': '未知',
-            'distance_km': None,
-            'duration_min': None,
-            'success': False,
-            'raw_response': response_text
-        }
-
-async def calculate_warehouse_to_warehouse_distance(agent, warehouse1, warehouse2, max_retries=3):
+async def calculate_warehouse_to_warehouse_distance(agent, warehouse1, warehouse2, max_retries=3, retry_policy=None):
     """计算两个仓库之间的距离"""
     # 使用经纬度坐标进行计算
     warehouse1_lng = warehouse1['location']['longitude']
@@ -49,36 +22,40 @@ async def calculate_warehouse_to_warehouse_distance(agent, warehouse1, warehouse
     warehouse2_location = f"{warehouse2_lng},{warehouse2_lat}"
     
     query = f"从{warehouse1_location}到{warehouse2_location}的车辆行驶距离"
+    policy = retry_policy or LOCATION_RETRY_POLICY.with_options(max_attempts=max_retries)
     
-    for attempt in range(max_retries):
-        try:
-            if attempt > 0:
-                print(f"  重试第 {attempt} 次: {warehouse1['name']} → {warehouse2['name']}")
-            
-            response = await agent.process_query(query)
-            parsed_info = parse_distance_info(response)
-            
-            if parsed_info['success']:
-                return {
-                    'from_warehouse': warehouse1['name'],
-                    'to_warehouse': warehouse2['name'],
-                    'from_id': warehouse1['id'],
-                    'to_id': warehouse2['id'],
-                    'distance': parsed_info['distance'],
-                    'duration': parsed_info['duration'],
-                    'distance_km': parsed_info['distance_km'],
-                    'duration_min': parsed_info['duration_min'],
-                    'success': True,
-                    'attempts': attempt + 1
-                }
-            else:
-                print(f"  解析失败: {parsed_info.get('raw_response', '无响应')}")
-                
-        except Exception as e:
-            print(f"  计算出错: {str(e)}")
-            
-        if attempt < max_retries - 1:
-            await asyncio.sleep(1)  # 重试前等待1秒
+    from utils.dispatch import parse_distance_info
+    
+    async def query_route():
+        # 路线工具返回后直接使用其中的米、秒数值，不再等模型转述
+        response = await agent.process_query(query, isolated=True, detailed=True, stop_on_route=True)
+        parsed_info = parse_distance_info(response)
+        if not parsed_info['success']:
+            print(f"  解析失败: {parsed_info.get('raw_response', '无响应')}")
+        return parsed_info
+    
+    try:
+        parsed_info, attempts = await policy.run(
+            'location.inter_warehouse',
+            query_route,
+            # 仓库间距离表需要距离和时间两项
+            is_success=lambda info: info['success'] and info['duration_s'] is not None
+        )
+        return {
+            'from_warehouse': warehouse1['name'],
+            'to_warehouse': warehouse2['name'],
+            'from_id': warehouse1['id'],
+            'to_id': warehouse2['id'],
+            'distance': parsed_info['distance'],
+            'duration': parsed_info['duration'],
+            'distance_km': round(parsed_info['distance_m'] / 1000, 3),
+            'duration_min': round(parsed_info['duration_s'] / 60, 1),
+            'success': True,
+            'attempts': attempts
+        }
+    except RetryError as e:
+        if e.last_exception is not None:
+            print(f"  计算出错: {str(e.last_exception)}")
     
     # 所有重试都失败了
     print(f"  计算失败: {warehouse1['name']} → {warehouse2['name']}")
@@ -92,7 +69,7 @@ async def calculate_warehouse_to_warehouse_distance(agent, warehouse1, warehouse
         'distance_km': None,
         'duration_min': None,
         'success': False,
-        'attempts': max_retries
+        'attempts': policy.max_attempts
     }
 
 async def calculate_all_warehouse_distances(agent, warehouses):
@@ -120,222 +97,114 @@ async def calculate_all_warehouse_distances(agent, warehouses):
     
     return distances
 
-def convert_json_to_xlsx(json_file_path, xlsx_file_path, calculate_distances=True):
+def parse_station_spec(spec):
+    """解析 --add-station 参数：名称 或 名称=经度,纬度（格式错误时抛出 ValueError）"""
+    from utils.geo import parse_coordinates
+    
+    name, _, coordinates = spec.partition('=')
+    name, coordinates = name.strip(), coordinates.strip() or None
+    if not name:
+        raise ValueError(f"--add-station {spec!r} 缺少出发地点名称")
+    if coordinates is not None and parse_coordinates(coordinates) is None:
+        raise ValueError(f"--add-station {spec!r} 的坐标格式无效（应为 名称=经度,纬度）")
+    return name, coordinates
+
+async def register_stations(agent, registry, station_specs):
+    """登记出发地点，未给出坐标的通过地图服务解析"""
+    from utils.dispatch import get_location_coordinates, is_coordinates
+    
+    for name, coordinates in station_specs:
+        if not coordinates:
+            coordinates = await get_location_coordinates(agent, name)
+            if not is_coordinates(coordinates):
+                print(f"  ✗ 无法获取出发地点 {name} 的坐标，跳过登记")
+                continue
+        try:
+            station = registry.add_station(name, coordinates)
+        except ValueError as e:
+            # 登记冲突只跳过该地点，不影响已计算的仓库间距离和其他地点
+            print(f"  ✗ {e}，跳过登记")
+            continue
+        if station['name'] != name:
+            print(f"  ✓ {name} 为已登记出发地点 {station['name']} 的别名，已更新其坐标 ({coordinates})")
+        else:
+            print(f"  ✓ 已登记出发地点: {name} ({coordinates})")
+
+async def calculate_station_routes(agent, registry, warehouses):
+    """补算已登记出发地点到各仓库的路线（只计算缺少或已失效的组合，只记录实测成功的结果）
+    
+    Returns:
+        tuple: (成功数量, 需要计算的数量)
     """
-    将JSON格式的仓库数据转换为Excel格式
+    from utils.dispatch import calculate_single_warehouse_distance
+    
+    missing = registry.missing_routes(warehouses)
+    if not missing:
+        print("所有出发地点的路线均已预计算")
+        return 0, 0
+    
+    print(f"开始计算 {len(registry)} 个出发地点到仓库的路线（缺少 {len(missing)} 条）...")
+    succeeded = 0
+    for index, (station, warehouse) in enumerate(missing, 1):
+        print(f"\n进度: {index}/{len(missing)} - 计算 {station['name']} → {warehouse['name']}")
+        result = await calculate_single_warehouse_distance(agent, station['coordinates'], warehouse)
+        if result['success'] and not result.get('estimated'):
+            registry.set_route(station, warehouse, result['distance'], result['duration'],
+                               result.get('distance_m'), result.get('duration_s'))
+            succeeded += 1
+            print(f"  ✓ 成功: {result['distance']}, {result['duration']}")
+        else:
+            print(f"  ✗ 失败: {result['distance']}")
+    return succeeded, len(missing)
+
+def convert_json_to_xlsx(json_file_path, xlsx_file_path, calculate_distances=True, columnar_dir=None,
+                         stations_path=None, station_specs=(), server_config_path="configs/servers_config.json"):
     """
-    # 读取JSON文件
-    with open(json_file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    # 创建Excel工作簿
-    wb = Workbook()
-    
-    # 删除默认工作表
-    wb.remove(wb.active)
-    
-    # 1. 创建仓库基本信息工作表
-    ws_basic = wb.create_sheet("仓库基本信息")
-    basic_data = []
-    
-    for warehouse in data['warehouses']:
-        basic_info = {
-            '仓库ID': warehouse['id'],
-            '仓库名称': warehouse['name'],
-            '地址': warehouse['location']['address'],
-            '经度': warehouse['location']['longitude'],
-            '纬度': warehouse['location']['latitude'],
-            '城市': warehouse['location']['city'],
-            '行政区': warehouse['location']['district'],
-            '总面积(平方米)': warehouse['capacity']['total_area'],
-            '可用面积(平方米)': warehouse['capacity']['available_area'],
-            '最大载重(吨)': warehouse['capacity']['max_weight'],
-            '负责人': warehouse['contact']['manager'],
-            '联系电话': warehouse['contact']['phone'],
-            '应急电话': warehouse['contact']['emergency_phone']
-        }
-        basic_data.append(basic_info)
-    
-    df_basic = pd.DataFrame(basic_data)
-    
-    # 将数据写入工作表
-    for r in dataframe_to_rows(df_basic, index=False, header=True):
-        ws_basic.append(r)
-    
-    # 设置标题样式
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    
-    for cell in ws_basic[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal="center")
-    
-    # 自动调整列宽
-    for column in ws_basic.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws_basic.column_dimensions[column_letter].width = adjusted_width
-    
-    # 2. 创建物资详细信息工作表
-    ws_resources = wb.create_sheet("物资详细信息")
-    resources_data = []
-    
-    for warehouse in data['warehouses']:
-        warehouse_id = warehouse['id']
-        warehouse_name = warehouse['name']
-        
-        for category, items in warehouse['resources'].items():
-            category_name = {
-                'fire_extinguishing': '灭火设备',
-                'rescue_equipment': '救援装备',
-                'medical_supplies': '医疗用品',
-                'communication': '通信设备',
-                'evacuation': '疏散设备',
-                'heavy_equipment': '重型装备',
-                'logistics': '后勤保障',
-                'command_center': '指挥中心'
-            }.get(category, category)
-            
-            for item_key, item_info in items.items():
-                resource_info = {
-                    '仓库ID': warehouse_id,
-                    '仓库名称': warehouse_name,
-                    '物资类别': category_name,
-                    '物资名称': item_info['type'],
-                    '数量': item_info['quantity'],
-                    '单位': item_info['unit'],
-                    '规格说明': item_info['specification']
-                }
-                resources_data.append(resource_info)
-    
-    df_resources = pd.DataFrame(resources_data)
-    
-    # 将数据写入工作表
-    for r in dataframe_to_rows(df_resources, index=False, header=True):
-        ws_resources.append(r)
-    
-    # 设置标题样式
-    for cell in ws_resources[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal="center")
-    
-    # 自动调整列宽
-    for column in ws_resources.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws_resources.column_dimensions[column_letter].width = adjusted_width
-    
-    # 3. 创建物资统计汇总工作表
-    ws_summary = wb.create_sheet("物资统计汇总")
-    
-    # 按物资类别统计总数量
-    summary_data = {}
-    for warehouse in data['warehouses']:
-        for category, items in warehouse['resources'].items():
-            category_name = {
-                'fire_extinguishing': '灭火设备',
-                'rescue_equipment': '救援装备',
-                'medical_supplies': '医疗用品',
-                'communication': '通信设备',
-                'evacuation': '疏散设备',
-                'heavy_equipment': '重型装备',
-                'logistics': '后勤保障',
-                'command_center': '指挥中心'
-            }.get(category, category)
-            
-            for item_key, item_info in items.items():
-                item_name = item_info['type']
-                quantity = item_info['quantity']
-                unit = item_info['unit']
-                
-                if item_name not in summary_data:
-                    summary_data[item_name] = {
-                        '物资名称': item_name,
-                        '物资类别': category_name,
-                        '总数量': 0,
-                        '单位': unit
-                    }
-                summary_data[item_name]['总数量'] += quantity
-    
-    df_summary = pd.DataFrame(list(summary_data.values()))
-    df_summary = df_summary.sort_values(['物资类别', '物资名称'])
-    
-    # 将数据写入工作表
-    for r in dataframe_to_rows(df_summary, index=False, header=True):
-        ws_summary.append(r)
-    
-    # 设置标题样式
-    for cell in ws_summary[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal="center")
-    
-    # 自动调整列宽
-    for column in ws_summary.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 30)
-        ws_summary.column_dimensions[column_letter].width = adjusted_width
-    
-    # 4. 创建元数据信息工作表
-    ws_metadata = wb.create_sheet("元数据信息")
-    metadata = data['metadata']
-    
-    metadata_info = [
-        ['数据库描述', metadata['description']],
-        ['版本', metadata['version']],
-        ['最后更新时间', metadata['last_updated']],
-        ['坐标系统', metadata['coordinate_system']],
-        ['距离单位', metadata['units']['distance']],
-        ['重量单位', metadata['units']['weight']],
-        ['面积单位', metadata['units']['area']]
-    ]
-    
-    for row in metadata_info:
-        ws_metadata.append(row)
-    
-    # 设置元数据工作表样式
-    for row in ws_metadata.iter_rows():
-        row[0].font = Font(bold=True)
-        row[0].fill = PatternFill(start_color="E6E6FA", end_color="E6E6FA", fill_type="solid")
+    将JSON格式的仓库数据转换为Excel格式
     
-    ws_metadata.column_dimensions['A'].width = 20
-    ws_metadata.column_dimensions['B'].width = 40
+    按仓库逐个流式读取JSON并在同一遍中写出所有工作表；计算距离时先单独读取一遍
+    仓库的位置信息（不含物资）。指定columnar_dir时在同一遍中写出列式数据（Arrow/Parquet）。
+    指定stations_path时登记station_specs中的出发地点，并补算出发地点到各仓库的路线表。
+    server_config_path 为地图服务配置（如指向 scripts/mock_services.py 的本地模拟服务）。
+    """
+    source = StreamingResourceJson(json_file_path)
     
-    # 5. 计算仓库间距离（如果启用）
+    # 计算仓库间距离（如果启用）；代理相关依赖较慢，在此时才导入，--no-distances 时不加载
     distances_data = []
-    if calculate_distances and len(data['warehouses']) > 1:
-        print("\n开始计算仓库间距离...")
+    locations = []
+    registry = None
+    if calculate_distances:
+        locations = [
+            {'id': warehouse['id'], 'name': warehouse['name'], 'location': warehouse['location']}
+            for warehouse in source.warehouses()
+        ]
+        if stations_path:
+            from utils.stations import StationRegistry
+            registry = StationRegistry.load(stations_path)
+    compute_pairs = calculate_distances and len(locations) > 1
+    compute_stations = registry is not None and bool(locations) and (len(registry) or station_specs)
+    if compute_pairs or compute_stations:
         try:
             # 异步函数来处理距离计算
             async def calculate_distances_async():
+                from agents.locate_agent import create_location_agent
+                
                 # 创建地图代理
-                agent = await create_location_agent()
+                agent = await create_location_agent(server_config_path)
                 try:
-                    # 计算所有仓库间距离
-                    return await calculate_all_warehouse_distances(agent, data['warehouses'])
+                    pair_distances = []
+                    if compute_pairs:
+                        # 计算所有仓库间距离
+                        print("\n开始计算仓库间距离...")
+                        pair_distances = await calculate_all_warehouse_distances(agent, locations)
+                    if compute_stations:
+                        # 登记出发地点并补算路线表（计算完即保存，仓库间距离失败也不影响）
+                        print("\n开始更新出发地点路线表...")
+                        await register_stations(agent, registry, station_specs)
+                        succeeded, total = await calculate_station_routes(agent, registry, locations)
+                        registry.save(stations_path)
+                        print(f"\n出发地点路线表已保存到: {stations_path}（新增 {succeeded}/{total} 条）")
+                    return pair_distances
                 finally:
                     # 确保断开连接
                     if hasattr(agent, 'disconnect'):
@@ -345,52 +214,8 @@ def convert_json_to_xlsx(json_file_path, xlsx_file_path, calculate_distances=Tru
             distances_data = asyncio.run(calculate_distances_async())
             
             if distances_data:
-                # 创建仓库距离工作表
-                ws_distances = wb.create_sheet("仓库间距离")
-                
-                # 准备距离数据
-                distance_rows = []
-                for dist in distances_data:
-                    distance_rows.append({
-                        '起始仓库ID': dist['from_id'],
-                        '起始仓库名称': dist['from_warehouse'],
-                        '目标仓库ID': dist['to_id'],
-                        '目标仓库名称': dist['to_warehouse'],
-                        '距离': dist['distance'],
-                        '预计时间': dist['duration'],
-                        '距离(公里)': dist['distance_km'],
-                        '时间(分钟)': dist['duration_min'],
-                        '计算状态': '成功' if dist['success'] else '失败',
-                        '尝试次数': dist['attempts']
-                    })
-                
-                df_distances = pd.DataFrame(distance_rows)
-                
-                # 将数据写入工作表
-                for r in dataframe_to_rows(df_distances, index=False, header=True):
-                    ws_distances.append(r)
-                
-                # 设置标题样式
-                for cell in ws_distances[1]:
-                    cell.font = header_font
-                    cell.fill = header_fill
-                    cell.alignment = Alignment(horizontal="center")
-                
-                # 自动调整列宽
-                for column in ws_distances.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 30)
-                    ws_distances.column_dimensions[column_letter].width = adjusted_width
-                
                 print(f"\n距离计算完成！成功计算了 {len([d for d in distances_data if d['success']])} 对仓库的距离")
-            else:
+            elif compute_pairs:
                 print("\n距离计算失败，未能获取任何距离数据")
                 
         except Exception as e:
@@ -401,19 +226,21 @@ def convert_json_to_xlsx(json_file_path, xlsx_file_path, calculate_distances=Tru
     else:
         print("\n仓库数量不足，跳过距离计算")
     
-    # 保存Excel文件
-    wb.save(xlsx_file_path)
+    # 流式写出Excel文件（与 utils.utils.convert_json_to_xlsx 共用同一写出逻辑）
+    stats = write_warehouse_xlsx(
+        source.warehouses(), lambda: source.metadata, xlsx_file_path,
+        distances=distances_data, columnar_dir=columnar_dir
+    )
     print(f"\n转换完成！Excel文件已保存到: {xlsx_file_path}")
+    if columnar_dir:
+        print(f"列式数据（Arrow/Parquet）已保存到: {columnar_dir}")
     
     # 打印统计信息
-    print(f"\n转换统计:")
-    print(f"- 仓库数量: {len(data['warehouses'])}")
-    print(f"- 物资条目总数: {len(resources_data)}")
-    print(f"- 物资种类数: {len(summary_data)}")
-    print(f"- 工作表数量: {len(wb.worksheets)}")
+    print_conversion_stats(stats)
     if distances_data:
         successful_distances = len([d for d in distances_data if d['success']])
         print(f"- 成功计算的距离对数: {successful_distances}/{len(distances_data)}")
+        print(f"\n延迟统计:\n{latency_registry.format_report()}")
 
 def main():
     import argparse
@@ -423,6 +250,13 @@ def main():
     parser.add_argument('--no-distances', action='store_true', help='禁用距离计算功能')
     parser.add_argument('--input', '-i', help='输入JSON文件路径')
     parser.add_argument('--output', '-o', help='输出Excel文件路径')
+    parser.add_argument('--columnar-dir', help='列式数据（Arrow/Parquet）输出目录，默认为Excel文件同目录下的 columnar')
+    parser.add_argument('--no-columnar', action='store_true', help='不写出列式数据')
+    parser.add_argument('--stations', help='出发地点登记表路径，默认为 data/stations.json')
+    parser.add_argument('--add-station', action='append', default=[], metavar='名称[=经度,纬度]',
+                        help='登记出发地点（可重复），未给出坐标时通过地图服务解析')
+    parser.add_argument('--no-stations', action='store_true', help='不更新出发地点路线表')
+    parser.add_argument('--server-config', default='configs/servers_config.json', help='地图服务配置文件')
     
     args = parser.parse_args()
     
@@ -443,6 +277,26 @@ def main():
     # 确定是否计算距离
     calculate_distances = not args.no_distances
     
+    # 列式数据需要pyarrow，未安装时只写出Excel
+    columnar_dir = None
+    if not args.no_columnar:
+        try:
+            import pyarrow  # noqa: F401
+            columnar_dir = args.columnar_dir or os.path.join(os.path.dirname(os.path.abspath(xlsx_file)), "columnar")
+        except ImportError:
+            print("未安装 pyarrow，跳过列式数据导出")
+    
+    # 出发地点路线表（需要地图服务，禁用距离计算时不更新）
+    stations_path = None
+    if not args.no_stations:
+        stations_path = args.stations or os.path.join(project_root, "data", "stations.json")
+    
+    # 在查询地图服务之前检查出发地点参数
+    try:
+        station_specs = [parse_station_spec(spec) for spec in args.add_station]
+    except ValueError as e:
+        parser.error(str(e))
+    
     # 检查JSON文件是否存在
     if not os.path.exists(json_file):
         print(f"错误: 找不到文件 {json_file}")
@@ -452,10 +306,14 @@ def main():
         print(f"输入文件: {json_file}")
         print(f"输出文件: {xlsx_file}")
         print(f"距离计算: {'启用' if calculate_distances else '禁用'}")
+        print(f"列式数据: {columnar_dir or '不导出'}")
         print("-" * 50)
         
         # 执行转换
-        convert_json_to_xlsx(json_file, xlsx_file, calculate_distances)
+        convert_json_to_xlsx(json_file, xlsx_file, calculate_distances, columnar_dir,
+                             stations_path=stations_path,
+                             station_specs=station_specs,
+                             server_config_path=args.server_config)
         print("\n转换成功完成！")
         
     except Exception as e:
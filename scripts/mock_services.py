@@ -0,0 +1,372 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.geo import haversine_km
+
+# 合成坐标的范围（成都市区）
+CHENGDU_BOUNDS = (103.90, 30.55, 104.20, 30.80)
+
+# 各出行方式的合成平均速度（公里/小时）
+MODE_SPEED_KMH = {'driving': 30.0, 'walking': 5.0, 'bicycling': 15.0, 'transit': 20.0}
+
+_COORDINATES_RE = re.compile(r'(-?\d+\.\d+)\s*,\s*(-?\d+\.\d+)')
+_ROUTE_QUERY_RE = re.compile(r'从(.+?)到(.+?)的')
+_GEOCODE_QUERY_RE = re.compile(r'请提供(.+?)的经纬度坐标')
+
+@dataclass
+class FaultProfile:
+    """模拟服务的响应特性：固定延迟 + 均匀抖动（秒），以及按比例注入的错误"""
+    latency: float = 0.05
+    jitter: float = 0.02
+    error_rate: float = 0.0
+
+    async def delay(self, rng: random.Random):
+        seconds = self.latency + rng.uniform(0, self.jitter)
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def should_fail(self, rng: random.Random) -> bool:
+        return self.error_rate > 0 and rng.random() < self.error_rate
+
+def _fraction(*parts) -> float:
+    """由输入确定的 [0, 1) 伪随机数（同样的输入总是得到同样的结果）"""
+    digest = hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+def synthetic_location(address: str) -> str:
+    """地址的合成坐标"经度,纬度"：已是坐标时原样返回，否则由地址散列到成都市区范围内"""
+    match = _COORDINATES_RE.fullmatch(address.strip())
+    if match:
+        return f"{float(match.group(1)):.6f},{float(match.group(2)):.6f}"
+    min_lng, min_lat, max_lng, max_lat = CHENGDU_BOUNDS
+    lng = min_lng + (max_lng - min_lng) * _fraction('lng', address)
+    lat = min_lat + (max_lat - min_lat) * _fraction('lat', address)
+    return f"{lng:.6f},{lat:.6f}"
+
+def synthetic_route(origin: str, destination: str, mode: str = 'driving'):
+    """两点间的合成路线 (距离米, 时间秒)：直线距离 × 由起终点确定的绕行系数(1.2~1.6) ÷ 出行方式的平均速度"""
+    lng1, lat1 = (float(value) for value in synthetic_location(origin).split(','))
+    lng2, lat2 = (float(value) for value in synthetic_location(destination).split(','))
+    detour = 1.2 + 0.4 * _fraction('detour', origin, destination)
+    meters = haversine_km(lng1, lat1, lng2, lat2) * detour * 1000
+    seconds = meters / 1000 / MODE_SPEED_KMH[mode] * 3600
+    return round(meters), round(seconds) + 30
+
+def _steps(meters: int, seconds: int, origin: str, destination: str) -> list:
+    """逐段导航（约每500米一段），使结果的大小与真实服务相近"""
+    count = max(1, meters // 500)
+    return [
+        {
+            'instruction': f"沿合成道路{index + 1}行驶{meters // count}米",
+            'road': f"合成道路{index + 1}",
+            'distance': str(meters // count),
+            'duration': str(seconds // count),
+            'polyline': ';'.join([origin, destination] * 4)
+        }
+        for index in range(count)
+    ]
+
+def _path(origin: str, destination: str, mode: str) -> dict:
+    meters, seconds = synthetic_route(origin, destination, mode)
+    return {
+        'path': f"{origin}→{destination}",
+        'distance': str(meters),
+        'duration': str(seconds),
+        'steps': _steps(meters, seconds, origin, destination)
+    }
+
+def create_amap_server(profile: FaultProfile, seed: int = 0, host: str = '127.0.0.1', port: int = 8765):
+    """本地模拟的高德地图MCP服务（SSE），工具名称和结果结构与 mcp.amap.com 一致
+
+    返回 (FastMCP实例, 调用统计)。
+    """
+    from mcp.server.fastmcp import FastMCP
+    from mcp.server.fastmcp.exceptions import ToolError
+    from starlette.responses import JSONResponse
+
+    server = FastMCP('mock-amap', host=host, port=port)
+    rng = random.Random(seed)
+    stats = {'calls': {}, 'errors': 0}
+
+    async def respond(name: str, payload_factory):
+        stats['calls'][name] = stats['calls'].get(name, 0) + 1
+        await profile.delay(rng)
+        if profile.should_fail(rng):
+            stats['errors'] += 1
+            raise ToolError(f"模拟的地图服务错误（{name}）")
+        return json.dumps(payload_factory(), ensure_ascii=False)
+
+    @server.tool(description="地理编码：将地址转换为经纬度坐标")
+    async def maps_geo(address: str, city: str = "") -> str:
+        return await respond('maps_geo', lambda: {'results': [{
+            'country': '中国', 'province': '四川省', 'city': city or '成都市', 'citycode': '028',
+            'district': '', 'adcode': '510100', 'location': synthetic_location(address), 'level': '兴趣点'
+        }]})
+
+    @server.tool(description="逆地理编码：将经纬度坐标转换为地址")
+    async def maps_regeocode(location: str) -> str:
+        return await respond('maps_regeocode', lambda: {
+            'province': '四川省', 'city': '成都市', 'district': '合成区', 'formatted_address': f"四川省成都市合成区{location}"
+        })
+
+    def direction(name: str, mode: str):
+        async def tool(origin: str, destination: str) -> str:
+            return await respond(name, lambda: {'route': {
+                'origin': origin, 'destination': destination, 'paths': [_path(origin, destination, mode)]
+            }})
+        return tool
+
+    server.add_tool(direction('maps_direction_driving', 'driving'), name='maps_direction_driving',
+                    description="驾车路径规划：根据起终点经纬度规划驾车路线，返回距离（米）和时间（秒）")
+    server.add_tool(direction('maps_direction_walking', 'walking'), name='maps_direction_walking',
+                    description="步行路径规划：根据起终点经纬度规划步行路线")
+    server.add_tool(direction('maps_bicycling', 'bicycling'), name='maps_bicycling',
+                    description="骑行路径规划：根据起终点经纬度规划骑行路线")
+
+    @server.tool(description="公交路径规划：根据起终点经纬度规划公共交通路线")
+    async def maps_direction_transit_integrated(origin: str, destination: str, city: str = "", cityd: str = "") -> str:
+        def payload():
+            meters, seconds = synthetic_route(origin, destination, 'transit')
+            return {'route': {'origin': origin, 'destination': destination, 'distance': str(meters), 'transits': [
+                {'duration': str(seconds), 'walking_distance': str(meters // 10), 'segments': []}
+            ]}}
+        return await respond('maps_direction_transit_integrated', payload)
+
+    @server.tool(description="距离测量：多个起点到一个终点的距离（米）和时间（秒），起点以|分隔")
+    async def maps_distance(origins: str, destination: str, type: str = "1") -> str:
+        mode = 'walking' if type == '3' else 'driving'
+        return await respond('maps_distance', lambda: {'results': [
+            {'origin_id': str(index), 'dest_id': '1', 'distance': str(meters), 'duration': str(seconds)}
+            for index, (meters, seconds) in enumerate(
+                (synthetic_route(origin, destination, mode) for origin in origins.split('|')), 1
+            )
+        ]})
+
+    @server.custom_route('/stats', methods=['GET'])
+    async def handle_stats(request):
+        return JSONResponse(stats)
+
+    return server, stats
+
+def _tool_exchanges(messages: list) -> list:
+    """最后一条用户消息之后的工具调用及其结果 [(工具名, 参数, 结果文本), ...]"""
+    start = max((index for index, message in enumerate(messages) if message.get('role') == 'user'), default=-1)
+    calls, results = {}, {}
+    for message in messages[start + 1:]:
+        for tool_call in message.get('tool_calls') or []:
+            function = tool_call.get('function', {})
+            try:
+                arguments = json.loads(function.get('arguments') or '{}')
+            except ValueError:
+                arguments = {}
+            calls[tool_call.get('id')] = (function.get('name'), arguments)
+        if message.get('role') == 'tool':
+            results[message.get('tool_call_id')] = message.get('content') or ''
+    return [(*calls[call_id], text) for call_id, text in results.items() if call_id in calls]
+
+def _last_user_text(messages: list) -> str:
+    for message in reversed(messages):
+        if message.get('role') == 'user':
+            content = message.get('content')
+            return content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+    return ''
+
+def _geocoded(exchanges: list) -> dict:
+    """地址 → 已由 maps_geo 返回的坐标"""
+    locations = {}
+    for name, arguments, text in exchanges:
+        if name != 'maps_geo':
+            continue
+        match = _COORDINATES_RE.search(text)
+        if match and arguments.get('address'):
+            locations[arguments['address']] = f"{match.group(1)},{match.group(2)}"
+    return locations
+
+def _tool_call(name: str, arguments: dict) -> dict:
+    return {'id': f"call_{uuid.uuid4().hex[:12]}", 'type': 'function',
+            'function': {'name': name, 'arguments': json.dumps(arguments, ensure_ascii=False)}}
+
+def scripted_reply(messages: list, tools: list, plan_chars: int = 1500) -> dict:
+    """按地图代理的工具调用流程生成回复：{'content': 文本} 或 {'tool_calls': [...]}
+
+    - "从A到B的..."：名称先并行调用 maps_geo，两端都是坐标后调用 maps_direction_driving，拿到结果后给出距离和时间
+    - "请提供X的经纬度坐标"：调用 maps_geo 后回复坐标
+    - 不带工具的请求（决策代理）：返回固定结构、约 plan_chars 个字符的作战方案
+    """
+    query = _last_user_text(messages)
+    if not tools:
+        body = "\n".join(f"{index}. 第{index}阶段：按参考时间节点调配人员和物资，保持通信畅通。" for index in range(1, 200))
+        return {'content': f"# 作战方案（模拟）\n\n## 一、情况分析\n{query[:200]}\n\n## 二、部署\n{body}"[:plan_chars]}
+
+    exchanges = _tool_exchanges(messages)
+    for name, arguments, text in exchanges:
+        if name.startswith('maps_direction') or name in ('maps_bicycling', 'maps_distance'):
+            distance = re.search(r'"distance":"([^"]+)"', text)
+            duration = re.search(r'"duration":"([^"]+)"', text)
+            if distance and duration:
+                return {'content': f"驾车距离约{distance.group(1)}，预计需要{duration.group(1)}。"}
+            return {'content': f"路线查询失败：{text[:100]}"}
+
+    route = _ROUTE_QUERY_RE.search(query)
+    if route:
+        locations = _geocoded(exchanges)
+        endpoints = [endpoint.strip() for endpoint in route.groups()]
+        resolved = [endpoint if _COORDINATES_RE.fullmatch(endpoint) else locations.get(endpoint) for endpoint in endpoints]
+        if all(resolved):
+            return {'tool_calls': [_tool_call('maps_direction_driving', {'origin': resolved[0], 'destination': resolved[1]})]}
+        return {'tool_calls': [
+            _tool_call('maps_geo', {'address': endpoint, 'city': '成都'})
+            for endpoint, location in zip(endpoints, resolved) if location is None
+        ]}
+
+    geocode = _GEOCODE_QUERY_RE.search(query)
+    if geocode:
+        address = geocode.group(1).strip()
+        location = _geocoded(exchanges).get(address)
+        if location:
+            return {'content': f"{address}的经纬度坐标为 {location}"}
+        return {'tool_calls': [_tool_call('maps_geo', {'address': address, 'city': '成都'})]}
+    return {'content': '您好，请告诉我需要查询的地点或路线。'}
+
+def create_llm_app(profile: FaultProfile, seed: int = 0, token_seconds: float = 0.0, plan_chars: int = 1500):
+    """本地模拟的OpenAI兼容接口（/v1/chat/completions，支持流式），回复由 scripted_reply 生成
+
+    profile 控制首个token前的延迟和错误比例，token_seconds 为流式输出每个分块（约20字符）的间隔。
+    返回 (aiohttp应用, 调用统计)。
+    """
+    from aiohttp import web
+
+    rng = random.Random(seed)
+    stats = {'requests': 0, 'tool_call_replies': 0, 'text_replies': 0, 'streamed': 0, 'errors': 0}
+
+    async def handle_completions(request):
+        body = await request.json()
+        stats['requests'] += 1
+        await profile.delay(rng)
+        if profile.should_fail(rng):
+            stats['errors'] += 1
+            return web.json_response({'error': {'message': '模拟的模型服务错误', 'type': 'server_error'}}, status=500)
+
+        reply = scripted_reply(body.get('messages', []), body.get('tools') or [], plan_chars)
+        stats['tool_call_replies' if 'tool_calls' in reply else 'text_replies'] += 1
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = body.get('model', 'mock')
+        finish_reason = 'tool_calls' if 'tool_calls' in reply else 'stop'
+        usage = {'prompt_tokens': sum(len(str(m.get('content') or '')) for m in body.get('messages', [])) // 2,
+                 'completion_tokens': len(reply.get('content') or '') // 2}
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+
+        if not body.get('stream'):
+            message = {'role': 'assistant', 'content': reply.get('content')}
+            if 'tool_calls' in reply:
+                message['tool_calls'] = reply['tool_calls']
+            return web.json_response({
+                'id': completion_id, 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'message': message, 'finish_reason': finish_reason}], 'usage': usage
+            })
+
+        stats['streamed'] += 1
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+        await response.prepare(request)
+
+        async def send(delta, finish=None):
+            chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                     'model': model, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish}]}
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+
+        await send({'role': 'assistant', 'content': ''})
+        if 'tool_calls' in reply:
+            await send({'tool_calls': [dict(tool_call, index=index) for index, tool_call in enumerate(reply['tool_calls'])]})
+        content = reply.get('content') or ''
+        for start in range(0, len(content), 20):
+            if token_seconds > 0:
+                await asyncio.sleep(token_seconds)
+            await send({'content': content[start:start + 20]})
+        await send({}, finish_reason)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def handle_models(request):
+        return web.json_response({'object': 'list', 'data': [{'id': 'Qwen/Qwen3-235B-A22B', 'object': 'model'}]})
+
+    async def handle_stats(request):
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_post('/v1/chat/completions', handle_completions)
+    app.router.add_get('/v1/models', handle_models)
+    app.router.add_get('/stats', handle_stats)
+    return app, stats
+
+def write_servers_config(path: str, host: str, amap_port: int):
+    """写出指向模拟地图服务的 servers_config.json（LocationAgent 的 server_config_path）"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'mcpServers': {'amap-amap-sse': {'url': f"http://{host}:{amap_port}/sse"}}}, f, indent=2)
+
+async def serve(host: str, amap_port: int, llm_port: int, amap_profile: FaultProfile, llm_profile: FaultProfile,
+                seed: int = 0, token_seconds: float = 0.0, plan_chars: int = 1500):
+    """在同一个事件循环中运行模拟地图服务和模拟模型服务，直到被取消"""
+    import uvicorn
+    from aiohttp import web
+
+    amap_server, _ = create_amap_server(amap_profile, seed, host, amap_port)
+    llm_app, _ = create_llm_app(llm_profile, seed, token_seconds, plan_chars)
+
+    runner = web.AppRunner(llm_app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, llm_port).start()
+    config = uvicorn.Config(amap_server.sse_app(), host=host, port=amap_port, log_level='warning', access_log=False)
+    try:
+        await uvicorn.Server(config).serve()
+    finally:
+        await runner.cleanup()
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='本地模拟的高德地图MCP服务（SSE）和OpenAI兼容模型服务，用于压测和基准测试')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--amap-port', type=int, default=8765, help='模拟地图服务端口（SSE地址 /sse）')
+    parser.add_argument('--llm-port', type=int, default=8766, help='模拟模型服务端口（接口地址 /v1）')
+    parser.add_argument('--amap-latency', type=float, default=0.05, help='地图工具调用的固定延迟（秒）')
+    parser.add_argument('--amap-jitter', type=float, default=0.02, help='地图工具调用的随机抖动上限（秒）')
+    parser.add_argument('--amap-error-rate', type=float, default=0.0, help='地图工具调用返回错误的比例')
+    parser.add_argument('--llm-latency', type=float, default=0.2, help='模型首个token前的固定延迟（秒）')
+    parser.add_argument('--llm-jitter', type=float, default=0.1, help='模型延迟的随机抖动上限（秒）')
+    parser.add_argument('--llm-error-rate', type=float, default=0.0, help='模型调用返回HTTP 500的比例')
+    parser.add_argument('--token-seconds', type=float, default=0.0, help='流式输出每个分块的间隔（秒）')
+    parser.add_argument('--plan-chars', type=int, default=1500, help='决策回复的字符数')
+    parser.add_argument('--seed', type=int, default=0, help='抖动和错误注入的随机数种子')
+    parser.add_argument('--write-config', help='写出指向模拟地图服务的 servers_config.json')
+
+    args = parser.parse_args()
+    if args.write_config:
+        write_servers_config(args.write_config, args.host, args.amap_port)
+        print(f"地图服务配置已写入: {args.write_config}")
+    print(f"模拟地图服务: http://{args.host}:{args.amap_port}/sse")
+    print(f"模拟模型服务: http://{args.host}:{args.llm_port}/v1"
+          f"（设置 MODELSCOPE_API_BASE=http://{args.host}:{args.llm_port}/v1 使代理使用该服务）")
+    try:
+        asyncio.run(serve(
+            args.host, args.amap_port, args.llm_port,
+            FaultProfile(args.amap_latency, args.amap_jitter, args.amap_error_rate),
+            FaultProfile(args.llm_latency, args.llm_jitter, args.llm_error_rate),
+            seed=args.seed, token_seconds=args.token_seconds, plan_chars=args.plan_chars
+        ))
+    except KeyboardInterrupt:
+        print("\n模拟服务已停止")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import json
+import os
+import sys
+import time
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from utils.json_stream import StreamingResourceJson
+from utils.utils import RESOURCE_CATEGORY_NAMES
+from utils.placement import (
+    TravelTimeMatrix, category_coverage, coverage_gaps, coverage_statistics,
+    grid_demand_points, load_demand_points, solve_max_coverage, solve_p_median
+)
+
+def read_warehouse_stock(json_file_path):
+    """流式读取 resource.json，返回 (仓库列表, 坐标数组, 类别名称, 各仓库各类别库存数量)"""
+    warehouses, points, rows = [], [], []
+    categories = list(RESOURCE_CATEGORY_NAMES.values())
+    column_of = {name: column for column, name in enumerate(categories)}
+    for warehouse in StreamingResourceJson(json_file_path).warehouses():
+        location = warehouse['location']
+        warehouses.append({'id': warehouse['id'], 'name': warehouse['name'], 'address': location.get('address', '')})
+        points.append((float(location['longitude']), float(location['latitude'])))
+        totals = [0] * len(categories)
+        for category, items in warehouse.get('resources', {}).items():
+            name = RESOURCE_CATEGORY_NAMES.get(category, category)
+            if name not in column_of:
+                column_of[name] = len(categories)
+                categories.append(name)
+                for row in rows:
+                    row.append(0)
+                totals.append(0)
+            totals[column_of[name]] += sum(item.get('quantity', 0) for item in items.values())
+        rows.append(totals)
+    return warehouses, np.array(points, dtype=np.float64), categories, np.array(rows, dtype=np.int64)
+
+def describe_site(column, warehouses, site_points):
+    """矩阵列对应的站点描述：前若干列为现有仓库，其后为候选新址"""
+    if column < len(warehouses):
+        return {'type': '现有仓库', **warehouses[column]}
+    lng, lat = site_points[column]
+    return {'type': '候选新址', 'longitude': round(float(lng), 6), 'latitude': round(float(lat), 6)}
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='仓库/消防站选址与覆盖缺口分析（p-中位、最大覆盖）')
+    parser.add_argument('--input', '-i', help='仓库数据 resource.json 路径')
+    parser.add_argument('--demand', help='需求点文件（.csv 经度,纬度[,权重] / .jsonl 历史事件 / .npy），默认按网格生成')
+    parser.add_argument('--grid-km', type=float, default=1.0, help='未指定需求点文件时的网格边长（公里）')
+    parser.add_argument('--sites', help='候选新址文件（格式同需求点），默认从需求点中抽样')
+    parser.add_argument('--max-sites', type=int, default=1000, help='从需求点抽样的候选新址数量上限')
+    parser.add_argument('--matrix', help='实测行驶时间矩阵 .npy（需求点 × [现有仓库, 候选新址]，分钟），默认按直线距离估算')
+    parser.add_argument('-p', type=int, default=3, help='新增站点数')
+    parser.add_argument('--threshold', type=float, default=15.0, help='覆盖标准（分钟）')
+    parser.add_argument('--objective', choices=['median', 'coverage', 'both'], default='both',
+                        help='median: 最小化加权平均响应时间；coverage: 最大化覆盖标准内的需求')
+    parser.add_argument('--top-gaps', type=int, default=20, help='输出响应时间最差的需求点数量')
+    parser.add_argument('--seed', type=int, default=0, help='候选新址抽样的随机种子')
+    parser.add_argument('--output', '-o', help='将分析结果写入JSON文件')
+
+    args = parser.parse_args()
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    json_file = args.input or os.path.join(project_root, "data", "resource.json")
+    if not os.path.exists(json_file):
+        print(f"错误: 找不到文件 {json_file}")
+        return
+
+    started = time.perf_counter()
+    warehouses, warehouse_points, categories, stock = read_warehouse_stock(json_file)
+    if args.demand:
+        demand_points, weights = load_demand_points(args.demand)
+    else:
+        demand_points = grid_demand_points(warehouse_points, cell_km=args.grid_km)
+        weights = np.ones(len(demand_points), dtype=np.float32)
+    if args.sites:
+        site_points, _ = load_demand_points(args.sites)
+    else:
+        rng = np.random.default_rng(args.seed)
+        count = min(args.max_sites, len(demand_points))
+        site_points = demand_points[np.sort(rng.choice(len(demand_points), count, replace=False))]
+    all_sites = np.vstack((warehouse_points, site_points))
+
+    array = np.load(args.matrix, mmap_mode='r') if args.matrix else None
+    matrix = TravelTimeMatrix(demand_points, all_sites, array=array)
+    existing = list(range(len(warehouses)))
+    candidates = list(range(len(warehouses), len(all_sites)))
+    print(f"仓库 {len(warehouses)} 个，需求点 {len(demand_points)} 个，候选新址 {len(site_points)} 个"
+          f"（矩阵 {matrix.shape[0]}×{matrix.shape[1]}，{'实测' if array is not None else '估算'}）")
+
+    # 1. 现状覆盖统计（总体及各物资类别）
+    current = matrix.nearest_times(existing)
+    report = {
+        'demand_points': len(demand_points),
+        'threshold_minutes': args.threshold,
+        'current': coverage_statistics(current, weights, args.threshold),
+        'categories': category_coverage(matrix, weights, stock, categories, args.threshold),
+        'gaps': coverage_gaps(current, weights, demand_points, args.top_gaps)
+    }
+    print(f"\n现状: 加权平均 {report['current']['mean_minutes']}分钟, p90 {report['current']['p90_minutes']}分钟, "
+          f"{args.threshold:g}分钟覆盖率 {report['current']['covered_share']:.1%}")
+    print(f"\n{'物资类别':<12}{'仓库数':>6}{'平均(分钟)':>12}{'p90(分钟)':>12}{'覆盖率':>10}")
+    for category, stats in report['categories'].items():
+        if stats['mean_minutes'] is None:
+            print(f"{category:<12}{stats['warehouses']:>6}{'无库存':>12}")
+            continue
+        print(f"{category:<12}{stats['warehouses']:>6}{stats['mean_minutes']:>12.1f}"
+              f"{stats['p90_minutes']:>12.1f}{stats['covered_share']:>10.1%}")
+
+    # 2. 选址：在现有仓库之外新增p个站点
+    solvers = {
+        'median': lambda: solve_p_median(matrix, weights, args.p, fixed=existing, candidates=candidates),
+        'coverage': lambda: solve_max_coverage(matrix, weights, args.p, args.threshold,
+                                               fixed=existing, candidates=candidates)
+    }
+    for objective in (['median', 'coverage'] if args.objective == 'both' else [args.objective]):
+        stage_start = time.perf_counter()
+        result = solvers[objective]()
+        times = result.pop('times')
+        result['sites'] = [describe_site(column, warehouses, all_sites) for column in result.pop('chosen')]
+        result['after'] = coverage_statistics(times, weights, args.threshold)
+        result['seconds'] = round(time.perf_counter() - stage_start, 2)
+        report[f'p_{objective}'] = result
+
+        title = 'p-中位（加权平均响应时间, 分钟）' if objective == 'median' else f'最大覆盖（{args.threshold:g}分钟覆盖率）'
+        print(f"\n{title}: {result['objective_before']} → {result['objective_after']}"
+              f"（交换改进 {result['swaps']} 次, {result['seconds']}秒）")
+        for site in result['sites']:
+            label = site.get('name') or f"{site['longitude']},{site['latitude']}"
+            print(f"  - {site['type']}: {label}")
+
+    report['seconds'] = round(time.perf_counter() - started, 2)
+    print(f"\n总用时: {report['seconds']}秒")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"分析结果已保存到: {args.output}")
+
+if __name__ == "__main__":
+    main()
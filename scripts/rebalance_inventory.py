@@ -0,0 +1,127 @@
+import json
+import os
+import sys
+import time
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.utils import load_warehouse_data
+from utils.geo import DEFAULT_TRAVEL_ESTIMATOR
+from utils.records import WarehouseTable
+from utils.rebalance import (
+    even_share_targets, load_targets, plan_transfers, stock_matrix, summarize_trips, warehouse_travel_matrix
+)
+
+TRANSFER_HEADER = ['调出仓库ID', '调出仓库名称', '调入仓库ID', '调入仓库名称', '物资类别', '物资名称',
+                   '规格说明', '数量', '单位', '预计时间(分钟)']
+TRIP_HEADER = ['调出仓库ID', '调出仓库名称', '调入仓库ID', '调入仓库名称', '物资种数', '总数量', '预计时间(分钟)']
+UNMET_HEADER = ['物资类别', '物资名称', '规格说明', '未补足数量', '单位']
+
+def transfer_rows(transfers, table):
+    """调拨单行：(调出仓库, 调入仓库, 物资, 数量, 时间)"""
+    records, catalog = table.records, table.catalog
+    for code, origin, destination, minutes, quantity in transfers:
+        yield [records[origin].id, records[origin].name, records[destination].id, records[destination].name,
+               catalog.categories[code], catalog.names[code], catalog.specifications[code],
+               quantity, catalog.units[code], round(minutes, 1)]
+
+def trip_rows(trips, table):
+    records = table.records
+    for trip in trips:
+        yield [records[trip['from']].id, records[trip['from']].name, records[trip['to']].id, records[trip['to']].name,
+               trip['resources'], trip['quantity'], trip['minutes']]
+
+def unmet_rows(unmet, table):
+    catalog = table.catalog
+    for code, quantity in sorted(unmet.items(), key=lambda item: -item[1]):
+        yield [catalog.categories[code], catalog.names[code], catalog.specifications[code], quantity, catalog.units[code]]
+
+def write_plan(path, plan, trips, table):
+    """按扩展名写出调拨方案：.xlsx（调拨单/运输汇总/未补足三张表）、.csv（调拨单）或 .json"""
+    if path.endswith('.xlsx'):
+        from utils.xlsx_writer import StreamingXlsxWriter, write_table
+
+        with StreamingXlsxWriter(path) as writer:
+            write_table(writer, '调拨单', TRANSFER_HEADER, transfer_rows(plan['transfers'], table))
+            write_table(writer, '运输汇总', TRIP_HEADER, trip_rows(trips, table))
+            write_table(writer, '未补足', UNMET_HEADER, unmet_rows(plan['unmet'], table))
+    elif path.endswith('.csv'):
+        import csv
+
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(TRANSFER_HEADER)
+            writer.writerows(transfer_rows(plan['transfers'], table))
+    else:
+        report = {key: value for key, value in plan.items() if key not in ('transfers', 'unmet')}
+        report['transfers'] = [dict(zip(TRANSFER_HEADER, row)) for row in transfer_rows(plan['transfers'], table)]
+        report['trips'] = [dict(zip(TRIP_HEADER, row)) for row in trip_rows(trips, table)]
+        report['unmet'] = [dict(zip(UNMET_HEADER, row)) for row in unmet_rows(plan['unmet'], table)]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='仓库间库存调拨优化：按目标库存计算调拨单，使缺口尽量补足且总行驶时间最小')
+    parser.add_argument('--xlsx', help='仓库数据Excel文件路径')
+    parser.add_argument('--targets', help='目标库存文件（.csv/.xlsx，列：仓库ID、物资名称、目标数量，可选 物资类别、规格说明）')
+    parser.add_argument('--fraction', type=float, default=0.5,
+                        help='未在目标文件中指定的物资：每个仓库至少保有平均份额的比例（0表示不调整）')
+    parser.add_argument('--max-minutes', type=float, help='不考虑预计行驶时间超过该值（分钟）的调拨路线')
+    parser.add_argument('--neighbors', type=int, default=5, help='列生成初始时每个缺口仓库带入的最近富余仓库数')
+    parser.add_argument('--top', type=int, default=10, help='打印件数最多的运输数量')
+    parser.add_argument('--output', '-o', help='调拨方案输出文件（.xlsx / .csv / .json）')
+
+    args = parser.parse_args()
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    xlsx_file = args.xlsx or os.path.join(project_root, "data", "resource.xlsx")
+
+    started = time.perf_counter()
+    warehouse_data = load_warehouse_data(xlsx_file)
+    if not warehouse_data:
+        print(f"错误: 无法读取仓库数据 {xlsx_file}")
+        return
+    table = WarehouseTable.from_warehouse_data(warehouse_data)
+    if DEFAULT_TRAVEL_ESTIMATOR.calibrate_from_warehouse_data(warehouse_data):
+        print(f"估算参数已标定: 绕行系数 {DEFAULT_TRAVEL_ESTIMATOR.detour_factor:.2f}, "
+              f"平均车速 {DEFAULT_TRAVEL_ESTIMATOR.speed_kmh:.1f}km/h")
+    travel, measured = warehouse_travel_matrix(table, warehouse_data)
+    stock = stock_matrix(table)
+    print(f"仓库 {len(table)} 个，物资 {len(table.catalog)} 种，"
+          f"仓库间行驶时间 {measured} 对实测、{len(table) * (len(table) - 1) - measured} 对估算")
+
+    targets = even_share_targets(stock, args.fraction) if args.fraction > 0 else stock.copy()
+    if args.targets:
+        try:
+            targets, unmatched = load_targets(args.targets, table, targets)
+        except (OSError, ValueError) as e:
+            print(f"错误: 无法读取目标库存文件 {args.targets}: {e}")
+            return
+        if unmatched:
+            print(f"警告: 目标库存文件中有 {unmatched} 行未匹配到仓库或物资")
+
+    solve_start = time.perf_counter()
+    plan = plan_transfers(stock, targets, travel, neighbors=args.neighbors, max_minutes=args.max_minutes)
+    solve_seconds = time.perf_counter() - solve_start
+    trips = summarize_trips(plan['transfers'])
+
+    print(f"\n调拨方案（求解 {solve_seconds:.2f}秒，{plan['resources']} 种物资，"
+          f"{plan['lp_solves']} 次线性规划 / {plan['pricing_rounds']} 轮列生成）:")
+    print(f"- 缺口总数: {plan['total_deficit']}，可补足: {plan['fulfilled']}")
+    print(f"- 调拨单: {len(plan['transfers'])} 条，涉及 {len(trips)} 趟运输，总计 {plan['unit_minutes']} 件·分钟")
+    if plan['unmet']:
+        print(f"- 富余量不足（或路线受限）未补足的物资: {len(plan['unmet'])} 种")
+    for trip in trips[:args.top]:
+        print(f"  {table.records[trip['from']].name} → {table.records[trip['to']].name}: "
+              f"{trip['resources']} 种 {trip['quantity']} 件, 约{trip['minutes']}分钟")
+
+    if args.output:
+        write_plan(args.output, plan, trips, table)
+        print(f"\n调拨方案已保存到: {args.output}")
+    print(f"总用时: {time.perf_counter() - started:.2f}秒")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import json
+import os
+import sys
+import time
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.utils import load_warehouse_data
+from utils.geo import DEFAULT_TRAVEL_ESTIMATOR
+from utils.dispatch import offline_distance_results
+from utils.records import WarehouseTable
+from utils.rebalance import warehouse_travel_matrix
+from utils.robustness import RouteLegs, TravelUncertainty, candidate_routes, evaluate_routes
+
+def iter_dispatch_results(path, record_id=None):
+    """读取 batch_dispatch.py 的输出，返回 (事件ID, 事发地点距离, 出发地点距离)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if not record.get('success') or (record_id is not None and str(record.get('id')) != record_id):
+                continue
+            yield record.get('id'), record['incident_distances'], record['departure_distances']
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='行驶时间不确定性下的取物资路线稳健性评估（蒙特卡洛）')
+    parser.add_argument('--xlsx', help='仓库数据Excel文件路径')
+    parser.add_argument('--incident', help='事发地点坐标（经度,纬度）')
+    parser.add_argument('--departure', help='出发地点坐标或已登记的出发地点名称')
+    parser.add_argument('--results', help='batch_dispatch.py 输出的JSONL，使用其中的实测距离（逐个事件评估）')
+    parser.add_argument('--id', help='只评估 --results 中指定ID的事件')
+    parser.add_argument('--samples', type=int, default=5000, help='每条路线的模拟次数')
+    parser.add_argument('--target', type=float, help='到场时间目标（分钟），输出按时到场概率')
+    parser.add_argument('--max-stops', type=int, default=2, help='一条路线最多经过的仓库数')
+    parser.add_argument('--pool-size', type=int, default=8, help='参与组合的仓库数（按名义时间最短选取）')
+    parser.add_argument('--workers', type=int, help='进程数，默认CPU数')
+    parser.add_argument('--sigma', type=float, default=0.25, help='实测路段的行驶时间波动（对数标准差）')
+    parser.add_argument('--estimated-sigma', type=float, default=0.4, help='估算路段的行驶时间波动')
+    parser.add_argument('--common-sigma', type=float, default=0.15, help='全城拥堵系数的波动')
+    parser.add_argument('--loading-minutes', type=float, default=5.0, help='每个仓库的平均装载时间（分钟）')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+    parser.add_argument('--top', type=int, default=10, help='打印排名前几的路线')
+    parser.add_argument('--output', '-o', help='将评估结果写入JSON文件')
+
+    args = parser.parse_args()
+    if not args.results and not (args.incident and args.departure):
+        parser.error('需要 --results，或同时指定 --incident 和 --departure')
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    xlsx_file = args.xlsx or os.path.join(project_root, "data", "resource.xlsx")
+    warehouse_data = load_warehouse_data(xlsx_file)
+    if not warehouse_data:
+        print(f"错误: 无法读取仓库数据 {xlsx_file}")
+        return
+    warehouses = warehouse_data['warehouses']
+    DEFAULT_TRAVEL_ESTIMATOR.calibrate_from_warehouse_data(warehouse_data)
+    between, _ = warehouse_travel_matrix(WarehouseTable.from_warehouse_data(warehouse_data), warehouse_data)
+
+    if args.results:
+        scenarios = list(iter_dispatch_results(args.results, args.id))
+        if not scenarios:
+            print(f"错误: {args.results} 中没有可评估的成功事件")
+            return
+    else:
+        scenarios = [(None, offline_distance_results(args.incident, warehouses),
+                      offline_distance_results(args.departure, warehouses))]
+
+    uncertainty = TravelUncertainty(
+        leg_sigma=args.sigma, estimated_sigma=args.estimated_sigma, common_sigma=args.common_sigma,
+        loading_minutes=args.loading_minutes
+    )
+    report = []
+    for record_id, incident_distances, departure_distances in scenarios:
+        legs = RouteLegs.from_distance_results(incident_distances, departure_distances, between)
+        routes = candidate_routes(legs, max_stops=args.max_stops, pool_size=args.pool_size)
+        started = time.perf_counter()
+        results = evaluate_routes(legs, routes, samples=args.samples, seed=args.seed, target_minutes=args.target,
+                                  uncertainty=uncertainty, workers=args.workers)
+        seconds = time.perf_counter() - started
+
+        title = f"事件 {record_id}" if record_id is not None else "评估结果"
+        print(f"\n{title}: {len(routes)} 条候选路线 × {args.samples} 次模拟，用时 {seconds:.2f}秒")
+        header = f"{'路线':<36}{'名义':>6}{'p50':>7}{'p90':>7}{'p95':>7}"
+        print(header + (f"{'按时概率':>10}" if args.target is not None else ''))
+        for result in results[:args.top]:
+            line = (f"{' → '.join(result['warehouses']):<36}{result['nominal_minutes']:>6.0f}"
+                    f"{result['p50_minutes']:>7.0f}{result['p90_minutes']:>7.0f}{result['p95_minutes']:>7.0f}")
+            if args.target is not None:
+                line += f"{result['on_time_probability']:>10.1%}"
+            print(line)
+        report.append({'id': record_id, 'seconds': round(seconds, 3), 'routes': results})
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n评估结果已保存到: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+应急物资调度系统 - 无界面异步调度服务（JSON API）
+
+接口：
+- GET  /health      服务状态和连接池空闲情况
+- GET  /warehouses  仓库及物资信息
+- GET  /distances   指定地点到各仓库的距离（参数 location）
+- GET  /nearest     指定坐标附近的仓库（参数 location、k 或 radius_km），只用空间索引，不调用地图服务
+- POST /dispatch    完整调度流程（距离计算 + 作战决策），可选 budget_seconds 限时返回
+- GET  /metrics     各上游操作的延迟直方图和重试/对冲统计
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import functools
+import json
+import math
+
+from aiohttp import web
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from agents.decision_agent import create_decision_llm
+from utils.runtime import LocationAgentPool
+from utils.utils import load_warehouse_data
+from utils.dispatch import calculate_distances_to_warehouses, run_dispatch, run_anytime_dispatch, LOCATION_BREAKER
+from utils.retry import latency_registry
+from utils.geo import DEFAULT_TRAVEL_ESTIMATOR, parse_coordinates
+from utils.spatial import get_warehouse_index
+from utils.stations import get_station_registry
+
+def _json_default(obj):
+    """将pandas/numpy标量等对象转换为可序列化的值"""
+    if hasattr(obj, 'item'):
+        return obj.item()
+    return str(obj)
+
+json_dumps = functools.partial(json.dumps, ensure_ascii=False, default=_json_default)
+
+def json_response(data, status=200):
+    return web.json_response(data, status=status, dumps=json_dumps)
+
+def error_response(message, status=400):
+    return json_response({'error': message}, status=status)
+
+async def handle_health(request):
+    """服务状态"""
+    app = request.app
+    return json_response({
+        'status': 'ok',
+        'warehouses': app['warehouse_data']['total_warehouses'],
+        'pool_size': app['pool'].size,
+        'pool_available': app['pool'].available,
+        'location_breaker': LOCATION_BREAKER.stats()
+    })
+
+async def handle_metrics(request):
+    """各上游操作的延迟统计"""
+    return json_response(latency_registry.report())
+
+async def handle_warehouses(request):
+    """仓库及物资信息"""
+    return json_response(request.app['warehouse_data'])
+
+async def handle_distances(request):
+    """指定地点到各仓库的距离"""
+    location = request.query.get('location', '').strip()
+    if not location:
+        return error_response("缺少参数: location")
+
+    app = request.app
+    warehouses = app['warehouse_data']['warehouses']
+    try:
+        # 已登记出发地点的路线全部预计算时不租用代理
+        if get_station_registry().covers(location, warehouses):
+            distances = await calculate_distances_to_warehouses(None, location, warehouses)
+        else:
+            async with app['pool'].lease() as agent:
+                distances = await calculate_distances_to_warehouses(agent, location, warehouses,
+                                                                  probe=app['pool'].probe)
+    except ConnectionError as e:
+        return error_response(str(e), status=503)
+
+    return json_response({'location': location, 'distances': distances})
+
+async def handle_nearest(request):
+    """指定坐标附近的仓库（直线距离）"""
+    coordinates = parse_coordinates(request.query.get('location', ''))
+    if coordinates is None:
+        return error_response("参数 location 必须为 \"经度,纬度\" 格式")
+
+    try:
+        k = int(request.query.get('k', 5))
+        radius_km = request.query.get('radius_km')
+        radius_km = float(radius_km) if radius_km is not None else None
+    except ValueError:
+        return error_response("k 必须为整数，radius_km 必须为数字")
+    if k <= 0:
+        return error_response("k 必须大于0")
+    if radius_km is not None and not (math.isfinite(radius_km) and radius_km >= 0):
+        return error_response("radius_km 必须为非负的有限数")
+
+    index = get_warehouse_index(request.app['warehouse_data']['warehouses'])
+    if radius_km is not None:
+        matches = index.within(*coordinates, radius_km)
+    else:
+        matches = index.nearest(*coordinates, k)
+
+    return json_response({
+        'location': request.query['location'],
+        'warehouses': [
+            {'id': warehouse['id'], 'name': warehouse['name'], 'straight_distance_km': round(km, 3)}
+            for warehouse, km in matches
+        ]
+    })
+
+async def handle_dispatch(request):
+    """完整调度流程"""
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        return error_response("请求体不是有效的JSON")
+    if not isinstance(body, dict):
+        return error_response("请求体必须为JSON对象")
+
+    missing = [field for field in ('incident_location', 'departure_location') if not body.get(field)]
+    if missing:
+        return error_response(f"缺少字段: {', '.join(missing)}")
+
+    try:
+        personnel_count = int(body.get('personnel_count', 25))
+        vehicle_count = int(body.get('vehicle_count', 3))
+        budget_seconds = body.get('budget_seconds')
+        budget_seconds = float(budget_seconds) if budget_seconds is not None else None
+        max_candidates = int(body['max_candidates']) if body.get('max_candidates') else None
+    except (TypeError, ValueError):
+        return error_response("personnel_count、vehicle_count、max_candidates 必须为整数，budget_seconds 必须为数字")
+    if budget_seconds is not None and not (math.isfinite(budget_seconds) and budget_seconds > 0):
+        return error_response("budget_seconds 必须为大于0的有限数")
+    if max_candidates is not None and max_candidates <= 0:
+        return error_response("max_candidates 必须大于0")
+
+    app = request.app
+    dispatch_args = dict(
+        incident_location=body['incident_location'],
+        departure_location=body['departure_location'],
+        personnel_count=personnel_count,
+        vehicle_count=vehicle_count,
+        fire_description=body.get('fire_description', '')
+    )
+    try:
+        async with app['dispatch_semaphore']:
+            if budget_seconds is not None:
+                # 限时模式：在预算内返回，超时部分使用估算值和快速方案
+                result = await run_anytime_dispatch(
+                    app['pool'],
+                    app['decision_llm'],
+                    app['warehouse_data'],
+                    budget_seconds=budget_seconds,
+                    max_candidates=max_candidates,
+                    **dispatch_args
+                )
+            else:
+                result = await run_dispatch(
+                    app['pool'],
+                    app['decision_llm'],
+                    app['warehouse_data'],
+                    **dispatch_args
+                )
+    except ConnectionError as e:
+        return error_response(str(e), status=503)
+
+    return json_response(result)
+
+async def on_startup(app):
+    """加载仓库数据并预先建立MCP连接池和LLM客户端"""
+    loop = asyncio.get_running_loop()
+    warehouse_data = await loop.run_in_executor(None, load_warehouse_data, app['xlsx_path'])
+    if warehouse_data is None:
+        raise RuntimeError(f"无法加载仓库数据: {app['xlsx_path']}")
+    app['warehouse_data'] = warehouse_data
+    DEFAULT_TRAVEL_ESTIMATOR.calibrate_from_warehouse_data(warehouse_data)
+    get_warehouse_index(warehouse_data['warehouses'])
+    app['pool'] = LocationAgentPool(app['server_config_path'], size=app['pool_size'])
+    app['decision_llm'] = create_decision_llm()
+    app['dispatch_semaphore'] = asyncio.Semaphore(app['max_concurrent_dispatches'])
+    print(f"已加载 {warehouse_data['total_warehouses']} 个仓库，连接池大小: {app['pool_size']}")
+
+async def on_cleanup(app):
+    """关闭连接池"""
+    await app['pool'].close()
+
+def create_app(xlsx_path=None,
+               server_config_path="configs/servers_config.json",
+               pool_size: int = 4,
+               max_concurrent_dispatches: int = 16) -> web.Application:
+    """创建调度服务应用"""
+    if xlsx_path is None:
+        xlsx_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'resource.xlsx')
+
+    app = web.Application()
+    app['xlsx_path'] = xlsx_path
+    app['server_config_path'] = server_config_path
+    app['pool_size'] = pool_size
+    app['max_concurrent_dispatches'] = max_concurrent_dispatches
+
+    app.router.add_get('/health', handle_health)
+    app.router.add_get('/warehouses', handle_warehouses)
+    app.router.add_get('/distances', handle_distances)
+    app.router.add_get('/nearest', handle_nearest)
+    app.router.add_post('/dispatch', handle_dispatch)
+    app.router.add_get('/metrics', handle_metrics)
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description='应急物资调度异步服务（JSON API）')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8080, help='监听端口')
+    parser.add_argument('--xlsx', help='仓库数据Excel文件路径')
+    parser.add_argument('--config', default='configs/servers_config.json', help='MCP服务器配置文件路径')
+    parser.add_argument('--pool-size', type=int, default=4, help='LocationAgent连接池大小')
+    parser.add_argument('--max-concurrent', type=int, default=16, help='最大并发调度数')
+
+    args = parser.parse_args()
+
+    app = create_app(
+        xlsx_path=args.xlsx,
+        server_config_path=args.config,
+        pool_size=args.pool_size,
+        max_concurrent_dispatches=args.max_concurrent
+    )
+    web.run_app(app, host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import asyncio
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.cache import AsyncMemoCache
+
+def test_cancelled_waiter_does_not_cancel_shared_computation():
+    """同一键的两个调用方，其中一个被取消（自身预算到期），另一个仍得到计算结果"""
+    async def scenario():
+        cache = AsyncMemoCache("routes")
+        calls = 0
+
+        async def factory():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return "12.35公里"
+
+        impatient = asyncio.ensure_future(
+            asyncio.wait_for(cache.get_or_compute("天府广场", factory), 0.01)
+        )
+        # 让先到的调用方发起计算，后到的调用方等待同一个计算
+        while "天府广场" not in cache._inflight:
+            await asyncio.sleep(0)
+        patient = asyncio.ensure_future(cache.get_or_compute("天府广场", factory))
+        try:
+            await impatient
+        except asyncio.TimeoutError:
+            pass
+        else:
+            raise AssertionError("先到期的调用方应当超时")
+        value = await patient
+        return cache, calls, value
+
+    cache, calls, value = asyncio.run(scenario())
+    assert value == "12.35公里"
+    assert calls == 1
+    assert cache.get("天府广场") == "12.35公里"
+    assert not cache._inflight
+
+def test_failed_computation_is_not_cached_and_can_retry():
+    async def scenario():
+        cache = AsyncMemoCache("routes")
+        attempts = []
+
+        async def factory():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise ConnectionError("地图服务不可用")
+            return "26分钟"
+
+        try:
+            await cache.get_or_compute("key", factory)
+        except ConnectionError:
+            pass
+        return await cache.get_or_compute("key", factory), len(attempts)
+
+    assert asyncio.run(scenario()) == ("26分钟", 2)
@@ -0,0 +1,54 @@
+import itertools
+import os
+import sys
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.combinations import evaluate_combinations
+from utils.robustness import RouteLegs
+
+def brute_force_best(legs, stock, need, max_stops, stop_minutes):
+    """枚举全部组合和访问顺序，返回最优的 (缺口, 到场时间)"""
+    best = (np.inf, np.inf)
+    for size in range(1, max_stops + 1):
+        for subset in itertools.combinations(range(len(legs)), size):
+            minutes = min(legs.nominal(route) for route in itertools.permutations(subset)) + stop_minutes * size
+            if not np.isfinite(minutes):
+                continue
+            shortfall = float(np.maximum(need - stock[list(subset)].sum(axis=0), 0).sum())
+            best = min(best, (shortfall, minutes))
+    return best
+
+def random_case(rng, count):
+    """平面上的随机仓库、出发地和事发地（时间满足三角不等式），部分出发/事发路段查询失败为inf"""
+    points = rng.uniform(0, 30, (count + 2, 2))
+    minutes = np.linalg.norm(points[:, None, :] - points[None, :, :], axis=2) * 1.5
+    departure, incident, between = minutes[count, :count].copy(), minutes[count + 1, :count].copy(), minutes[:count, :count]
+    departure[rng.random(count) < 0.25] = np.inf
+    incident[rng.random(count) < 0.15] = np.inf
+    stock = rng.integers(0, 15, (count, 2)).astype(np.float64)
+    return RouteLegs(departure, incident, between), stock
+
+def test_matches_brute_force_with_unknown_legs():
+    rng = np.random.default_rng(7)
+    need = np.array([12.0, 12.0])
+    for _ in range(300):
+        legs, stock = random_case(rng, int(rng.integers(3, 7)))
+        results, _ = evaluate_combinations(legs, max_stops=3, stock=stock, need=need, stop_minutes=2.0, top=1)
+        expected = brute_force_best(legs, stock, need, 3, 2.0)
+        if not np.isfinite(expected[1]):
+            assert not results
+            continue
+        assert (results[0]['shortfall'], results[0]['minutes']) == (round(expected[0], 2), round(expected[1], 1))
+
+def test_covered_warehouse_with_unknown_departure_leg_does_not_prune_supersets():
+    """仓库1库存已满足需求但出发地→1未知：经仓库2到达仓库1的路线仍应被评估"""
+    legs = RouteLegs(departure=[30.0, np.inf, 20.0], incident=[50.0, 40.0, 60.0],
+                     between=[[0, 25, 25], [25, 0, 15], [25, 15, 0]])
+    stock = np.array([[0.0], [20.0], [0.0]])
+    results, _ = evaluate_combinations(legs, max_stops=2, stock=stock, need=np.array([20.0]), top=1)
+    assert results[0]['route'] == (2, 1)
+    assert results[0]['minutes'] == 75.0
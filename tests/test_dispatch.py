@@ -0,0 +1,38 @@
+import asyncio
+import math
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.dispatch import build_fallback_plan, run_anytime_dispatch
+
+@pytest.mark.parametrize('budget_seconds', [math.inf, float('1e400'), math.nan, 0.0, -5.0])
+def test_anytime_dispatch_rejects_invalid_budget(budget_seconds):
+    """无穷大、NaN 和非正数预算在查询地图服务之前被拒绝（不再在计算思考token时溢出）"""
+    warehouse_data = {'warehouses': [], 'resource_summary': [], 'warehouse_distances': [], 'total_warehouses': 0}
+    with pytest.raises(ValueError):
+        asyncio.run(run_anytime_dispatch(
+            None, None, warehouse_data, "104.06,30.66", "104.10,30.70", 25, 3, "高层住宅起火",
+            budget_seconds=budget_seconds, warehouse_texts=("", "")
+        ))
+
+def test_fallback_plan_ranks_by_incident_leg_when_departure_unknown():
+    """出发地点未能解析（出发路段全部失败）时，仍按仓库→现场时间给出推荐，并标记为估算"""
+    warehouses = [
+        {'id': f"WH{index}", 'name': name, 'location': {'longitude': 104.0, 'latitude': 30.6}, 'resources': []}
+        for index, name in enumerate(['甲仓库', '乙仓库', '丙仓库'])
+    ]
+    incident_distances = [
+        {'warehouse_name': warehouse['name'], 'success': True, 'duration_s': minutes * 60, 'estimated': True}
+        for warehouse, minutes in zip(warehouses, [30, 10, 20])
+    ]
+    departure_distances = [{'warehouse_name': warehouse['name'], 'success': False} for warehouse in warehouses]
+    plan = build_fallback_plan("104.10,30.70", "未知出发地", 25, 3, warehouses, incident_distances,
+                               departure_distances, "决策超时")
+    assert "暂无可用的距离信息" not in plan
+    assert "出发→仓库 时间未知" in plan
+    assert plan.index("乙仓库") < plan.index("丙仓库") < plan.index("甲仓库")
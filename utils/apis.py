@@ -1,3 +1,5 @@
+import os
+
 class Qwen25VL72BInstruct:
     def __init__(self):
         self.model = "Qwen/Qwen2.5-VL-72B-Instruct"
@@ -7,8 +9,9 @@ class Qwen25VL72BInstruct:
 class Qwen3_235B_A22B:
     def __init__(self):
         self.model = "Qwen/Qwen3-235B-A22B"
-        self.api_key = "your-modelscope-api"
-        self.api_base = "https://api-inference.modelscope.cn/v1/"
+        # 可用环境变量指向其他OpenAI兼容服务（如 scripts/mock_services.py 的本地模拟服务）
+        self.api_key = os.environ.get("MODELSCOPE_API_KEY", "your-modelscope-api")
+        self.api_base = os.environ.get("MODELSCOPE_API_BASE", "https://api-inference.modelscope.cn/v1/")
 
 class GPT41:
     def __init__(self):
@@ -0,0 +1,90 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+class AsyncMemoCache:
+    """进程内异步记忆缓存，相同键的并发请求合并为一次计算"""
+
+    def __init__(self, name: str = "cache", max_entries: Optional[int] = None):
+        self.name = name
+        self.max_entries = max_entries
+        self._values: Dict[Hashable, Any] = {}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def get(self, key, default=None):
+        return self._values.get(key, default)
+
+    def set(self, key, value):
+        if self.max_entries is not None and len(self._values) >= self.max_entries and key not in self._values:
+            # 超出容量时淘汰最早写入的条目
+            self._values.pop(next(iter(self._values)))
+        self._values[key] = value
+
+    async def get_or_compute(self,
+                             key: Hashable,
+                             factory: Callable[[], Awaitable[Any]],
+                             should_cache: Optional[Callable[[Any], bool]] = None):
+        """获取缓存值，未命中时调用factory计算
+
+        Args:
+            key: 缓存键
+            factory: 无参数的协程工厂函数
+            should_cache: 可选的判断函数，返回False的结果不写入缓存（如计算失败）
+        """
+        if key in self._values:
+            self.hits += 1
+            return self._values[key]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.hits += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        # 计算在独立的任务中执行，任何一个等待方被取消（如自身的时间预算到期）都不会取消共享的计算，
+        # 其他等待同一键的调用方照常得到结果
+        task = asyncio.ensure_future(self._compute(key, factory, should_cache))
+        # 所有等待方都已放弃时，避免出现"exception was never retrieved"警告
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _compute(self, key, factory, should_cache):
+        try:
+            value = await factory()
+            if should_cache is None or should_cache(value):
+                self.set(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """命中统计"""
+        total = self.hits + self.misses
+        return {
+            'name': self.name,
+            'entries': len(self._values),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
+
+class DistanceCache:
+    """调度流程共享的地理编码和路线缓存"""
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.geocode = AsyncMemoCache("geocode", max_entries)
+        self.routes = AsyncMemoCache("routes", max_entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'geocode': self.geocode.stats(),
+            'routes': self.routes.stats()
+        }
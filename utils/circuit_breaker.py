@@ -0,0 +1,136 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+
+class CircuitBreaker:
+    """上游服务熔断器
+
+    - closed：正常放行，连续失败（或慢调用）达到阈值后打开
+    - open：直接拒绝请求，由后台探测任务定期探测上游，探测成功后关闭
+    - 打开超过 recovery_timeout 后进入 half_open，放行一个试探请求（探测任务仍在运行时将其取消，
+      避免探测函数本身失效时熔断器一直打开）
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self,
+                 name: str,
+                 failure_threshold: int = 3,
+                 recovery_timeout: float = 30.0,
+                 slow_call_threshold: Optional[float] = None,
+                 probe_interval: float = 10.0,
+                 probe_timeout: float = 10.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.slow_call_threshold = slow_call_threshold
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trips = 0
+        self.rejected = 0
+
+        self._probe: Optional[Callable[[], Awaitable[bool]]] = None
+        self._probe_task: Optional[asyncio.Task] = None
+        self._half_open_trial = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def allow_request(self) -> bool:
+        """判断是否放行请求"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+            self.state = self.HALF_OPEN
+            self._half_open_trial = False
+            self._cancel_probe()
+        if self.state == self.HALF_OPEN and not self._half_open_trial:
+            self._half_open_trial = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self, duration: Optional[float] = None):
+        """记录一次成功调用（超过慢调用阈值时按失败计）"""
+        if self.slow_call_threshold is not None and duration is not None and duration > self.slow_call_threshold:
+            self.record_failure()
+            return
+        self.consecutive_failures = 0
+        if self.state != self.CLOSED:
+            self._close()
+
+    def record_failure(self, probe: Optional[Callable[[], Awaitable[bool]]] = None):
+        """记录一次失败调用
+
+        Args:
+            probe: 可选的探测协程工厂函数，返回True表示上游已恢复；熔断打开后由后台任务定期调用
+        """
+        if probe is not None:
+            self._probe = probe
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        if self.state != self.OPEN:
+            self.trips += 1
+            print(f"[熔断器] {self.name} 已打开（连续失败 {self.consecutive_failures} 次）")
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self._half_open_trial = False
+        self._start_probe()
+
+    def _close(self):
+        print(f"[熔断器] {self.name} 已恢复")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._half_open_trial = False
+        self._cancel_probe()
+
+    def _cancel_probe(self):
+        if self._probe_task is not None and self._probe_task is not asyncio.current_task():
+            self._probe_task.cancel()
+        self._probe_task = None
+
+    def _start_probe(self):
+        if self._probe is None or self._probe_task is not None:
+            return
+        try:
+            self._probe_task = asyncio.ensure_future(self._probe_loop())
+        except RuntimeError:
+            # 没有运行中的事件循环，退回到 half_open 试探
+            self._probe_task = None
+
+    async def _probe_loop(self):
+        """后台探测上游，成功后关闭熔断器"""
+        try:
+            while self.state == self.OPEN:
+                await asyncio.sleep(self.probe_interval)
+                try:
+                    healthy = await asyncio.wait_for(self._probe(), self.probe_timeout)
+                except Exception as e:
+                    print(f"[熔断器] {self.name} 探测失败: {e}")
+                    healthy = False
+                if healthy:
+                    self._close()
+                    return
+        finally:
+            if self._probe_task is asyncio.current_task():
+                self._probe_task = None
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'trips': self.trips,
+            'rejected': self.rejected
+        }
@@ -0,0 +1,292 @@
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# 表名 → 列定义 (列名, 类型, 是否字典编码)；列名与Excel工作表一致
+TABLE_COLUMNS = {
+    'basic_info': [
+        ('仓库ID', 'string', False), ('仓库名称', 'string', False), ('地址', 'string', False),
+        ('经度', 'float64', False), ('纬度', 'float64', False),
+        ('城市', 'string', True), ('行政区', 'string', True),
+        ('总面积(平方米)', 'float64', False), ('可用面积(平方米)', 'float64', False), ('最大载重(吨)', 'float64', False),
+        ('负责人', 'string', False), ('联系电话', 'string', False), ('应急电话', 'string', False)
+    ],
+    'inventory': [
+        ('仓库ID', 'string', True), ('仓库名称', 'string', True), ('物资类别', 'string', True),
+        ('物资名称', 'string', True), ('数量', 'int64', False), ('单位', 'string', True), ('规格说明', 'string', True)
+    ],
+    'summary': [
+        ('物资名称', 'string', True), ('物资类别', 'string', True), ('总数量', 'int64', False), ('单位', 'string', True)
+    ],
+    'distances': [
+        ('起始仓库ID', 'string', True), ('起始仓库名称', 'string', True),
+        ('目标仓库ID', 'string', True), ('目标仓库名称', 'string', True),
+        ('距离', 'string', False), ('预计时间', 'string', False),
+        ('距离(公里)', 'float64', False), ('时间(分钟)', 'float64', False),
+        ('计算状态', 'string', True), ('尝试次数', 'int64', False)
+    ]
+}
+
+# .arrow 为未压缩的Arrow IPC文件（可内存映射零拷贝读取），.parquet 为压缩存储（供分析任务使用）
+FORMATS = ('arrow', 'parquet')
+METADATA_FILE = 'metadata.json'
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError("列式导出/读取需要安装 pyarrow：pip install pyarrow") from e
+
+def table_path(directory, name: str, fmt: str) -> str:
+    return os.path.join(directory, f"{name}.{fmt}")
+
+class ColumnarTableWriter:
+    """按批写出一张表；字典编码列在整个文件内共用一个逐步增长的字典（以增量字典写出）"""
+
+    def __init__(self, directory, name: str, batch_size: int = 65536, formats: Sequence[str] = FORMATS):
+        _require_pyarrow()
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.name = name
+        self.columns = TABLE_COLUMNS[name]
+        self.batch_size = batch_size
+        self.row_count = 0
+        self._buffers: List[list] = [[] for _ in self.columns]
+        # 字典编码列：值 → 编码，以及按编码排列的值
+        self._codes: List[Optional[dict]] = [{} if encoded else None for _, _, encoded in self.columns]
+        self._values: List[Optional[list]] = [[] if encoded else None for _, _, encoded in self.columns]
+
+        fields = []
+        for column, type_name, encoded in self.columns:
+            value_type = getattr(pa, type_name)()
+            fields.append(pa.field(column, pa.dictionary(pa.int32(), value_type) if encoded else value_type))
+        self.schema = pa.schema(fields)
+
+        os.makedirs(directory, exist_ok=True)
+        self._ipc_sink = None
+        self._ipc_writer = None
+        self._parquet_writer = None
+        if 'arrow' in formats:
+            self._ipc_sink = pa.OSFile(table_path(directory, name, 'arrow'), 'wb')
+            self._ipc_writer = ipc.new_file(
+                self._ipc_sink, self.schema, options=ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+            )
+        if 'parquet' in formats:
+            self._parquet_writer = pq.ParquetWriter(table_path(directory, name, 'parquet'), self.schema)
+
+    def append(self, row: Sequence):
+        for buffer, value in zip(self._buffers, row):
+            if hasattr(value, 'item'):
+                value = value.item()
+            buffer.append(value)
+        self.row_count += 1
+        if len(self._buffers[0]) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffers[0]:
+            return
+        pa = self.pa
+        arrays = []
+        for index, (buffer, field) in enumerate(zip(self._buffers, self.schema)):
+            codes = self._codes[index]
+            if codes is None:
+                arrays.append(pa.array(buffer, type=field.type))
+                continue
+            values = self._values[index]
+            indices = []
+            for value in buffer:
+                if value is None:
+                    indices.append(None)
+                    continue
+                value = str(value)
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(values)
+                    values.append(value)
+                indices.append(code)
+            arrays.append(pa.DictionaryArray.from_arrays(
+                pa.array(indices, type=pa.int32()), pa.array(values, type=field.type.value_type)
+            ))
+        batch = pa.record_batch(arrays, schema=self.schema)
+        if self._ipc_writer is not None:
+            self._ipc_writer.write_batch(batch)
+        if self._parquet_writer is not None:
+            self._parquet_writer.write_batch(batch)
+        self._buffers = [[] for _ in self.columns]
+
+    def close(self):
+        self.flush()
+        if self._ipc_writer is not None:
+            self._ipc_writer.close()
+            self._ipc_sink.close()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+def load_columnar_table(directory, name: str, columns: Optional[Iterable[str]] = None):
+    """读取一张表，可只读取部分列
+
+    优先内存映射 .arrow 文件（零拷贝，只有被访问的列才会读入内存），
+    没有时读取 .parquet（只解码所需的列）。
+    """
+    _require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+
+    columns = list(columns) if columns is not None else None
+    arrow_path = table_path(directory, name, 'arrow')
+    if os.path.exists(arrow_path):
+        table = ipc.open_file(pa.memory_map(arrow_path, 'r')).read_all()
+        return table.select(columns) if columns is not None else table
+    return pq.read_table(table_path(directory, name, 'parquet'), columns=columns, memory_map=True)
+
+def remove_table(directory, name: str):
+    """删除一张表的所有格式文件（重新导出时清理上次遗留的表，如本次未计算的距离表）"""
+    for fmt in FORMATS:
+        path = table_path(directory, name, fmt)
+        if os.path.exists(path):
+            os.remove(path)
+
+def has_columnar_tables(directory) -> bool:
+    """目录中是否有完整的列式数据（基本信息、库存和汇总）"""
+    if not directory or not os.path.isdir(directory):
+        return False
+    return all(
+        any(os.path.exists(table_path(directory, name, fmt)) for fmt in FORMATS)
+        for name in ('basic_info', 'inventory', 'summary')
+    )
+
+def _to_pydict(table) -> Dict[str, list]:
+    """表转换为 列名 → Python值列表
+
+    字典编码列只转换一次字典，再按编码取值，比逐个单元格转换快几十倍；
+    先统一各批次的字典，使所有批次共用同一个字典。
+    """
+    import pyarrow as pa
+
+    table = table.unify_dictionaries()
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        if not pa.types.is_dictionary(column.type) or column.null_count:
+            columns[name] = column.to_pylist()
+            continue
+        values = []
+        dictionary = None
+        for chunk in column.chunks:
+            if dictionary is None:
+                dictionary = chunk.dictionary.to_pylist()
+            values.extend([dictionary[code] for code in chunk.indices.to_numpy(zero_copy_only=False).tolist()])
+        columns[name] = values
+    return columns
+
+def _number(value):
+    """整数值的浮点数还原为整数，与Excel读取结果保持一致"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def read_warehouse_data_from_columnar(directory):
+    """
+    从列式数据读取仓库数据，返回与 read_warehouse_data_from_xlsx 相同的结构
+
+    Returns:
+        dict: 仓库数据，读取失败时返回None
+    """
+    try:
+        basic = _to_pydict(load_columnar_table(directory, 'basic_info'))
+        inventory = _to_pydict(load_columnar_table(directory, 'inventory', [
+            '仓库ID', '物资类别', '物资名称', '数量', '单位', '规格说明'
+        ]))
+        summary = _to_pydict(load_columnar_table(directory, 'summary'))
+        has_distances = any(os.path.exists(table_path(directory, 'distances', fmt)) for fmt in FORMATS)
+        distances = _to_pydict(load_columnar_table(directory, 'distances')) if has_distances else None
+    except Exception as e:
+        print(f"读取列式数据时发生错误: {e}")
+        return None
+
+    # 按仓库分组物资（一次遍历）
+    resources_by_warehouse: Dict[str, list] = {}
+    for warehouse_id, category, name, quantity, unit, specification in zip(
+            inventory['仓库ID'], inventory['物资类别'], inventory['物资名称'],
+            inventory['数量'], inventory['单位'], inventory['规格说明']):
+        resources_by_warehouse.setdefault(warehouse_id, []).append({
+            "category": category,
+            "name": name,
+            "quantity": quantity,
+            "unit": unit,
+            "specification": specification
+        })
+
+    warehouse_count = len(basic['仓库ID'])
+    warehouse_data = {
+        "warehouses": [],
+        "resource_summary": [],
+        "warehouse_distances": [],
+        "total_warehouses": warehouse_count
+    }
+    for i in range(warehouse_count):
+        warehouse_id = basic['仓库ID'][i]
+        warehouse_data["warehouses"].append({
+            "id": warehouse_id,
+            "name": basic['仓库名称'][i],
+            "location": {
+                "address": basic['地址'][i],
+                "longitude": basic['经度'][i],
+                "latitude": basic['纬度'][i],
+                "city": basic['城市'][i],
+                "district": basic['行政区'][i]
+            },
+            "capacity": {
+                "total_area": _number(basic['总面积(平方米)'][i]),
+                "available_area": _number(basic['可用面积(平方米)'][i]),
+                "max_weight": _number(basic['最大载重(吨)'][i])
+            },
+            "contact": {
+                "manager": basic['负责人'][i],
+                "phone": basic['联系电话'][i],
+                "emergency_phone": basic['应急电话'][i]
+            },
+            "resources": resources_by_warehouse.get(warehouse_id, [])
+        })
+
+    for name, category, total, unit in zip(summary['物资名称'], summary['物资类别'], summary['总数量'], summary['单位']):
+        warehouse_data["resource_summary"].append({
+            "name": name,
+            "category": category,
+            "total_quantity": total,
+            "unit": unit
+        })
+
+    if distances:
+        for i in range(len(distances['起始仓库ID'])):
+            warehouse_data["warehouse_distances"].append({
+                "from_warehouse_id": distances['起始仓库ID'][i],
+                "from_warehouse_name": distances['起始仓库名称'][i],
+                "to_warehouse_id": distances['目标仓库ID'][i],
+                "to_warehouse_name": distances['目标仓库名称'][i],
+                "distance": distances['距离'][i],
+                "duration": distances['预计时间'][i],
+                "distance_km": distances['距离(公里)'][i],
+                "duration_min": _number(distances['时间(分钟)'][i]),
+                "status": distances['计算状态'][i],
+                "attempts": distances['尝试次数'][i]
+            })
+
+    return warehouse_data
+
+def write_resource_metadata(directory, metadata):
+    """保存 resource.json 中的 metadata（表结构在写出第一批数据前就已确定，metadata单独保存）"""
+    with open(os.path.join(directory, METADATA_FILE), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+def read_resource_metadata(directory) -> Optional[dict]:
+    """读取写出列式数据时保存的 resource.json metadata，不存在时返回None"""
+    path = os.path.join(directory, METADATA_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,216 @@
+import itertools
+from typing import List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from utils.robustness import RouteLegs
+
+def requirement_stock(table, requirements: Mapping[str, float]) -> Tuple[np.ndarray, np.ndarray]:
+    """需求物资在各仓库的库存 (仓库数, 需求数) 与需求量向量
+
+    requirements 为 {物资名称关键词: 需要数量}，如 {'呼吸器': 20, '防护服': 20}。
+    """
+    keywords = list(requirements)
+    stock = np.zeros((len(table), len(keywords)), dtype=np.float64)
+    for column, keyword in enumerate(keywords):
+        stock[:, column] = table.totals_by_warehouse([keyword])
+    return stock, np.array([float(requirements[keyword]) for keyword in keywords])
+
+def _subset_keys(subsets: np.ndarray, base: int) -> np.ndarray:
+    """子集（每行升序排列的仓库下标）编码为整数，用于在上一层中查找"""
+    keys = np.zeros(len(subsets), dtype=np.int64)
+    for column in range(subsets.shape[1]):
+        keys = keys * base + subsets[:, column]
+    return keys
+
+class _Level:
+    """同一规模的全部候选子集：subsets (N, s) 升序下标，ends (N, s) 以第j个仓库结束的最短路径时间"""
+
+    def __init__(self, subsets: np.ndarray, ends: np.ndarray, shortfall: np.ndarray, base: int):
+        self.subsets = subsets
+        self.ends = ends
+        self.shortfall = shortfall
+        self.totals = None
+        keys = _subset_keys(subsets, base)
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+
+    def __len__(self):
+        return len(self.subsets)
+
+    def lookup(self, subsets: np.ndarray, base: int) -> np.ndarray:
+        """子集所在行，不在本层（被剪枝）时为-1"""
+        keys = _subset_keys(subsets, base)
+        if not len(self.keys):
+            return np.full(len(keys), -1, dtype=np.int64)
+        position = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[position] == keys, self.order[position], -1)
+
+def _shortfall(subsets: np.ndarray, stock: Optional[np.ndarray], need: Optional[np.ndarray]) -> np.ndarray:
+    """子集合计库存相对需求的缺口（件数之和，0表示全部满足）"""
+    if stock is None:
+        return np.zeros(len(subsets))
+    return np.maximum(need - stock[subsets].sum(axis=1), 0).sum(axis=1)
+
+def _min_plus_bounds(legs: RouteLegs, hops: int) -> np.ndarray:
+    """经过仓库m的路线时间下界：出发地→m 与 m→事发地 各自最多经过hops段仓库间路程的最短时间之和
+
+    不依赖三角不等式（估算与实测混合的矩阵未必满足），用向量-矩阵 (min, +) 乘积逐段松弛。
+    """
+    reach, leave = legs.departure.copy(), legs.incident.copy()
+    between = legs.between
+    for _ in range(hops):
+        reach = np.minimum(reach, (reach[:, None] + between).min(axis=0))
+        leave = np.minimum(leave, (between + leave[None, :]).min(axis=1))
+    return reach + leave
+
+def evaluate_combinations(legs: RouteLegs, max_stops: int = 3, stock: Optional[np.ndarray] = None,
+                          need: Optional[np.ndarray] = None, stop_minutes: float = 0.0, top: int = 10,
+                          pool_size: Optional[int] = None, max_minutes: Optional[float] = None,
+                          max_candidates: int = 5_000_000, incumbent_parents: int = 256) -> Tuple[List[dict], dict]:
+    """计算所有不超过max_stops个仓库的组合的最优访问顺序和到场时间，返回排名靠前的组合
+
+    逐层在NumPy中做 (min, +) 运算：ends[S, e] 为从出发地经过S中全部仓库、以e结束的最短时间，
+    ends[S, e] = min_p (ends[S-{e}, p] + between[p, e])，组合时间 = min_e (ends[S, e] + incident[e])。
+    每个组合只按升序生成一次，S-{e} 在上一层中按整数编码二分查找。
+
+    剪枝：合计库存已满足需求（stock, need）且路段全部已知的组合不再扩展（多访问一个仓库只会更慢），
+    其任一子组合被剪枝的组合也不生成；经过某仓库的路线时间有下界（_min_plus_bounds），
+    下界超过 max_minutes 或当前第top名满足需求的组合时间的仓库不再参与更大的组合。
+    pool_size 只考虑下界最小的若干仓库。
+
+    Returns:
+        (结果列表, 统计) — 结果按 (缺口, 到场时间) 排序：
+        [{'route': (按访问顺序的仓库下标...), 'warehouses': [名称...], 'minutes', 'shortfall'}, ...]
+    """
+    count = len(legs)
+    bounds = _min_plus_bounds(legs, max(0, max_stops - 1))
+    candidates = np.flatnonzero(np.isfinite(bounds))
+    if pool_size is not None:
+        candidates = candidates[np.argsort(bounds[candidates], kind='stable')][:pool_size]
+    candidates = np.sort(candidates)
+    base = count + 1
+    between = legs.between
+    limit = np.inf if max_minutes is None else max_minutes
+
+    results: List[Tuple[float, float, np.ndarray]] = []
+    stats = {'candidates': int(len(candidates)), 'evaluated': 0, 'pruned_covered': 0, 'pruned_bound': 0,
+             'levels': []}
+
+    def threshold(extra=()):
+        """当前第top名满足需求的组合时间（不足top个时不限）"""
+        covered = sorted([minutes for shortfall, minutes, _ in results if shortfall == 0] + list(extra))
+        return min(limit, covered[top - 1]) if len(covered) >= top else limit
+
+    def incumbent(level: _Level, parents: np.ndarray, size: int) -> np.ndarray:
+        """在时间最短的若干组合末尾追加一个仓库得到的实际路线，满足需求的各组合时间（用于提前收紧剪枝阈值）"""
+        if not len(parents):
+            return np.empty(0)
+        best = parents[np.argsort(level.totals[parents], kind='stable')[:incumbent_parents]]
+        subsets = level.subsets[best]
+        # (min, +)：min_e (ends[S, e] + between[e, l]) + incident[l]
+        append = (level.ends[best][:, :, None] + between[subsets]).min(axis=1) + legs.incident + stop_minutes * size
+        append[np.arange(len(best))[:, None], subsets] = np.inf
+        if stock is not None:
+            covered = (np.maximum(need - stock[subsets].sum(axis=1)[:, None, :] - stock[None, :, :], 0).sum(axis=2) == 0)
+            append[~covered] = np.inf
+        rows, added = np.nonzero(np.isfinite(append))
+        minutes = append[rows, added]
+        unions = np.sort(np.column_stack([subsets[rows], added]), axis=1)
+        alive = expand(level, unions)[1]
+        unions, minutes = unions[alive], minutes[alive]
+        if not len(unions):
+            return np.empty(0)
+        keys = _subset_keys(unions, base)
+        order = np.lexsort((minutes, keys))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = keys[order][1:] != keys[order][:-1]
+        return minutes[order][first]
+
+    def expand(level: _Level, subsets: np.ndarray):
+        """S-{e} 在上一层的行，以及全部子组合都在上一层且（有需求时）都未满足需求的掩码"""
+        size = subsets.shape[1]
+        rows = np.empty((len(subsets), size), dtype=np.int64)
+        for position in range(size):
+            rows[:, position] = level.lookup(np.delete(subsets, position, axis=1), base)
+        alive = (rows >= 0).all(axis=1)
+        if stock is not None:
+            alive[alive] = level.shortfall[rows[alive]].min(axis=1) > 0
+        return rows, alive
+
+    def collect(level: _Level, size: int):
+        totals = level.totals = (level.ends + legs.incident[level.subsets]).min(axis=1) + stop_minutes * size
+        keep = np.flatnonzero(np.isfinite(totals) & (totals <= limit))
+        if len(keep) > top:
+            # 先按缺口、再按时间取前top个，避免对全部组合排序
+            score = level.shortfall[keep] * (float(np.nanmax(totals[keep])) + 1.0) + totals[keep]
+            keep = keep[np.argpartition(score, top - 1)[:top]]
+        results.extend((float(level.shortfall[row]), float(totals[row]), level.subsets[row]) for row in keep)
+        if stock is not None:
+            # 已满足需求的组合可以代替其超集，前提是从超集路线中去掉多余仓库后的路段都已知：
+            # 组合时间有限，且各仓库的出发、事发路段和相互之间的路段都不是inf（查询失败）。
+            # 否则超集可能经其他仓库绕开未知路段而更快，按未满足处理继续扩展
+            subsets = level.subsets
+            known = np.isfinite(totals)
+            known &= np.isfinite(legs.departure[subsets]).all(axis=1) & np.isfinite(legs.incident[subsets]).all(axis=1)
+            for first, second in itertools.permutations(range(size), 2):
+                known &= np.isfinite(between[subsets[:, first], subsets[:, second]])
+            level.shortfall = np.where(known, level.shortfall, np.inf)
+
+    subsets = candidates.reshape(-1, 1)
+    level = _Level(subsets, legs.departure[subsets], _shortfall(subsets, stock, need), base)
+    stats['evaluated'] += len(level)
+    stats['levels'].append(len(level))
+    collect(level, 1)
+
+    for size in range(2, max_stops + 1):
+        # 只扩展尚有缺口、且部分路径未超时的组合
+        open_rows = level.shortfall > 0 if stock is not None else np.ones(len(level), dtype=bool)
+        stats['pruned_covered'] += int((~open_rows).sum())
+        allowed = np.zeros(count, dtype=bool)
+        # 下界与路线时间的求和顺序不同，留一点浮点误差余量
+        allowed[candidates] = (bounds[candidates] + stop_minutes * size
+                               <= threshold(incumbent(level, np.flatnonzero(open_rows), size)) * (1 + 1e-9) + 1e-9)
+        stats['pruned_bound'] += int(len(candidates) - allowed[candidates].sum())
+        parents = level.subsets[open_rows & allowed[level.subsets].all(axis=1)]
+        extensions = candidates[allowed[candidates]]
+        if not len(parents) or not len(extensions):
+            break
+        # 以大于最大下标的仓库扩展，每个组合只生成一次
+        starts = np.searchsorted(extensions, parents[:, -1], side='right')
+        counts = len(extensions) - starts
+        total = int(counts.sum())
+        if total > max_candidates:
+            raise ValueError(f"{size}个仓库的候选组合 {total} 个超过上限 {max_candidates}，请减小 pool_size")
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        subsets = np.column_stack([np.repeat(parents, counts, axis=0),
+                                   extensions[np.repeat(starts, counts) + offsets]])
+
+        # 全部子组合都未被剪枝时才生成；同时得到 S-{e} 所在的行
+        rows, alive = expand(level, subsets)
+        subsets, rows = subsets[alive], rows[alive]
+        if not len(subsets):
+            break
+
+        ends = np.empty((len(subsets), size), dtype=np.float64)
+        for position in range(size):
+            others = np.delete(subsets, position, axis=1)
+            # (min, +)：上一层以p结束的时间 + p→e
+            ends[:, position] = (level.ends[rows[:, position]] + between[others, subsets[:, [position]]]).min(axis=1)
+        level = _Level(subsets, ends, _shortfall(subsets, stock, need), base)
+        stats['evaluated'] += len(level)
+        stats['levels'].append(len(level))
+        collect(level, size)
+
+    results.sort(key=lambda item: (item[0], item[1]))
+    return [_describe(legs, subset, shortfall, minutes) for shortfall, minutes, subset in results[:top]], stats
+
+def _describe(legs: RouteLegs, subset: np.ndarray, shortfall: float, minutes: float) -> dict:
+    """恢复组合的最优访问顺序（组合最多几个仓库，直接比较全部排列）"""
+    route = min(itertools.permutations(int(stop) for stop in subset), key=legs.nominal)
+    return {
+        'route': route,
+        'warehouses': [legs.names[stop] for stop in route],
+        'minutes': round(minutes, 1),
+        'shortfall': round(shortfall, 2)
+    }
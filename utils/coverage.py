@@ -0,0 +1,290 @@
+import math
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.geo import DEFAULT_TRAVEL_ESTIMATOR
+from utils.spatial import SpatialIndex
+
+# 默认的覆盖网格文件（由 scripts/build_coverage_grid.py 生成）
+DEFAULT_GRID_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'coverage_grid.npz'
+)
+
+KM_PER_DEGREE_LAT = 111.32
+
+def _warehouse_point(warehouse) -> Tuple[float, float]:
+    return float(warehouse['location']['longitude']), float(warehouse['location']['latitude'])
+
+class CoverageGrid:
+    """服务区域网格：每个网格保存按行驶时间排序的K个最快仓库
+
+    网格按经纬度等分（网格边长约cell_km公里），网格中心到仓库的距离/时间离线计算。
+    数组：
+        indices  (网格数, K) int32   仓库在 warehouse_ids 中的位置，-1表示空位
+        km       (网格数, K) float32 行驶距离（公里）
+        minutes  (网格数, K) float32 行驶时间（分钟）
+        routed   (网格数, K) bool    是否为地图服务实测（否则为直线距离估算）
+    仓库坐标与生成时不同的条目视为失效。
+    """
+
+    def __init__(self, origin_lng: float, origin_lat: float, lng_step: float, lat_step: float,
+                 rows: int, cols: int, warehouse_ids, warehouse_points,
+                 indices, km, minutes, routed, cell_km: float, created: str = ''):
+        self.origin_lng = float(origin_lng)
+        self.origin_lat = float(origin_lat)
+        self.lng_step = float(lng_step)
+        self.lat_step = float(lat_step)
+        self.rows = int(rows)
+        self.cols = int(cols)
+        self.warehouse_ids = np.asarray(warehouse_ids, dtype=str)
+        self.warehouse_points = np.asarray(warehouse_points, dtype=np.float64).reshape(-1, 2)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.km = np.asarray(km, dtype=np.float32)
+        self.minutes = np.asarray(minutes, dtype=np.float32)
+        self.routed = np.asarray(routed, dtype=bool)
+        self.cell_km = float(cell_km)
+        self.created = created
+        self._position = {warehouse_id: i for i, warehouse_id in enumerate(self.warehouse_ids.tolist())}
+        # 最近一次使用的仓库列表及其位置映射（调度时通常反复传入同一个列表）
+        self._mapping_source = None
+        self._mapping_size = 0
+        self._mapping: Dict[int, int] = {}
+
+    @property
+    def k(self) -> int:
+        return self.indices.shape[1]
+
+    def __len__(self):
+        return self.rows * self.cols
+
+    @property
+    def nbytes(self) -> int:
+        return self.indices.nbytes + self.km.nbytes + self.minutes.nbytes + self.routed.nbytes
+
+    def cell_of(self, lng: float, lat: float) -> Optional[int]:
+        """坐标所在的网格编号，在服务区域之外时返回None"""
+        col = math.floor((lng - self.origin_lng) / self.lng_step)
+        row = math.floor((lat - self.origin_lat) / self.lat_step)
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row * self.cols + col
+        return None
+
+    def cell_center(self, cell: int) -> Tuple[float, float]:
+        row, col = divmod(cell, self.cols)
+        return self.origin_lng + (col + 0.5) * self.lng_step, self.origin_lat + (row + 0.5) * self.lat_step
+
+    def cell_centers(self) -> np.ndarray:
+        """所有网格中心的 (经度, 纬度)，按网格编号排列"""
+        rows, cols = np.divmod(np.arange(len(self)), self.cols)
+        return np.column_stack((
+            self.origin_lng + (cols + 0.5) * self.lng_step,
+            self.origin_lat + (rows + 0.5) * self.lat_step
+        ))
+
+    def _valid_positions(self, warehouses) -> Dict[int, int]:
+        """网格中的仓库位置 → 当前仓库列表下标（只保留ID存在且坐标未变化的仓库）"""
+        if self._mapping_source is warehouses and len(self._mapping_source) == self._mapping_size:
+            return self._mapping
+        mapping = {}
+        for index, warehouse in enumerate(warehouses):
+            position = self._position.get(str(warehouse['id']))
+            if position is None:
+                continue
+            lng, lat = _warehouse_point(warehouse)
+            stored_lng, stored_lat = self.warehouse_points[position]
+            if abs(stored_lng - lng) < 1e-6 and abs(stored_lat - lat) < 1e-6:
+                mapping[position] = index
+        self._mapping_source, self._mapping_size, self._mapping = warehouses, len(warehouses), mapping
+        return mapping
+
+    def candidates(self, lng: float, lat: float, warehouses) -> List[dict]:
+        """坐标所在网格的候选仓库，按行驶时间升序
+
+        Returns:
+            list: [{'index': 仓库下标, 'distance_km', 'duration_min', 'routed'}, ...]，不在服务区域时为空
+        """
+        cell = self.cell_of(lng, lat)
+        if cell is None:
+            return []
+        mapping = self._valid_positions(warehouses)
+        result = []
+        for position, km, minutes, routed in zip(self.indices[cell].tolist(), self.km[cell].tolist(),
+                                                  self.minutes[cell].tolist(), self.routed[cell].tolist()):
+            if position < 0 or position not in mapping:
+                continue
+            result.append({
+                'index': mapping[position],
+                'distance_km': round(km, 2),
+                'duration_min': round(minutes, 1),
+                'routed': routed
+            })
+        return result
+
+    def lookup(self, lng: float, lat: float, warehouse) -> Optional[Tuple[float, float]]:
+        """坐标所在网格中到指定仓库的实测 (距离公里, 时间分钟)，没有实测记录时返回None"""
+        cell = self.cell_of(lng, lat)
+        position = self._position.get(str(warehouse['id']))
+        if cell is None or position is None:
+            return None
+        stored_lng, stored_lat = self.warehouse_points[position]
+        lng_w, lat_w = _warehouse_point(warehouse)
+        if abs(stored_lng - lng_w) >= 1e-6 or abs(stored_lat - lat_w) >= 1e-6:
+            return None
+        slots = np.flatnonzero((self.indices[cell] == position) & self.routed[cell])
+        if not len(slots):
+            return None
+        slot = slots[0]
+        return round(float(self.km[cell, slot]), 2), round(float(self.minutes[cell, slot]), 1)
+
+    def save(self, path=None):
+        """保存为压缩的 .npz 文件"""
+        path = path or DEFAULT_GRID_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez_compressed(
+            path,
+            geometry=np.array([self.origin_lng, self.origin_lat, self.lng_step, self.lat_step, self.cell_km]),
+            shape=np.array([self.rows, self.cols]),
+            warehouse_ids=self.warehouse_ids,
+            warehouse_points=self.warehouse_points,
+            indices=self.indices,
+            km=self.km,
+            minutes=self.minutes,
+            routed=self.routed,
+            created=np.array(self.created)
+        )
+
+    @classmethod
+    def load(cls, path=None) -> "CoverageGrid":
+        with np.load(path or DEFAULT_GRID_PATH, allow_pickle=False) as data:
+            origin_lng, origin_lat, lng_step, lat_step, cell_km = data['geometry'].tolist()
+            rows, cols = data['shape'].tolist()
+            return cls(
+                origin_lng, origin_lat, lng_step, lat_step, rows, cols,
+                data['warehouse_ids'], data['warehouse_points'],
+                data['indices'], data['km'], data['minutes'], data['routed'],
+                cell_km=cell_km, created=str(data['created'])
+            )
+
+def build_coverage_grid(warehouses, cell_km: float = 1.0, k: int = 5, margin_km: float = 5.0,
+                        bounds: Optional[Tuple[float, float, float, float]] = None,
+                        estimator=None) -> CoverageGrid:
+    """按直线距离估算生成覆盖网格（不调用地图服务）
+
+    Args:
+        cell_km: 网格边长（公里）
+        k: 每个网格保存的仓库数
+        margin_km: 未指定bounds时，在仓库分布范围外扩的距离（公里）
+        bounds: 服务区域 (最小经度, 最小纬度, 最大经度, 最大纬度)
+        estimator: 可选的TravelTimeEstimator，默认使用DEFAULT_TRAVEL_ESTIMATOR
+    """
+    estimator = estimator or DEFAULT_TRAVEL_ESTIMATOR
+    warehouses = list(warehouses)
+    if not warehouses:
+        raise ValueError("没有仓库数据，无法生成覆盖网格")
+    points = np.array([_warehouse_point(warehouse) for warehouse in warehouses], dtype=np.float64)
+
+    if bounds is None:
+        mid_lat = float(points[:, 1].mean())
+        lng_margin = margin_km / (KM_PER_DEGREE_LAT * math.cos(math.radians(mid_lat)))
+        lat_margin = margin_km / KM_PER_DEGREE_LAT
+        bounds = (points[:, 0].min() - lng_margin, points[:, 1].min() - lat_margin,
+                  points[:, 0].max() + lng_margin, points[:, 1].max() + lat_margin)
+    min_lng, min_lat, max_lng, max_lat = map(float, bounds)
+    mid_lat = (min_lat + max_lat) / 2
+    lat_step = cell_km / KM_PER_DEGREE_LAT
+    lng_step = cell_km / (KM_PER_DEGREE_LAT * math.cos(math.radians(mid_lat)))
+    rows = max(1, math.ceil((max_lat - min_lat) / lat_step))
+    cols = max(1, math.ceil((max_lng - min_lng) / lng_step))
+
+    k = min(k, len(warehouses))
+    grid = CoverageGrid(
+        min_lng, min_lat, lng_step, lat_step, rows, cols,
+        [str(warehouse['id']) for warehouse in warehouses], points,
+        np.full((rows * cols, k), -1, dtype=np.int32),
+        np.full((rows * cols, k), np.nan, dtype=np.float32),
+        np.full((rows * cols, k), np.nan, dtype=np.float32),
+        np.zeros((rows * cols, k), dtype=bool),
+        cell_km=cell_km, created=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    )
+
+    # 估算时间与直线距离成正比，直线距离最近的k个即为估算最快的k个
+    index = SpatialIndex(points[:, 0], points[:, 1])
+    for cell, (lng, lat) in enumerate(grid.cell_centers().tolist()):
+        for slot, (position, _) in enumerate(index.nearest(lng, lat, k)):
+            road_km, minutes = estimator.estimate(lng, lat, points[position, 0], points[position, 1])
+            grid.indices[cell, slot] = position
+            grid.km[cell, slot] = road_km
+            grid.minutes[cell, slot] = minutes
+    return grid
+
+async def route_coverage_grid(grid: CoverageGrid, agent, warehouses, candidates: Optional[int] = None,
+                              progress_callback=None) -> int:
+    """用地图服务实测各网格中心到候选仓库的行驶时间，并按实测结果重新排序
+
+    每个网格对直线距离最近的candidates个仓库（默认2K）查询路线，保留最快的K个；
+    查询失败的仓库保留估算值（routed为False）。
+
+    Returns:
+        int: 实测成功的路线数
+    """
+    from utils.dispatch import calculate_single_warehouse_distance, result_km, result_minutes
+
+    warehouses = list(warehouses)
+    by_id = {str(warehouse['id']): warehouse for warehouse in warehouses}
+    points = grid.warehouse_points
+    candidates = min(candidates or grid.k * 2, len(grid.warehouse_ids))
+    index = SpatialIndex(points[:, 0], points[:, 1])
+    routed_count = 0
+
+    for cell, (lng, lat) in enumerate(grid.cell_centers().tolist()):
+        origin = f"{lng:.6f},{lat:.6f}"
+        options = []
+        for position, _ in index.nearest(lng, lat, candidates):
+            warehouse = by_id.get(grid.warehouse_ids[position])
+            if warehouse is None:
+                continue
+            result = await calculate_single_warehouse_distance(agent, origin, warehouse)
+            road_km, minutes = result_km(result), result_minutes(result)
+            routed = road_km is not None and minutes is not None and not result.get('estimated')
+            if not routed:
+                road_km, minutes = DEFAULT_TRAVEL_ESTIMATOR.estimate(lng, lat, *points[position])
+            routed_count += routed
+            options.append((minutes, road_km, position, routed))
+
+        options.sort()
+        grid.indices[cell] = -1
+        grid.km[cell] = np.nan
+        grid.minutes[cell] = np.nan
+        grid.routed[cell] = False
+        for slot, (minutes, road_km, position, routed) in enumerate(options[:grid.k]):
+            grid.indices[cell, slot] = position
+            grid.km[cell, slot] = road_km
+            grid.minutes[cell, slot] = minutes
+            grid.routed[cell, slot] = routed
+        if progress_callback:
+            progress_callback(cell + 1, len(grid))
+    return routed_count
+
+_grid_lock = threading.Lock()
+_grid_cache: Dict[str, Tuple[Optional[float], Optional[CoverageGrid]]] = {}
+
+def get_coverage_grid(path=None) -> Optional[CoverageGrid]:
+    """进程内共享的覆盖网格，文件不存在时返回None，文件更新后自动重新读取"""
+    path = path or DEFAULT_GRID_PATH
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    with _grid_lock:
+        cached = _grid_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        grid = None
+        if mtime is not None:
+            try:
+                grid = CoverageGrid.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"读取覆盖网格失败（{path}）: {e}")
+        _grid_cache[path] = (mtime, grid)
+        return grid
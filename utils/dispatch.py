@@ -0,0 +1,899 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import math
+import re
+import time
+
+from agents.decision_agent import DecisionAgent
+from utils.circuit_breaker import CircuitBreaker
+from utils.geo import DEFAULT_TRAVEL_ESTIMATOR, parse_coordinates
+from utils.retry import DECISION_RETRY_POLICY, LOCATION_RETRY_POLICY, RetryError
+from utils.tool_results import format_route, parse_route_text
+from utils.utils import format_warehouse_data_for_llm
+
+# 地图服务熔断器：连续失败后直接使用直线距离估算，由后台探测恢复
+LOCATION_BREAKER = CircuitBreaker("location", failure_threshold=3, recovery_timeout=30.0)
+
+def is_coordinates(location_str):
+    """检测输入是否为经纬度格式"""
+    coord_pattern = r'^\s*(-?\d+\.?\d*)\s*,\s*(-?\d+\.?\d*)\s*$'
+    return bool(re.match(coord_pattern, location_str.strip()))
+
+async def get_location_coordinates(agent, location_name):
+    """获取地点的经纬度坐标"""
+    try:
+        query = f"请提供{location_name}的经纬度坐标"
+        response = await agent.process_query(query)
+        
+        coord_pattern = r'(-?\d+\.\d+)\s*,\s*(-?\d+\.\d+)'
+        match = re.search(coord_pattern, response)
+        
+        if match:
+            longitude = match.group(1)
+            latitude = match.group(2)
+            return f"{longitude},{latitude}"
+        else:
+            return location_name
+    except Exception as e:
+        print(f"获取{location_name}坐标时出错: {e}")
+        return location_name
+
+def route_fields(meters, seconds):
+    """距离（米）、时间（秒）数值及对应的展示文本，作为距离结果中的 distance/duration/distance_m/duration_s"""
+    distance, duration = format_route(meters, seconds)
+    return {'distance': distance, 'duration': duration, 'distance_m': meters, 'duration_s': seconds}
+
+def parse_distance_info(response):
+    """解析地图代理的路线查询结果
+    
+    response 为 QueryResult 时优先使用路线工具返回的数值（米、秒），不解析文本；
+    只有模型的文字回复（或预算用尽时的部分结果）才用 parse_route_text 提取。
+    
+    Returns:
+        dict: distance、duration 文本及 distance_m、duration_s 数值（缺少时间时 duration_s 为None）、success
+    """
+    route = getattr(response, 'route', None)
+    if route is not None:
+        return {**route_fields(*route), 'success': True}
+    response_text = getattr(response, 'text', response)
+    if not response_text:
+        return {
+            'distance': '无响应',
+            'duration': '无响应',
+            'success': False,
+            'raw_response': '空响应'
+        }
+    meters, seconds = parse_route_text(response_text)
+    if meters is None:
+        return {
+            'distance': '解析失败',
+            'duration': '解析失败',
+            'success': False,
+            'raw_response': response_text,
+            'debug_info': f"响应长度: {len(response_text)}, 前200字符: {response_text[:200]}"
+        }
+    return {**route_fields(meters, seconds), 'success': True}
+
+def estimate_warehouse_distance(user_location, warehouse, estimator=None):
+    """估算到仓库的行驶距离和时间
+    
+    起点所在覆盖网格有该仓库的实测路线时使用网格中的结果（标记coverage_grid），
+    否则用直线距离 × 绕行系数 ÷ 平均车速估算。
+    
+    Returns:
+        dict: 包含distance、duration文本，distance_m、duration_s数值和estimated标记；起点不是经纬度格式时返回None
+    """
+    from utils.coverage import get_coverage_grid
+    
+    origin = parse_coordinates(user_location)
+    if origin is None:
+        return None
+    grid = get_coverage_grid()
+    routed = grid.lookup(origin[0], origin[1], warehouse) if grid is not None else None
+    if routed is not None:
+        return {**route_fields(routed[0] * 1000, routed[1] * 60), 'estimated': True, 'coverage_grid': True}
+    estimator = estimator or DEFAULT_TRAVEL_ESTIMATOR
+    distance_km, duration_min = estimator.estimate(
+        origin[0], origin[1],
+        float(warehouse['location']['longitude']), float(warehouse['location']['latitude'])
+    )
+    return {**route_fields(distance_km * 1000, duration_min * 60), 'estimated': True}
+
+async def calculate_single_warehouse_distance(agent, user_location, warehouse, max_retries=3, retry_policy=None,
+                                              breaker=None, estimator=None, probe=None):
+    """计算单个仓库的距离
+    
+    按重试策略执行：单次尝试超时、带抖动的指数退避，并在慢请求超过历史p95延迟时发出对冲请求。
+    熔断器打开时不再查询地图服务，直接返回基于仓库坐标的估算结果（标记estimated）；
+    实时查询失败且起点为经纬度时同样退回估算。
+    
+    Args:
+        max_retries: 最大尝试次数（未指定retry_policy时生效）
+        retry_policy: 可选的RetryPolicy，默认使用LOCATION_RETRY_POLICY
+        breaker: 可选的CircuitBreaker，默认使用LOCATION_BREAKER
+        estimator: 可选的TravelTimeEstimator，默认使用DEFAULT_TRAVEL_ESTIMATOR
+        probe: 可选的探测协程工厂函数（通常为 LocationAgentPool.probe），熔断打开后由熔断器后台调用；
+               不使用当前代理的会话，该会话可能已被连接池重连替换
+    """
+    warehouse_lng = warehouse['location']['longitude']
+    warehouse_lat = warehouse['location']['latitude']
+    warehouse_location = f"{warehouse_lng},{warehouse_lat}"
+    warehouse_address = warehouse['location']['address']
+    
+    query = f"从{user_location}到{warehouse_location}的车辆行驶距离"
+    policy = retry_policy or LOCATION_RETRY_POLICY.with_options(max_attempts=max_retries)
+    breaker = breaker or LOCATION_BREAKER
+    
+    result = {
+        'warehouse_name': warehouse['name'],
+        'warehouse_address': warehouse_address,
+        'warehouse_coordinates': warehouse_location,
+        'origin': user_location,
+        'destination': f"{warehouse_address} ({warehouse_location})"
+    }
+    
+    if not breaker.allow_request():
+        estimate = estimate_warehouse_distance(user_location, warehouse, estimator)
+        if estimate is None:
+            result.update({
+                'distance': '地图服务熔断',
+                'duration': '地图服务熔断',
+                'success': False,
+                'attempts': 0,
+                'error': '地图服务不可用且起点无经纬度，无法估算'
+            })
+        else:
+            result.update(estimate)
+            result.update({'success': True, 'attempts': 0, 'fallback_reason': '地图服务熔断'})
+        return result
+    
+    async def query_route():
+        # 独立的对话历史，重试和对冲请求可以在同一代理上并发执行；
+        # 路线工具返回后直接使用其中的数值，不再等模型转述
+        response = await agent.process_query(query, isolated=True, detailed=True, stop_on_route=True)
+        return response.text, parse_distance_info(response)
+    
+    started = time.perf_counter()
+    try:
+        (response, parsed_info), attempts = await policy.run(
+            'location.route',
+            query_route,
+            is_success=lambda outcome: outcome[1]['success']
+        )
+    except RetryError as e:
+        breaker.record_failure(probe=probe)
+        estimate = estimate_warehouse_distance(user_location, warehouse, estimator)
+        if estimate is not None:
+            result.update(estimate)
+            result.update({'success': True, 'attempts': e.attempts, 'fallback_reason': str(e)})
+            return result
+        
+        result.update({'success': False, 'attempts': e.attempts})
+        if e.last_result is not None:
+            result.update({
+                'distance': '解析失败',
+                'duration': '解析失败',
+                'raw_response': e.last_result[0]
+            })
+        else:
+            result.update({
+                'distance': '计算失败',
+                'duration': '计算失败',
+                'error': str(e.last_exception)
+            })
+        return result
+    
+    breaker.record_success(time.perf_counter() - started)
+    result.update(parsed_info)
+    result['attempts'] = attempts
+    return result
+
+async def resolve_location(agent, user_location, cache=None, progress_callback=None):
+    """将地点名称解析为"经度,纬度"，无法解析（或地图服务熔断）时返回原始输入"""
+    def report(message):
+        if progress_callback:
+            progress_callback(None, message)
+    
+    if is_coordinates(user_location):
+        report(f"检测到经纬度格式，直接使用坐标进行计算")
+        return user_location
+    
+    if LOCATION_BREAKER.is_open:
+        report(f"地图服务熔断中，跳过 '{user_location}' 的坐标解析")
+        return cache.geocode.get(user_location, user_location) if cache is not None else user_location
+    
+    report(f"检测到地点名称，正在获取 '{user_location}' 的经纬度坐标...")
+    if cache is not None:
+        user_coordinates = await cache.geocode.get_or_compute(
+            user_location,
+            lambda: get_location_coordinates(agent, user_location),
+            should_cache=lambda coords: coords != user_location
+        )
+    else:
+        user_coordinates = await get_location_coordinates(agent, user_location)
+    
+    if user_coordinates != user_location:
+        report(f"已获取坐标: {user_coordinates}")
+    else:
+        report(f"无法获取坐标，将使用原始地点名称进行计算")
+    return user_coordinates
+
+def offline_distance_results(location, warehouses):
+    """不查询地图服务的距离结果：已登记出发地点用预计算路线，其余用覆盖网格或直线距离估算"""
+    from utils.stations import get_station_registry
+    
+    stations = get_station_registry()
+    station = stations.find(location)
+    location_coords = station['coordinates'] if station is not None else location
+    results = []
+    for warehouse in warehouses:
+        result = stations.route_result(station, warehouse) if station is not None else None
+        if result is None:
+            result = {'warehouse_name': warehouse['name'], 'success': False, 'duration': '无法估算'}
+            estimate = estimate_warehouse_distance(location_coords, warehouse)
+            if estimate is not None:
+                result.update(estimate)
+                result['success'] = True
+        results.append(result)
+    return results
+
+def route_cache_key(actual_user_location, warehouse):
+    """路线缓存键：起点坐标 + 仓库坐标"""
+    return (actual_user_location, warehouse['location']['longitude'], warehouse['location']['latitude'])
+
+async def lookup_warehouse_distance(agent, actual_user_location, warehouse, cache=None, **kwargs):
+    """查询到单个仓库的距离，可选经过共享缓存（只缓存实测成功的结果，不缓存估算值）"""
+    if cache is None:
+        return await calculate_single_warehouse_distance(agent, actual_user_location, warehouse, **kwargs)
+    
+    result = await cache.routes.get_or_compute(
+        route_cache_key(actual_user_location, warehouse),
+        lambda: calculate_single_warehouse_distance(agent, actual_user_location, warehouse, **kwargs),
+        should_cache=lambda r: bool(r and r['success'] and not r.get('estimated'))
+    )
+    # 缓存中的结果在多次调度间共享，复制后再修改
+    return dict(result) if result else result
+
+async def calculate_distances_to_warehouses(agent, user_location, warehouses, progress_callback=None, cache=None,
+                                            stations=None, probe=None):
+    """计算用户位置到所有仓库的距离
+    
+    已登记的出发地点（消防站）直接查预计算的路线表，不解析坐标也不查询地图服务；
+    表中缺少的仓库再用登记的坐标实时查询。
+    
+    Args:
+        progress_callback: 可选的进度回调 callback(progress, message)，progress为0~1或None
+        cache: 可选的DistanceCache，在多次调度之间共享地理编码和路线结果（只缓存成功结果）
+        stations: 可选的StationRegistry，默认使用 data/stations.json
+        probe: 可选的地图服务探测函数，传给熔断器（见 calculate_single_warehouse_distance）
+    """
+    from utils.stations import get_station_registry
+    
+    def report(progress, message):
+        if progress_callback:
+            progress_callback(progress, message)
+    
+    report(0, f"正在计算从 '{user_location}' 到各仓库的距离...")
+    
+    registry = stations if stations is not None else get_station_registry()
+    station = registry.find(user_location)
+    if station is not None:
+        report(None, f"'{user_location}' 为已登记的出发地点，使用预计算的路线表")
+        actual_user_location = station['coordinates']
+    else:
+        # 检测用户输入是否为经纬度格式，地点名称先解析为坐标
+        actual_user_location = await resolve_location(agent, user_location, cache, progress_callback)
+    
+    distances = []
+    
+    for i, warehouse in enumerate(warehouses):
+        report((i + 1) / len(warehouses), f"正在计算第 {i+1}/{len(warehouses)} 个仓库: {warehouse['name']}")
+        
+        result = registry.route_result(station, warehouse) if station is not None else None
+        if result is None:
+            result = await lookup_warehouse_distance(agent, actual_user_location, warehouse, cache, probe=probe)
+        if result:
+            result['origin'] = user_location
+            distances.append(result)
+    
+    return distances
+
+def analyze_fire_impact(fire_details, personnel_count, fire_truck_count):
+    """分析火灾详情对作战计划的影响"""
+    impact_analysis = {
+        'risk_level': '中等',
+        'recommended_equipment': [],
+        'personnel_adjustment': personnel_count,
+        'fire_truck_adjustment': fire_truck_count,
+        'special_considerations': []
+    }
+    
+    fire_details_lower = fire_details.lower()
+    
+    # 分析火灾规模
+    if any(keyword in fire_details_lower for keyword in ['大火', '重大', '严重', '高层']):
+        impact_analysis['risk_level'] = '高危'
+        impact_analysis['personnel_adjustment'] = max(personnel_count, 30)
+        impact_analysis['fire_truck_adjustment'] = max(fire_truck_count, 5)
+        impact_analysis['recommended_equipment'].extend(['重型消防车', '云梯车', '大功率水泵'])
+        impact_analysis['special_considerations'].append('需要增派人员和重型设备')
+    elif any(keyword in fire_details_lower for keyword in ['小火', '初期', '轻微']):
+        impact_analysis['risk_level'] = '低危'
+        impact_analysis['personnel_adjustment'] = min(personnel_count, 15)
+        impact_analysis['fire_truck_adjustment'] = min(fire_truck_count, 2)
+    
+    # 分析人口密度
+    if any(keyword in fire_details_lower for keyword in ['人口密集', '医院', '学校', '商场']):
+        impact_analysis['special_considerations'].append('人员疏散优先，需要救护车待命')
+        impact_analysis['recommended_equipment'].extend(['救护车', '疏散设备'])
+    
+    # 分析火灾性质
+    if any(keyword in fire_details_lower for keyword in ['化学', '危险品', '油类']):
+        impact_analysis['risk_level'] = '高危'
+        impact_analysis['recommended_equipment'].extend(['化学防护服', '泡沫灭火剂'])
+        impact_analysis['special_considerations'].append('需要化学防护措施')
+    
+    return impact_analysis
+
+def build_warehouse_distances(incident_distances, departure_distances):
+    """整理距离计算结果为决策代理需要的格式"""
+    def entry(d):
+        return {'distance': d['distance'], 'time': d['duration'], 'estimated': d.get('estimated', False)}
+    
+    return {
+        'incident': {d['warehouse_name']: entry(d) for d in incident_distances if d['success']},
+        'departure': {d['warehouse_name']: entry(d) for d in departure_distances if d['success']}
+    }
+
+async def run_dispatch(pool,
+                       decision_llm,
+                       warehouse_data,
+                       incident_location: str,
+                       departure_location: str,
+                       personnel_count: int,
+                       vehicle_count: int,
+                       fire_description: str,
+                       cache=None,
+                       warehouse_texts=None,
+                       decision_semaphore=None,
+                       make_decision: bool = True):
+    """无界面的完整调度流程：双地点距离计算 + 作战决策
+    
+    Args:
+        pool: LocationAgentPool，事发地点和出发地点的距离计算各租用一个代理并发执行
+        decision_llm: 共享的决策LLM客户端
+        warehouse_data: read_warehouse_data_from_xlsx 返回的仓库数据
+        cache: 可选的DistanceCache，在多次调度之间共享
+        warehouse_texts: 可选的预先格式化结果 (仓库信息文本, 仓库间距离文本)
+        decision_semaphore: 可选的信号量，限制对决策LLM的并发调用
+        make_decision: 为False时只计算距离，不调用决策代理
+    
+    Returns:
+        dict: 包含火灾影响分析、距离结果、作战方案和各阶段耗时（秒）
+    """
+    from utils.stations import get_station_registry
+    
+    timings = {}
+    started = time.perf_counter()
+    warehouses = warehouse_data['warehouses']
+    if warehouse_texts is None:
+        warehouse_texts = format_warehouse_data_for_llm(warehouse_data)
+    warehouse_text, distance_text = warehouse_texts
+    
+    impact_analysis = analyze_fire_impact(fire_description, personnel_count, vehicle_count)
+    
+    async def distance_pass(location):
+        # 已登记出发地点的路线全部预计算时不占用代理
+        if get_station_registry().covers(location, warehouses):
+            return await calculate_distances_to_warehouses(None, location, warehouses, cache=cache)
+        async with pool.lease() as agent:
+            return await calculate_distances_to_warehouses(agent, location, warehouses, cache=cache,
+                                                           probe=pool.probe)
+    
+    stage_start = time.perf_counter()
+    incident_distances, departure_distances = await asyncio.gather(
+        distance_pass(incident_location),
+        distance_pass(departure_location)
+    )
+    timings['distances'] = time.perf_counter() - stage_start
+    
+    def decision_context():
+        return (build_route_options(warehouse_data, incident_distances, departure_distances, personnel_count),
+                build_reference_timeline(warehouses, incident_distances, departure_distances,
+                                         personnel_count, vehicle_count))
+    
+    async def decide():
+        stage_start = time.perf_counter()
+        # CPU密集的组合搜索和模拟在线程池中执行，不阻塞事件循环上的其他调度
+        route_options_text, timeline_text = await asyncio.get_running_loop().run_in_executor(None, decision_context)
+        decision_agent = DecisionAgent(llm=decision_llm)
+        plan = await decision_agent.make_decision(
+            incident_location=incident_location,
+            departure_location=departure_location,
+            personnel_count=personnel_count,
+            vehicle_count=vehicle_count,
+            fire_description=fire_description,
+            warehouse_distances=build_warehouse_distances(incident_distances, departure_distances),
+            warehouse_info=warehouse_text,
+            inter_warehouse_distances=distance_text,
+            route_options_text=route_options_text,
+            timeline_text=timeline_text
+        )
+        timings['decision'] = time.perf_counter() - stage_start
+        return plan
+    
+    battle_plan = None
+    if make_decision:
+        if decision_semaphore is not None:
+            async with decision_semaphore:
+                battle_plan = await decide()
+        else:
+            battle_plan = await decide()
+    timings['total'] = time.perf_counter() - started
+    
+    return {
+        'impact_analysis': impact_analysis,
+        'incident_distances': incident_distances,
+        'departure_distances': departure_distances,
+        'battle_plan': battle_plan,
+        'timings': timings
+    }
+
+# 时间预算模式下思考token与秒数的折算（保守估计的生成速度）
+THINKING_TOKENS_PER_SECOND = 40
+# 时间预算模式下思考token的上限（预算再宽裕也不超过）
+MAX_THINKING_TOKENS = 8192
+
+def parse_duration_minutes(duration):
+    """从"28分钟"、"1小时5分钟"等文本中取出分钟数，无法解析时返回None"""
+    seconds = parse_route_text(duration)[1]
+    return seconds / 60 if seconds is not None else None
+
+def parse_distance_km(distance):
+    """从"12.5公里"、"800米"等文本中取出公里数，无法解析时返回None"""
+    meters = parse_route_text(distance)[0]
+    return meters / 1000 if meters is not None else None
+
+def result_minutes(result):
+    """距离结果的行驶时间（分钟）：优先使用数值字段，旧结果（只有文本）才解析；失败的结果返回None"""
+    if not result or not result.get('success'):
+        return None
+    seconds = result.get('duration_s')
+    return seconds / 60 if seconds is not None else parse_duration_minutes(result.get('duration'))
+
+def result_km(result):
+    """距离结果的行驶距离（公里），规则同 result_minutes"""
+    if not result or not result.get('success'):
+        return None
+    meters = result.get('distance_m')
+    return meters / 1000 if meters is not None else parse_distance_km(result.get('distance'))
+
+def nearest_warehouse(distances):
+    """行驶距离最短的成功结果，没有可用结果时返回None"""
+    ranked = [(km, index) for index, km in enumerate(map(result_km, distances)) if km is not None]
+    return distances[min(ranked)[1]] if ranked else None
+
+def rank_warehouses_by_promise(warehouses, incident_coords, departure_coords, estimator=None):
+    """按"出发地→仓库→事发地"的估算总时间对仓库排序，返回仓库下标列表
+
+    起点坐标未知的一段按0计，两段都未知时保持原顺序。
+    """
+    estimator = estimator or DEFAULT_TRAVEL_ESTIMATOR
+    origins = [coords for coords in (departure_coords, incident_coords) if coords is not None]
+    if not origins:
+        return list(range(len(warehouses)))
+
+    def promise(index):
+        location = warehouses[index]['location']
+        lng, lat = float(location['longitude']), float(location['latitude'])
+        return sum(estimator.estimate(origin[0], origin[1], lng, lat)[1] for origin in origins)
+
+    return sorted(range(len(warehouses)), key=promise)
+
+def coverage_candidate_indices(coords, warehouses):
+    """坐标所在覆盖网格中按行驶时间排序的候选仓库下标，没有网格或不在服务区域时返回空列表"""
+    from utils.coverage import get_coverage_grid
+    
+    grid = get_coverage_grid()
+    if grid is None or coords is None:
+        return []
+    return [candidate['index'] for candidate in grid.candidates(coords[0], coords[1], warehouses)]
+
+def build_fallback_plan(incident_location, departure_location, personnel_count, vehicle_count,
+                        warehouses, incident_distances, departure_distances, reason, top_k=3,
+                        route_options_text=None, timeline_text=None):
+    """决策代理未能在时间预算内返回时，按距离结果直接生成的简要方案
+    
+    仓库按 出发→仓库→现场 到场时间的p90排序（蒙特卡洛模拟行驶时间波动，估算值的波动更大）。
+    出发地点未能解析（出发路段全部未知）时只按 仓库→现场 时间排序，与 rank_warehouses_by_promise
+    一样把未知的一段按0计，并标记为估算。
+    """
+    import numpy as np
+    from utils.records import WarehouseTable
+    from utils.robustness import RouteLegs, evaluate_routes
+    
+    gear_totals = WarehouseTable.from_warehouse_data(warehouses).protective_gear_totals()
+    legs = RouteLegs.from_distance_results(incident_distances, departure_distances)
+    routes = [(index,) for index in range(len(warehouses)) if math.isfinite(legs.nominal((index,)))]
+    incident_only = not routes
+    if incident_only:
+        legs = RouteLegs(np.zeros(len(legs)), legs.incident, departure_estimated=np.ones(len(legs), dtype=bool),
+                         incident_estimated=legs.incident_estimated, names=legs.names)
+        routes = [(index,) for index in range(len(warehouses)) if math.isfinite(legs.incident[index])]
+    candidates = []
+    for result in evaluate_routes(legs, routes, samples=2000, workers=1):
+        index = result['route'][0]
+        estimated = (incident_only or incident_distances[index].get('estimated')
+                     or departure_distances[index].get('estimated'))
+        candidates.append((result['nominal_minutes'], float(legs.departure[index]), float(legs.incident[index]),
+                           int(gear_totals[index]), estimated, warehouses[index]['name'], result['p90_minutes']))
+    lines = [
+        "# 快速调度方案（时间预算内自动生成）",
+        "",
+        f"> {reason}，以下方案按距离结果直接排序生成，请指挥员复核。",
+        "",
+        f"- 出发地点：{departure_location}",
+        f"- 事发地点：{incident_location}",
+        f"- 作战力量：{personnel_count}人，{vehicle_count}辆车",
+        ""
+    ]
+    if incident_only:
+        lines.append("## 推荐取物资仓库（出发地点未能解析，仅按 仓库→现场 时间的p90排序，不含出发→仓库路段）")
+    else:
+        lines.append("## 推荐取物资仓库（按 出发→仓库→现场 到场时间的p90排序，含装载时间）")
+    if not candidates:
+        lines.append("- 暂无可用的距离信息，建议直接前往现场并呼叫总部调配物资")
+    for rank, (total, dep_min, inc_min, gear, estimated, name, p90) in enumerate(candidates[:top_k], 1):
+        if incident_only:
+            lines.append(
+                f"{rank}. **{name}**：出发→仓库 时间未知，仓库→现场 {inc_min:.0f}分钟（估算），"
+                f"90%情况下仓库装载及行驶{p90:.0f}分钟内完成，防护装备{gear}套"
+            )
+            continue
+        note = "（含估算值）" if estimated else ""
+        lines.append(
+            f"{rank}. **{name}**：出发→仓库 {dep_min:.0f}分钟 + 仓库→现场 {inc_min:.0f}分钟 = "
+            f"总计约{total:.0f}分钟{note}，90%情况下{p90:.0f}分钟内到场，防护装备{gear}套"
+        )
+    if route_options_text:
+        lines += ["", "## 多仓库取物资组合（按距离精确计算，含装载时间）", route_options_text]
+    if timeline_text:
+        lines += ["", "## 参考时间节点（按名义行驶时间和装载时间模拟）", timeline_text]
+    return "\n".join(lines)
+
+def build_route_options(warehouse_data, incident_distances, departure_distances, personnel_count,
+                        max_stops=3, top=3, stop_minutes=5.0):
+    """按距离结果计算的最佳取物资仓库组合（优先满足全体队员的呼吸器和防护服），返回供决策参考的文本
+
+    组合及访问顺序由 evaluate_combinations 对全部不超过max_stops个仓库的组合精确计算，
+    仓库间时间使用仓库间距离表（缺失的按直线距离估算）。没有可达仓库时返回None。
+    """
+    from utils.combinations import evaluate_combinations, requirement_stock
+    from utils.rebalance import warehouse_travel_matrix
+    from utils.records import WarehouseTable
+    from utils.robustness import RouteLegs
+    
+    table = WarehouseTable.from_warehouse_data(warehouse_data)
+    between, _ = warehouse_travel_matrix(table, warehouse_data)
+    legs = RouteLegs.from_distance_results(incident_distances, departure_distances, between)
+    stock, need = requirement_stock(table, {'呼吸器': personnel_count, '防护服': personnel_count})
+    results, _ = evaluate_combinations(legs, max_stops=max_stops, stock=stock, need=need,
+                                       stop_minutes=stop_minutes, top=top)
+    if not results:
+        return None
+    
+    lines = []
+    for rank, result in enumerate(results, 1):
+        coverage = (f"可满足全部{personnel_count}名队员的呼吸器和防护服" if result['shortfall'] == 0
+                    else f"呼吸器和防护服仍缺{result['shortfall']:.0f}套")
+        lines.append(f"{rank}. 出发 → {' → '.join(result['warehouses'])} → 现场：约{result['minutes']:.0f}分钟"
+                     f"（含每个仓库装载约{stop_minutes:.0f}分钟），{coverage}")
+    return "\n".join(lines)
+
+def build_reference_timeline(warehouses, incident_distances, departure_distances, personnel_count, vehicle_count,
+                             pool_size=3):
+    """按距离结果模拟的参考作战时间线（T+X分钟文本），没有可达仓库时返回None
+
+    队员平均分到各车，每辆车前往一个仓库装载本车队员的防护装备（受库存限制）后赶赴现场。
+    车辆逐辆分配到名义到场时间最短的pool_size个仓库之一：对每个候选仓库完整模拟一遍，
+    取全部到场最早（其次排队最少）的仓库，装卸位排队和装载用时由离散事件模拟精确计算。
+    """
+    from utils.records import PROTECTIVE_GEAR_KEYWORDS
+    from utils.robustness import RouteLegs, candidate_routes
+    from utils.timeline import FetchSimulator, Truck, format_timeline
+    
+    legs = RouteLegs.from_distance_results(incident_distances, departure_distances)
+    pool = [route[0] for route in candidate_routes(legs, max_stops=1, pool_size=pool_size)]
+    if not pool or vehicle_count <= 0:
+        return None
+    
+    # 各候选仓库剩余的防护装备：{仓库下标: [[类别, 数量], ...]}
+    gear = {
+        index: [[resource.get('category', ''), int(resource.get('quantity') or 0)]
+                for resource in warehouses[index].get('resources', [])
+                if any(keyword in resource.get('name', '') for keyword in PROTECTIVE_GEAR_KEYWORDS)]
+        for index in pool
+    }
+    
+    def take(index, crew):
+        """从仓库取出每种防护装备各crew件，按类别汇总"""
+        items = {}
+        for entry in gear[index]:
+            quantity = min(crew, entry[1])
+            if quantity > 0:
+                entry[1] -= quantity
+                items[entry[0]] = items.get(entry[0], 0) + quantity
+        return items
+    
+    def available(index, crew):
+        return {category: min(crew, quantity) for category, quantity in gear[index] if quantity > 0}
+    
+    base, extra = divmod(max(0, personnel_count), vehicle_count)
+    trucks = [Truck(f"{number + 1}号车", crew=base + (1 if number < extra else 0)) for number in range(vehicle_count)]
+    simulator = FetchSimulator(legs)
+    allocation = []
+    for truck in trucks:
+        stocked = [index for index in pool if available(index, truck.crew)] or pool[:1]
+        best = None
+        for index in stocked:
+            result = simulator.run(trucks[:len(allocation) + 1],
+                                   allocation + [[(index, available(index, truck.crew))]], record=False)
+            score = (result.makespan, result.wait_minutes)
+            if best is None or score < best[0]:
+                best = (score, index)
+        allocation.append([(best[1], take(best[1], truck.crew))])
+    
+    return format_timeline(simulator.run(trucks, allocation), trucks, legs.names)
+
+async def run_anytime_dispatch(pool,
+                               decision_llm,
+                               warehouse_data,
+                               incident_location: str,
+                               departure_location: str,
+                               personnel_count: int,
+                               vehicle_count: int,
+                               fire_description: str,
+                               budget_seconds: float = 20.0,
+                               decision_share: float = 0.5,
+                               min_decision_seconds: float = 4.0,
+                               max_parallel_routes: int = 4,
+                               max_candidates: int = None,
+                               cache=None,
+                               warehouse_texts=None,
+                               estimator=None,
+                               decision_semaphore=None):
+    """带总时间预算的"随时可用"调度流程
+
+    - 先按估算总时间对仓库排序，优先查询最有希望的仓库
+    - 距离阶段最多使用 (1 - decision_share) 的预算，到期取消未完成的查询，
+      未完成的仓库使用缓存或直线距离估算
+    - 决策阶段按剩余时间缩减思考token，超时或剩余时间不足时返回按距离排序的快速方案
+    - 设置 max_candidates 时只对两个地点各自最近的若干仓库查询路线（空间索引筛选），其余直接估算
+    - 提供 decision_semaphore 时调用决策模型前先获取（限制并发），排队时间计入预算
+
+    Returns:
+        dict: 与run_dispatch相同的字段，另含 skipped（被跳过/降级的查询）和 deadline 信息
+
+    Raises:
+        ValueError: budget_seconds 不是大于0的有限数
+    """
+    if not (math.isfinite(budget_seconds) and budget_seconds > 0):
+        raise ValueError(f"budget_seconds 必须为大于0的有限数: {budget_seconds!r}")
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + budget_seconds
+    distance_deadline = started + budget_seconds * (1 - decision_share)
+    timings = {}
+    skipped = []
+    warehouses = warehouse_data['warehouses']
+    if warehouse_texts is None:
+        warehouse_texts = format_warehouse_data_for_llm(warehouse_data)
+    warehouse_text, distance_text = warehouse_texts
+    impact_analysis = analyze_fire_impact(fire_description, personnel_count, vehicle_count)
+
+    def remaining(until):
+        return max(0.0, until - loop.time())
+
+    from utils.stations import get_station_registry
+    stations = get_station_registry()
+
+    # 1. 解析地点坐标（超时则保留原始输入；已登记的出发地点直接使用登记的坐标）
+    async def resolve(location):
+        if is_coordinates(location):
+            return location
+        station = stations.find(location)
+        if station is not None:
+            return station['coordinates']
+        if cache is not None and location in cache.geocode:
+            return cache.geocode.get(location)
+
+        async def lease_and_resolve():
+            async with pool.lease() as agent:
+                return await resolve_location(agent, location, cache)
+
+        try:
+            return await asyncio.wait_for(lease_and_resolve(), remaining(distance_deadline))
+        except (asyncio.TimeoutError, ConnectionError):
+            skipped.append({'stage': 'geocode', 'location': location, 'reason': '超出时间预算或地图服务不可用'})
+            return location
+
+    stage_start = loop.time()
+    incident_actual, departure_actual = await asyncio.gather(
+        resolve(incident_location), resolve(departure_location)
+    )
+    timings['geocode'] = loop.time() - stage_start
+
+    # 2. 按希望程度排序后并发查询，到期取消
+    incident_coords, departure_coords = parse_coordinates(incident_actual), parse_coordinates(departure_actual)
+    order = rank_warehouses_by_promise(warehouses, incident_coords, departure_coords, estimator)
+    # 事发地点所在覆盖网格的最快仓库优先查询（网格为离线计算的候选排名）
+    grid_candidates = coverage_candidate_indices(incident_coords, warehouses)
+    if grid_candidates:
+        order = grid_candidates + [index for index in order if index not in set(grid_candidates)]
+    if max_candidates is not None:
+        from utils.spatial import select_candidate_indices
+        candidates = set(select_candidate_indices(warehouses, [incident_coords, departure_coords], k=max_candidates))
+        candidates.update(grid_candidates)
+        order = [index for index in order if index in candidates]
+    queried = set(order)
+    policy = LOCATION_RETRY_POLICY.with_options(max_attempts=2)
+
+    async def distance_pass(location, actual_location, results):
+        semaphore = asyncio.Semaphore(max_parallel_routes)
+        station = stations.find(location)
+
+        async def lookup(agent, index):
+            async with semaphore:
+                results[index] = await lookup_warehouse_distance(
+                    agent, actual_location, warehouses[index], cache,
+                    retry_policy=policy, estimator=estimator, probe=pool.probe
+                )
+
+        # 已预计算的路线（不限于候选仓库）和命中缓存的仓库不占用查询
+        if station is not None:
+            for index, warehouse in enumerate(warehouses):
+                precomputed = stations.route_result(station, warehouse)
+                if precomputed is not None:
+                    results[index] = precomputed
+        pending = []
+        for index in order:
+            if index in results:
+                continue
+            key = route_cache_key(actual_location, warehouses[index])
+            if cache is not None and key in cache.routes:
+                results[index] = dict(cache.routes.get(key))
+            else:
+                pending.append(index)
+        if not pending:
+            return
+        async with pool.lease() as agent:
+            await asyncio.gather(*(lookup(agent, index) for index in pending))
+
+    async def bounded_pass(stage, location, actual_location):
+        results = {}
+        try:
+            await asyncio.wait_for(distance_pass(location, actual_location, results), remaining(distance_deadline))
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+
+        distances = []
+        for index, warehouse in enumerate(warehouses):
+            result = results.get(index)
+            if result is None:
+                result = {
+                    'warehouse_name': warehouse['name'],
+                    'warehouse_address': warehouse['location']['address'],
+                    'warehouse_coordinates': f"{warehouse['location']['longitude']},{warehouse['location']['latitude']}",
+                    'attempts': 0
+                }
+                estimate = estimate_warehouse_distance(actual_location, warehouse, estimator)
+                if estimate is not None:
+                    result.update(estimate)
+                    result['success'] = True
+                else:
+                    result.update({'distance': '超出时间预算', 'duration': '超出时间预算', 'success': False})
+                skipped.append({
+                    'stage': stage,
+                    'warehouse_name': warehouse['name'],
+                    'reason': '超出时间预算' if index in queried else '不在候选范围',
+                    'fallback': ('无' if estimate is None
+                                 else '覆盖网格实测值' if estimate.get('coverage_grid') else '直线距离估算')
+                })
+            result['origin'] = location
+            distances.append(result)
+        return distances
+
+    stage_start = loop.time()
+    incident_distances, departure_distances = await asyncio.gather(
+        bounded_pass('incident', incident_location, incident_actual),
+        bounded_pass('departure', departure_location, departure_actual)
+    )
+    timings['distances'] = loop.time() - stage_start
+
+    # 3. 在剩余时间内生成作战方案
+    stage_start = loop.time()
+    # 参考时间线和取物资组合是CPU密集计算（离散事件模拟、组合搜索、蒙特卡洛评估），放到线程池中执行，
+    # 不阻塞同一事件循环上的其他调度；用时不超过决策阶段最短时间之外的剩余预算，超时则不带这两部分参考
+    def decision_context():
+        return (build_reference_timeline(warehouses, incident_distances, departure_distances,
+                                         personnel_count, vehicle_count),
+                build_route_options(warehouse_data, incident_distances, departure_distances, personnel_count))
+
+    timeline_text = route_options_text = None
+    context_seconds = remaining(deadline) - min_decision_seconds - 0.5
+    try:
+        if context_seconds <= 0:
+            raise asyncio.TimeoutError
+        timeline_text, route_options_text = await asyncio.wait_for(
+            loop.run_in_executor(None, decision_context), context_seconds
+        )
+    except asyncio.TimeoutError:
+        skipped.append({'stage': 'decision_context', 'reason': '超出时间预算', 'fallback': '不含参考时间线和取物资组合'})
+    timings['decision_context'] = loop.time() - stage_start
+    battle_plan = None
+    fallback_reason = None
+    acquired = False
+    try:
+        if decision_semaphore is not None and remaining(deadline) - 0.5 >= min_decision_seconds:
+            # 排队等待决策模型的时间同样计入预算
+            try:
+                await asyncio.wait_for(decision_semaphore.acquire(),
+                                       remaining(deadline) - 0.5 - min_decision_seconds)
+                acquired = True
+            except asyncio.TimeoutError:
+                fallback_reason = "等待决策模型超出时间预算"
+        decision_seconds = remaining(deadline) - 0.5
+        if fallback_reason is None and decision_seconds < min_decision_seconds:
+            fallback_reason = "剩余时间不足以调用决策模型"
+        if fallback_reason is None:
+            thinking_budget = min(MAX_THINKING_TOKENS, max(256, int(decision_seconds * THINKING_TOKENS_PER_SECOND * 0.5)))
+            decision_agent = DecisionAgent(llm=decision_llm)
+            try:
+                battle_plan = await decision_agent.make_decision(
+                    incident_location=incident_location,
+                    departure_location=departure_location,
+                    personnel_count=personnel_count,
+                    vehicle_count=vehicle_count,
+                    fire_description=fire_description,
+                    warehouse_distances=build_warehouse_distances(incident_distances, departure_distances),
+                    warehouse_info=warehouse_text,
+                    inter_warehouse_distances=distance_text,
+                    route_options_text=route_options_text,
+                    timeline_text=timeline_text,
+                    thinking_budget=thinking_budget,
+                    retry_policy=DECISION_RETRY_POLICY.with_options(max_attempts=1,
+                                                                    attempt_timeout=round(decision_seconds, 1)),
+                    raise_on_error=True
+                )
+            except Exception as e:
+                fallback_reason = f"决策模型未能在时间预算内完成（{e}）"
+    finally:
+        if acquired:
+            decision_semaphore.release()
+
+    if battle_plan is None:
+        skipped.append({'stage': 'decision', 'reason': fallback_reason, 'fallback': '按距离排序的快速方案'})
+        battle_plan = build_fallback_plan(
+            incident_location, departure_location, personnel_count, vehicle_count,
+            warehouses, incident_distances, departure_distances, fallback_reason,
+            route_options_text=route_options_text, timeline_text=timeline_text
+        )
+    timings['decision'] = loop.time() - stage_start
+    timings['total'] = loop.time() - started
+
+    return {
+        'impact_analysis': impact_analysis,
+        'incident_distances': incident_distances,
+        'departure_distances': departure_distances,
+        'battle_plan': battle_plan,
+        'timings': timings,
+        'skipped': skipped,
+        'deadline': {
+            'budget_seconds': budget_seconds,
+            'elapsed_seconds': round(timings['total'], 3),
+            'met': timings['total'] <= budget_seconds
+        }
+    }
@@ -0,0 +1,97 @@
+import math
+import re
+import statistics
+from typing import Iterable, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+
+_COORD_PATTERN = re.compile(r'^\s*(-?\d+\.?\d*)\s*,\s*(-?\d+\.?\d*)\s*$')
+
+def parse_coordinates(location_str) -> Optional[Tuple[float, float]]:
+    """解析"经度,纬度"格式的字符串，无法解析时返回None"""
+    if not isinstance(location_str, str):
+        return None
+    match = _COORD_PATTERN.match(location_str)
+    if not match:
+        return None
+    return float(match.group(1)), float(match.group(2))
+
+def haversine_km(lng1: float, lat1: float, lng2: float, lat2: float) -> float:
+    """两点间的大圆距离（公里）"""
+    lng1, lat1, lng2, lat2 = map(math.radians, (lng1, lat1, lng2, lat2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+class TravelTimeEstimator:
+    """基于直线距离的行驶距离/时间估算：道路距离 = 直线距离 × 绕行系数，时间 = 道路距离 ÷ 平均车速"""
+
+    def __init__(self, detour_factor: float = 1.4, speed_kmh: float = 30.0):
+        self.detour_factor = detour_factor
+        self.speed_kmh = speed_kmh
+        self.calibration_samples = 0
+
+    def estimate(self, lng1: float, lat1: float, lng2: float, lat2: float) -> Tuple[float, float]:
+        """估算行驶距离（公里）和时间（分钟）"""
+        road_km = haversine_km(lng1, lat1, lng2, lat2) * self.detour_factor
+        return road_km, road_km / self.speed_kmh * 60
+
+    def calibrate(self, samples: Iterable[Tuple[float, float, float]], min_samples: int = 3) -> bool:
+        """用实测路线标定绕行系数和平均车速
+
+        Args:
+            samples: (直线距离公里, 实测道路距离公里, 实测时间分钟) 序列
+            min_samples: 有效样本不足时不更新参数
+
+        Returns:
+            bool: 是否完成标定
+        """
+        ratios = []
+        total_km = 0.0
+        total_hours = 0.0
+        for straight_km, road_km, minutes in samples:
+            if not straight_km or not road_km or not minutes or straight_km <= 0.1:
+                continue
+            ratios.append(road_km / straight_km)
+            total_km += road_km
+            total_hours += minutes / 60
+
+        if len(ratios) < min_samples or total_hours <= 0:
+            return False
+
+        # 绕行系数取中位数，避免个别异常路线影响
+        self.detour_factor = statistics.median(ratios)
+        self.speed_kmh = total_km / total_hours
+        self.calibration_samples = len(ratios)
+        return True
+
+    def calibrate_from_warehouse_data(self, warehouse_data) -> bool:
+        """用仓库间距离表（read_warehouse_data_from_xlsx的结果）中的成功记录进行标定"""
+        if not warehouse_data:
+            return False
+        coordinates = {
+            warehouse['id']: (float(warehouse['location']['longitude']), float(warehouse['location']['latitude']))
+            for warehouse in warehouse_data.get('warehouses', [])
+        }
+
+        samples = []
+        for distance in warehouse_data.get('warehouse_distances', []):
+            if distance.get('status') != '成功':
+                continue
+            origin = coordinates.get(distance['from_warehouse_id'])
+            destination = coordinates.get(distance['to_warehouse_id'])
+            if origin is None or destination is None:
+                continue
+            try:
+                road_km = float(distance['distance_km'])
+                minutes = float(distance['duration_min'])
+            except (TypeError, ValueError):
+                continue
+            if math.isnan(road_km) or math.isnan(minutes):
+                continue
+            samples.append((haversine_km(*origin, *destination), road_km, minutes))
+
+        return self.calibrate(samples)
+
+# 进程级默认估算器（可通过 calibrate_from_warehouse_data 标定）
+DEFAULT_TRAVEL_ESTIMATOR = TravelTimeEstimator()
@@ -0,0 +1,129 @@
+import json
+from typing import Any, Iterator, Optional, Tuple
+
+_WHITESPACE = ' \t\n\r'
+_NUMBER_CHARS = '0123456789+-.eE'
+
+class JSONStreamError(ValueError):
+    """流式解析时遇到无效或不完整的JSON"""
+
+class _Reader:
+    """按块读取文本并维护解析位置，已消费的部分及时丢弃，内存占用与文件大小无关"""
+
+    def __init__(self, f, chunk_size: int = 1 << 16):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size: Optional[int] = None) -> bool:
+        """读入更多数据，到达文件末尾时返回False"""
+        if self.eof:
+            return False
+        chunk = self.f.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # 丢弃已消费的部分
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """跳过空白并返回下一个字符（不消费），文件结束返回空字符串"""
+        while True:
+            buf, pos = self.buf, self.pos
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            self.pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, chars: str) -> str:
+        """消费下一个非空白字符，必须是chars中的一个"""
+        char = self.peek()
+        if not char or char not in chars:
+            raise JSONStreamError(f"期望 {' 或 '.join(repr(c) for c in chars)}，实际为 {char!r}（位置 {self.pos}）")
+        self.pos += 1
+        return char
+
+    def value(self) -> Any:
+        """解析一个完整的JSON值；数据不完整时继续读入，读入量逐次翻倍避免大值反复重试"""
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if not self._fill(size):
+                    raise JSONStreamError(f"无效的JSON: {e}") from e
+                size *= 2
+                continue
+            # 数字可能在块边界被截断（如 "2" + ".5"），其后没有确定的分隔符时多读一块再解析
+            if isinstance(obj, (int, float)) and not isinstance(obj, bool):
+                if (end >= len(self.buf) or self.buf[end] in _NUMBER_CHARS) and self._fill(size):
+                    size *= 2
+                    continue
+            self.pos = end
+            return obj
+
+def iter_top_level(f, stream_key: str, chunk_size: int = 1 << 16) -> Iterator[Tuple[str, str, Any]]:
+    """流式解析顶层JSON对象
+
+    stream_key 对应的数组逐个元素产出 ('item', stream_key, 元素)，
+    其他顶层字段整体解析后产出 ('field', 键, 值)。任意时刻只在内存中保留一个元素。
+    """
+    reader = _Reader(f, chunk_size)
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.pos += 1
+        return
+
+    while True:
+        key = reader.value()
+        if not isinstance(key, str):
+            raise JSONStreamError(f"对象的键必须为字符串，实际为 {key!r}")
+        reader.expect(':')
+
+        if key == stream_key and reader.peek() == '[':
+            reader.pos += 1
+            if reader.peek() == ']':
+                reader.pos += 1
+            else:
+                while True:
+                    yield 'item', key, reader.value()
+                    if reader.expect(',]') == ']':
+                        break
+        else:
+            yield 'field', key, reader.value()
+
+        if reader.expect(',}') == '}':
+            break
+
+class StreamingResourceJson:
+    """按仓库逐个读取 resource.json，峰值内存与仓库数量无关
+
+    warehouses() 只能顺序遍历；遍历结束后 fields 中保存了其余顶层字段（如 metadata），
+    因为 metadata 在文件中可能位于 warehouses 之后。
+    """
+
+    def __init__(self, json_file_path, chunk_size: int = 1 << 16):
+        self.json_file_path = json_file_path
+        self.chunk_size = chunk_size
+        self.fields = {}
+
+    def warehouses(self) -> Iterator[dict]:
+        with open(self.json_file_path, 'r', encoding='utf-8') as f:
+            for kind, key, value in iter_top_level(f, 'warehouses', self.chunk_size):
+                if kind == 'item':
+                    yield value
+                else:
+                    self.fields[key] = value
+
+    @property
+    def metadata(self) -> Optional[dict]:
+        return self.fields.get('metadata')
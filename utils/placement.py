@@ -0,0 +1,353 @@
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.geo import DEFAULT_TRAVEL_ESTIMATOR, EARTH_RADIUS_KM
+from utils.spatial import _to_unit_vectors
+
+def travel_minutes(origin_lngs, origin_lats, dest_lngs, dest_lats, estimator=None) -> np.ndarray:
+    """起点×终点的估算行驶时间矩阵（分钟，float32），与 TravelTimeEstimator.estimate 的结果一致"""
+    estimator = estimator or DEFAULT_TRAVEL_ESTIMATOR
+    origins = _to_unit_vectors(origin_lngs, origin_lats)
+    destinations = _to_unit_vectors(dest_lngs, dest_lats)
+    # 单位向量点积 → 弦长 → 大圆距离
+    chord = np.sqrt(np.clip(2.0 - 2.0 * (origins @ destinations.T), 0.0, 4.0))
+    km = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2, 1.0))
+    return (km * (estimator.detour_factor / estimator.speed_kmh * 60)).astype(np.float32)
+
+class TravelTimeMatrix:
+    """需求点×站点的行驶时间矩阵，按行分块访问
+
+    可以直接给出矩阵（如 np.load(..., mmap_mode='r') 得到的实测矩阵），
+    也可以只给坐标，按估算器计算：总大小不超过max_cached_bytes时一次算好常驻内存，
+    否则每次遍历时按块即时计算，内存占用只与块大小有关。
+    """
+
+    def __init__(self, demand_points, site_points, array=None, estimator=None,
+                 block_rows: int = 8192, max_cached_bytes: int = 512 * 1024 * 1024):
+        self.demand_points = np.asarray(demand_points, dtype=np.float64).reshape(-1, 2)
+        self.site_points = np.asarray(site_points, dtype=np.float64).reshape(-1, 2)
+        self.estimator = estimator
+        self.block_rows = block_rows
+        self.max_cached_bytes = max_cached_bytes
+        self.shape = (len(self.demand_points), len(self.site_points))
+        if array is not None and tuple(array.shape) != self.shape:
+            raise ValueError(f"行驶时间矩阵的形状 {tuple(array.shape)} 与 需求点×站点 {self.shape} 不一致")
+        if array is None and self.shape[0] * self.shape[1] * 4 <= max_cached_bytes:
+            array = self._compute(0, self.shape[0])
+        self.array = array
+
+    def _compute(self, start: int, end: int) -> np.ndarray:
+        demand = self.demand_points[start:end]
+        return travel_minutes(demand[:, 0], demand[:, 1], self.site_points[:, 0], self.site_points[:, 1],
+                              self.estimator)
+
+    def blocks(self, columns=None) -> Iterator[Tuple[slice, np.ndarray]]:
+        """按行分块遍历，产出 (行切片, 行驶时间块)；columns 可只取部分站点列"""
+        for start in range(0, self.shape[0], self.block_rows):
+            end = min(start + self.block_rows, self.shape[0])
+            if self.array is not None:
+                block = np.asarray(self.array[start:end], dtype=np.float32)
+                if columns is not None:
+                    block = block[:, columns]
+            elif columns is not None:
+                demand = self.demand_points[start:end]
+                sites = self.site_points[columns]
+                block = travel_minutes(demand[:, 0], demand[:, 1], sites[:, 0], sites[:, 1], self.estimator)
+            else:
+                block = self._compute(start, end)
+            yield slice(start, end), block
+
+    def subset(self, columns) -> "TravelTimeMatrix":
+        """只含部分站点列的矩阵（大小允许时常驻内存，求解时反复遍历候选列不必重复计算）"""
+        columns = np.asarray(columns, dtype=np.int64)
+        array = None
+        if self.shape[0] * len(columns) * 4 <= self.max_cached_bytes:
+            array = np.empty((self.shape[0], len(columns)), dtype=np.float32)
+            for rows, block in self.blocks(columns):
+                array[rows] = block
+        return TravelTimeMatrix(self.demand_points, self.site_points[columns], array=array,
+                                estimator=self.estimator, block_rows=self.block_rows,
+                                max_cached_bytes=self.max_cached_bytes)
+
+    def nearest_times(self, columns) -> np.ndarray:
+        """每个需求点到指定站点中最近一个的行驶时间，没有站点时为inf"""
+        columns = np.asarray(columns, dtype=np.int64)
+        nearest = np.full(self.shape[0], np.inf, dtype=np.float32)
+        if not len(columns):
+            return nearest
+        for rows, block in self.blocks(columns):
+            nearest[rows] = block.min(axis=1)
+        return nearest
+
+def grid_demand_points(points, cell_km: float = 1.0, margin_km: float = 5.0) -> np.ndarray:
+    """在站点分布范围（外扩margin_km）内按cell_km等间距生成需求点（网格中心）"""
+    from utils.coverage import KM_PER_DEGREE_LAT
+
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    mid_lat = float(points[:, 1].mean())
+    lat_step = cell_km / KM_PER_DEGREE_LAT
+    lng_step = cell_km / (KM_PER_DEGREE_LAT * np.cos(np.radians(mid_lat)))
+    lng_margin = margin_km / cell_km * lng_step
+    lat_margin = margin_km / cell_km * lat_step
+    lngs = np.arange(points[:, 0].min() - lng_margin, points[:, 0].max() + lng_margin, lng_step) + lng_step / 2
+    lats = np.arange(points[:, 1].min() - lat_margin, points[:, 1].max() + lat_margin, lat_step) + lat_step / 2
+    grid_lng, grid_lat = np.meshgrid(lngs, lats)
+    return np.column_stack((grid_lng.ravel(), grid_lat.ravel()))
+
+def load_demand_points(path):
+    """读取需求点文件，返回 (坐标数组, 权重数组)
+
+    支持：
+        .csv   列 经度,纬度[,权重]（可有标题行）
+        .jsonl 每行含 longitude/latitude（或 "经度,纬度" 格式的 location / incident_location）及可选的 weight
+        .npy   (N, 2) 或 (N, 3) 数组
+    """
+    import json
+
+    from utils.geo import parse_coordinates
+
+    if str(path).endswith('.npy'):
+        data = np.load(path)
+        weights = data[:, 2] if data.shape[1] > 2 else np.ones(len(data))
+        return data[:, :2].astype(np.float64), weights.astype(np.float32)
+
+    points, weights = [], []
+    with open(path, 'r', encoding='utf-8') as f:
+        if str(path).endswith('.jsonl'):
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if 'longitude' in record and 'latitude' in record:
+                    coords = (float(record['longitude']), float(record['latitude']))
+                else:
+                    coords = parse_coordinates(record.get('location') or record.get('incident_location'))
+                if coords is None:
+                    continue
+                points.append(coords)
+                weights.append(float(record.get('weight', 1.0)))
+        else:
+            for line in f:
+                fields = [field.strip() for field in line.split(',')]
+                try:
+                    coords = (float(fields[0]), float(fields[1]))
+                except (ValueError, IndexError):
+                    continue  # 标题行或空行
+                points.append(coords)
+                weights.append(float(fields[2]) if len(fields) > 2 and fields[2] else 1.0)
+    return np.array(points, dtype=np.float64).reshape(-1, 2), np.array(weights, dtype=np.float32)
+
+def weighted_quantile(values: np.ndarray, weights: np.ndarray, quantile: float) -> float:
+    """加权分位数"""
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    if cumulative[-1] <= 0:
+        return float('nan')
+    position = np.searchsorted(cumulative, quantile * cumulative[-1])
+    return float(values[order[min(position, len(order) - 1)]])
+
+def coverage_statistics(times: np.ndarray, weights: np.ndarray, threshold: float) -> dict:
+    """响应时间统计：加权平均/中位数/p90/最大值，以及threshold分钟内覆盖的需求占比"""
+    reachable = np.isfinite(times)
+    total_weight = float(weights.sum())
+    if not reachable.any() or total_weight <= 0:
+        return {'mean_minutes': None, 'median_minutes': None, 'p90_minutes': None, 'max_minutes': None,
+                'covered_share': 0.0, 'uncovered_points': int(len(times))}
+    times_r, weights_r = times[reachable], weights[reachable]
+    covered = times <= threshold
+    return {
+        'mean_minutes': round(float(np.average(times_r, weights=weights_r)), 2),
+        'median_minutes': round(weighted_quantile(times_r, weights_r, 0.5), 2),
+        'p90_minutes': round(weighted_quantile(times_r, weights_r, 0.9), 2),
+        'max_minutes': round(float(times_r.max()), 2),
+        'covered_share': round(float(weights[covered].sum() / total_weight), 4),
+        'uncovered_points': int((~covered).sum())
+    }
+
+def category_coverage(matrix: TravelTimeMatrix, weights: np.ndarray, stock: np.ndarray,
+                      categories: Sequence[str], threshold: float) -> Dict[str, dict]:
+    """按物资类别统计响应时间：每个需求点到最近的、有该类物资库存的仓库
+
+    Args:
+        stock: (仓库数, 类别数) 库存数量，仓库对应矩阵的前若干列
+    """
+    statistics = {}
+    for column, category in enumerate(categories):
+        holders = np.flatnonzero(stock[:, column] > 0)
+        statistics[category] = coverage_statistics(matrix.nearest_times(holders), weights, threshold)
+        statistics[category]['warehouses'] = int(len(holders))
+    return statistics
+
+def coverage_gaps(times: np.ndarray, weights: np.ndarray, demand_points: np.ndarray, top: int = 20) -> List[dict]:
+    """加权响应时间最差的需求点（覆盖缺口）"""
+    score = np.where(np.isfinite(times), times, np.nan) * weights
+    order = np.argsort(-np.nan_to_num(score, nan=np.inf))[:top]
+    return [{
+        'longitude': round(float(demand_points[i, 0]), 6),
+        'latitude': round(float(demand_points[i, 1]), 6),
+        'minutes': round(float(times[i]), 2) if np.isfinite(times[i]) else None,
+        'weight': float(weights[i])
+    } for i in order]
+
+def _candidate_setup(matrix: TravelTimeMatrix, weights, fixed, candidates):
+    """返回 (权重, 已有站点列, 候选站点列, 只含候选列的矩阵)"""
+    weights = np.asarray(weights, dtype=np.float32)
+    fixed = [int(column) for column in fixed]
+    allowed = np.zeros(matrix.shape[1], dtype=bool)
+    allowed[candidates if candidates is not None else slice(None)] = True
+    allowed[fixed] = False
+    columns = np.flatnonzero(allowed)
+    return weights, fixed, columns, matrix.subset(columns)
+
+def _capped(times: np.ndarray) -> np.ndarray:
+    """不可达（inf）的需求点按一个很大的时间计，使其参与收益计算"""
+    return np.where(np.isfinite(times), times, np.float32(1e6))
+
+def _median_gains(candidate_matrix: TravelTimeMatrix, weights: np.ndarray, current: np.ndarray) -> np.ndarray:
+    """开放各候选站点后加权总时间的减少量"""
+    gains = np.zeros(candidate_matrix.shape[1], dtype=np.float64)
+    capped = _capped(current)
+    for rows, block in candidate_matrix.blocks():
+        improvement = np.maximum(capped[rows, None] - block, 0, dtype=np.float32)
+        gains += weights[rows] @ improvement
+    return gains
+
+def _coverage_gains(candidate_matrix: TravelTimeMatrix, weights: np.ndarray, uncovered: np.ndarray,
+                    threshold: float) -> np.ndarray:
+    """开放各候选站点后新增覆盖的需求权重"""
+    gains = np.zeros(candidate_matrix.shape[1], dtype=np.float64)
+    for rows, block in candidate_matrix.blocks():
+        mask = uncovered[rows]
+        if mask.any():
+            gains += weights[rows][mask] @ (block[mask] <= threshold).astype(np.float32)
+    return gains
+
+def _best_available(gains: np.ndarray, available: np.ndarray) -> int:
+    """可选候选中收益最大的位置，没有可选候选时返回-1"""
+    masked = np.where(available, gains, -np.inf)
+    position = int(np.argmax(masked))
+    return position if np.isfinite(masked[position]) else -1
+
+def solve_p_median(matrix: TravelTimeMatrix, weights, p: int, fixed: Sequence[int] = (),
+                   candidates: Optional[Sequence[int]] = None, max_swap_rounds: int = 20) -> dict:
+    """p-中位问题：在已有站点（fixed）之外再选p个站点，使加权平均响应时间最小
+
+    先贪心逐个加入收益最大的站点，再做交换改进（每轮对每个新选站点尝试换成最优候选，
+    有改进就执行，直到没有改进或达到轮数上限）。
+    每次评估只遍历候选站点列；已有站点的最短时间只算一次，新选站点的时间列缓存在内存中，
+    因此已有站点再多也不影响迭代速度。
+    """
+    weights, fixed, columns, candidate_matrix = _candidate_setup(matrix, weights, fixed, candidates)
+    available = np.ones(len(columns), dtype=bool)
+    fixed_best = matrix.nearest_times(fixed)
+
+    chosen: List[int] = []        # 候选位置
+    chosen_times: List[np.ndarray] = []
+    current = fixed_best
+    for _ in range(p):
+        gains = _median_gains(candidate_matrix, weights, current)
+        position = _best_available(gains, available)
+        if position < 0 or gains[position] <= 0:
+            break
+        times = _column_times(candidate_matrix, position)
+        chosen.append(position)
+        chosen_times.append(times)
+        available[position] = False
+        current = np.minimum(current, times)
+
+    swaps = 0
+    for _ in range(max_swap_rounds):
+        improved = False
+        for slot in range(len(chosen)):
+            # 关闭该站点后的响应时间及增加的总时间
+            without = fixed_best
+            for other, times in enumerate(chosen_times):
+                if other != slot:
+                    without = np.minimum(without, times)
+            loss = float(weights @ (_capped(without) - _capped(current)))
+            gains = _median_gains(candidate_matrix, weights, without)
+            position = _best_available(gains, available)
+            if position >= 0 and gains[position] - loss > 1e-6 * max(1.0, loss):
+                available[chosen[slot]] = True
+                available[position] = False
+                chosen[slot] = position
+                chosen_times[slot] = _column_times(candidate_matrix, position)
+                current = np.minimum(without, chosen_times[slot])
+                swaps += 1
+                improved = True
+        if not improved:
+            break
+
+    return {
+        'chosen': [int(columns[position]) for position in chosen],
+        'swaps': swaps,
+        'objective_before': _weighted_mean(fixed_best, weights),
+        'objective_after': _weighted_mean(current, weights),
+        'times': current
+    }
+
+def solve_max_coverage(matrix: TravelTimeMatrix, weights, p: int, threshold: float, fixed: Sequence[int] = (),
+                       candidates: Optional[Sequence[int]] = None, max_swap_rounds: int = 20) -> dict:
+    """最大覆盖问题：在已有站点之外再选p个站点，使threshold分钟内可达的需求权重最大（贪心 + 交换改进）"""
+    weights, fixed, columns, candidate_matrix = _candidate_setup(matrix, weights, fixed, candidates)
+    available = np.ones(len(columns), dtype=bool)
+    fixed_best = matrix.nearest_times(fixed)
+    fixed_covered = fixed_best <= threshold
+
+    chosen: List[int] = []
+    chosen_cover: List[np.ndarray] = []
+    counts = fixed_covered.astype(np.int32)
+    for _ in range(p):
+        gains = _coverage_gains(candidate_matrix, weights, counts == 0, threshold)
+        position = _best_available(gains, available)
+        if position < 0 or gains[position] <= 0:
+            break
+        cover = _column_times(candidate_matrix, position) <= threshold
+        chosen.append(position)
+        chosen_cover.append(cover)
+        available[position] = False
+        counts += cover
+
+    swaps = 0
+    for _ in range(max_swap_rounds):
+        improved = False
+        for slot in range(len(chosen)):
+            removed = chosen_cover[slot]
+            # 只被该站点覆盖的需求，关闭后变为未覆盖
+            uncovered = (counts - removed) == 0
+            loss = float(weights[removed & uncovered].sum())
+            gains = _coverage_gains(candidate_matrix, weights, uncovered, threshold)
+            position = _best_available(gains, available)
+            if position >= 0 and gains[position] - loss > 1e-6 * max(1.0, loss):
+                cover = _column_times(candidate_matrix, position) <= threshold
+                counts = counts - removed + cover
+                available[chosen[slot]] = True
+                available[position] = False
+                chosen[slot] = position
+                chosen_cover[slot] = cover
+                swaps += 1
+                improved = True
+        if not improved:
+            break
+
+    chosen_columns = [int(columns[position]) for position in chosen]
+    total = float(weights.sum()) or 1.0
+    return {
+        'chosen': chosen_columns,
+        'swaps': swaps,
+        'objective_before': round(float(weights[fixed_covered].sum() / total), 4),
+        'objective_after': round(float(weights[counts > 0].sum() / total), 4),
+        'times': np.minimum(fixed_best, matrix.nearest_times(chosen_columns))
+    }
+
+def _column_times(matrix: TravelTimeMatrix, column: int) -> np.ndarray:
+    """单个站点列的行驶时间"""
+    return matrix.nearest_times([column])
+
+def _weighted_mean(times: np.ndarray, weights: np.ndarray) -> Optional[float]:
+    reachable = np.isfinite(times)
+    if not reachable.any():
+        return None
+    return round(float(np.average(times[reachable], weights=weights[reachable])), 2)
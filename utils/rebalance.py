@@ -0,0 +1,297 @@
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.records import WarehouseTable
+
+def warehouse_travel_matrix(table: WarehouseTable, warehouse_data=None, estimator=None) -> Tuple[np.ndarray, int]:
+    """仓库间行驶时间矩阵（分钟）
+
+    仓库间距离表中计算成功的记录使用实测值（只测了单向的，反向沿用），其余按直线距离估算。
+
+    Returns:
+        tuple: (W×W 矩阵, 使用实测值的仓库对数量)
+    """
+    from utils.placement import travel_minutes
+
+    lngs = np.array([record.longitude for record in table.records], dtype=np.float64)
+    lats = np.array([record.latitude for record in table.records], dtype=np.float64)
+    matrix = travel_minutes(lngs, lats, lngs, lats, estimator).astype(np.float64)
+    np.fill_diagonal(matrix, 0.0)
+
+    measured = np.zeros(matrix.shape, dtype=bool)
+    for distance in (warehouse_data or {}).get('warehouse_distances', []):
+        if distance.get('status') != '成功':
+            continue
+        try:
+            origin = table.index_of(distance['from_warehouse_id'])
+            destination = table.index_of(distance['to_warehouse_id'])
+            minutes = float(distance['duration_min'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if math.isnan(minutes):
+            continue
+        matrix[origin, destination] = minutes
+        measured[origin, destination] = True
+    reverse_only = measured.T & ~measured
+    matrix[reverse_only] = matrix.T[reverse_only]
+    return matrix, int((measured | reverse_only).sum())
+
+def stock_matrix(table: WarehouseTable) -> np.ndarray:
+    """(仓库数, 物资编码数) 的库存数量矩阵"""
+    inventory = table.inventory
+    stock = np.zeros((len(table), len(table.catalog)), dtype=np.int64)
+    np.add.at(stock, (inventory.warehouse_index, inventory.resource_code), inventory.quantity)
+    return stock
+
+def even_share_targets(stock: np.ndarray, fraction: float = 0.5, shares: Optional[np.ndarray] = None) -> np.ndarray:
+    """目标库存：每个仓库至少保有该物资总量按份额（默认平均）分配后的fraction"""
+    if shares is None:
+        shares = np.full(stock.shape[0], 1.0 / stock.shape[0])
+    return np.floor(fraction * np.outer(shares, stock.sum(axis=0))).astype(np.int64)
+
+def load_targets(path, table: WarehouseTable, base: np.ndarray) -> Tuple[np.ndarray, int]:
+    """读取目标库存文件（.csv/.xlsx，列：仓库ID、物资名称、目标数量，可选 物资类别、规格说明），覆盖base中对应的项
+
+    同名物资有多种类别/规格且文件未区分时，目标应用到每一种。
+
+    Returns:
+        tuple: (目标矩阵, 文件中未能匹配到仓库或物资的行数)
+    """
+    import pandas as pd
+
+    frame = pd.read_excel(path) if str(path).endswith(('.xlsx', '.xls')) else pd.read_csv(path)
+    for column in ('仓库ID', '物资名称', '目标数量'):
+        if column not in frame.columns:
+            raise ValueError(f"目标库存文件缺少列: {column}")
+
+    catalog = table.catalog
+    codes_by_name: Dict[str, List[int]] = {}
+    for code, name in enumerate(catalog.names):
+        codes_by_name.setdefault(str(name), []).append(code)
+
+    targets = base.copy()
+    unmatched = 0
+    for row in frame.to_dict('records'):
+        try:
+            warehouse = table.index_of(str(row['仓库ID']))
+        except KeyError:
+            unmatched += 1
+            continue
+        codes = [
+            code for code in codes_by_name.get(str(row['物资名称']), [])
+            if all(pd.isna(row.get(column)) or str(row[column]) == str(value)
+                   for column, value in (('物资类别', catalog.categories[code]),
+                                         ('规格说明', catalog.specifications[code])))
+        ]
+        if not codes:
+            unmatched += 1
+            continue
+        targets[warehouse, codes] = int(row['目标数量'])
+    return targets, unmatched
+
+class _Transport:
+    """单个物资的运输问题
+
+    缺口仓库先全部由行驶时间最短的富余仓库供应；只有最近仓库富余量不够分的缺口仓库进入线性规划，
+    每个只带neighbors条最近的路线。每次求解后用对偶价格检验全部路线（包括未进入规划的缺口仓库），
+    检验不通过的路线/缺口仓库加入后重新求解（列生成），直到通过，结果为全部路线上的最优解。
+    """
+
+    def __init__(self, code, donors, receivers, supply, demand, costs, neighbors):
+        self.code = code
+        self.donors, self.receivers = donors, receivers
+        self.supply, self.demand = supply, demand
+        self.costs = costs  # 富余仓库×缺口仓库，不可用的路线为inf
+        self.neighbors = len(donors) if neighbors is None else min(neighbors, len(donors))
+        self.nearest = costs.argmin(axis=0)
+        # 每短缺一件的惩罚超过任一增广路径的行驶时间变化：先最大化补足的缺口，再最小化总行驶时间
+        self.penalty = float(costs[np.isfinite(costs)].max()) * (len(donors) + len(receivers) + 1) + 1.0
+        self.active = np.zeros(len(receivers), dtype=bool)
+        self.columns = np.zeros(costs.shape, dtype=bool)  # 进入线性规划的路线
+        self.flows = None
+        load = np.bincount(self.nearest, weights=demand, minlength=len(donors))
+        self._activate(np.flatnonzero((load > supply)[self.nearest]))
+
+    def _activate(self, receivers):
+        self.active[receivers] = True
+        nearest = np.argpartition(self.costs[:, receivers], self.neighbors - 1, axis=0)[:self.neighbors]
+        self.columns[nearest, np.broadcast_to(receivers, nearest.shape)] = True
+        self.columns &= np.isfinite(self.costs)
+
+    def program(self):
+        """当前的受限线性规划：(路线费用+短缺惩罚, 供应行, 需求行, 供应上限, 需求量)"""
+        active = np.flatnonzero(self.active)
+        position = np.full(len(self.receivers), -1)
+        position[active] = np.arange(len(active))
+        self.arc_donor, self.arc_receiver = np.nonzero(self.columns)
+        fixed_load = np.bincount(self.nearest[~self.active], weights=self.demand[~self.active],
+                                 minlength=len(self.donors))
+        arcs = len(self.arc_donor)
+        return (
+            np.concatenate([self.costs[self.arc_donor, self.arc_receiver], np.full(len(active), self.penalty)]),
+            self.arc_donor,
+            np.concatenate([position[self.arc_receiver], np.arange(len(active))]),
+            arcs,
+            self.supply - fixed_load,
+            self.demand[active]
+        )
+
+    def update(self, x, supply_prices, demand_prices) -> bool:
+        """记录求解结果并做对偶检验，有新的路线/缺口仓库加入时返回True"""
+        self.flows = np.rint(x[:len(self.arc_donor)]).astype(np.int64)
+        # 由最近仓库供应的缺口仓库，其对偶价格由该路线的互补松弛条件确定
+        prices = self.costs[self.nearest, np.arange(len(self.receivers))] - supply_prices[self.nearest]
+        prices[self.active] = demand_prices
+        reduced = self.costs - supply_prices[:, None] - prices[None, :]
+        tolerance = 1e-6 * self.penalty
+        violated = (reduced < -tolerance) & ~self.columns
+        # 总富余量不足时，价格高于短缺惩罚的缺口仓库应当（部分）不补
+        receivers = violated.any(axis=0) | (prices > self.penalty + tolerance)
+        if not receivers.any():
+            return False
+        self.columns |= violated & self.active[None, :]
+        self._activate(np.flatnonzero(receivers & ~self.active))
+        return True
+
+    def transfers(self):
+        """(物资编码, 调出仓库, 调入仓库, 行驶时间, 数量) 数组"""
+        fixed = np.flatnonzero(~self.active)
+        donor = np.concatenate([self.nearest[fixed], self.arc_donor if self.flows is not None else []]).astype(np.int64)
+        receiver = np.concatenate([fixed, self.arc_receiver if self.flows is not None else []]).astype(np.int64)
+        flows = np.concatenate([self.demand[fixed], self.flows if self.flows is not None else []]).astype(np.int64)
+        used = flows > 0
+        donor, receiver, flows = donor[used], receiver[used], flows[used]
+        return (np.full(len(flows), self.code, dtype=np.int64), self.donors[donor], self.receivers[receiver],
+                self.costs[donor, receiver], flows)
+
+def _solve_programs(problems: List[_Transport]) -> List[_Transport]:
+    """多个物资的受限规划合并为一个稀疏线性规划（约束矩阵按物资分块对角）求解，返回需要再次求解的物资"""
+    from scipy.optimize import linprog
+    from scipy.sparse import coo_matrix
+
+    programs = [problem.program() for problem in problems]
+    costs, supply_rows, demand_rows, columns_of = [], [], [], []
+    supply_offset = demand_offset = column_offset = 0
+    for cost, supply_row, demand_row, arcs, supply, demand in programs:
+        costs.append(cost)
+        supply_rows.append(supply_row + supply_offset)
+        demand_rows.append(demand_row + demand_offset)
+        columns_of.append(np.arange(column_offset, column_offset + len(cost)))
+        supply_offset += len(supply)
+        demand_offset += len(demand)
+        column_offset += len(cost)
+    arc_columns = np.concatenate([columns[:program[3]] for columns, program in zip(columns_of, programs)])
+
+    result = linprog(
+        np.concatenate(costs),
+        A_ub=coo_matrix((np.ones(len(arc_columns)), (np.concatenate(supply_rows), arc_columns)),
+                        shape=(supply_offset, column_offset)).tocsr(),
+        b_ub=np.concatenate([program[4] for program in programs]).astype(np.float64),
+        A_eq=coo_matrix((np.ones(column_offset), (np.concatenate(demand_rows), np.arange(column_offset))),
+                        shape=(demand_offset, column_offset)).tocsr(),
+        b_eq=np.concatenate([program[5] for program in programs]).astype(np.float64),
+        bounds=(0, None),
+        method='highs-ds'
+    )
+    if result.status != 0:
+        raise RuntimeError(f"调拨方案求解失败: {result.message}")
+
+    # 运输问题的约束矩阵全幺模，单纯形法得到的顶点解本身就是整数
+    pending = []
+    supply_offset = demand_offset = 0
+    for problem, program, columns in zip(problems, programs, columns_of):
+        supply_count, demand_count = len(program[4]), len(program[5])
+        if problem.update(result.x[columns],
+                          result.ineqlin.marginals[supply_offset:supply_offset + supply_count],
+                          result.eqlin.marginals[demand_offset:demand_offset + demand_count]):
+            pending.append(problem)
+        supply_offset += supply_count
+        demand_offset += demand_count
+    return pending
+
+def plan_transfers(stock: np.ndarray, targets: np.ndarray, travel: np.ndarray, neighbors: Optional[int] = 5,
+                   max_minutes: Optional[float] = None, max_variables: int = 20_000) -> dict:
+    """计算调拨方案：各仓库高于目标的部分调往低于目标的仓库，尽量补足缺口且总行驶时间（件×分钟）最小
+
+    每种物资是一个独立的运输问题（超过max_minutes的路线不考虑），见 _Transport。
+    各物资的受限规划按 max_variables 个变量合并求解，规模只与最近仓库富余量不够分的缺口仓库数有关。
+
+    Returns:
+        dict: transfers 为 (物资编码, 调出仓库下标, 调入仓库下标, 行驶时间, 数量) 五元组列表，按物资、调入仓库排序；
+              另有 total_deficit / fulfilled / unit_minutes / unmet（各物资编码未补足的数量）等统计
+    """
+    surplus = np.maximum(stock - targets, 0)
+    deficit = np.maximum(targets - stock, 0)
+    codes = np.flatnonzero(surplus.any(axis=0) & deficit.any(axis=0))
+
+    # 按物资取列，转置后每个物资的数据连续存放
+    surplus_by_code, deficit_by_code = np.ascontiguousarray(surplus.T), np.ascontiguousarray(deficit.T)
+    problems = []
+    for code in codes.tolist():
+        donors = np.flatnonzero(surplus_by_code[code])
+        receivers = np.flatnonzero(deficit_by_code[code])
+        costs = travel[np.ix_(donors, receivers)]
+        if max_minutes is not None:
+            costs = np.where(costs <= max_minutes, costs, np.inf)
+        reachable = np.isfinite(costs).any(axis=0)
+        if not reachable.any():
+            continue
+        receivers, costs = receivers[reachable], costs[:, reachable]
+        problems.append(_Transport(code, donors, receivers, surplus_by_code[code, donors],
+                                   deficit_by_code[code, receivers], costs, neighbors))
+
+    pending = [problem for problem in problems if problem.active.any()]
+    solves = rounds = 0
+    while pending:
+        rounds += 1
+        next_pending, batch, variables = [], [], 0
+        for problem in pending:
+            batch.append(problem)
+            variables += int(problem.columns.sum()) + int(problem.active.sum())
+            if variables >= max_variables:
+                next_pending += _solve_programs(batch)
+                solves += 1
+                batch, variables = [], 0
+        if batch:
+            next_pending += _solve_programs(batch)
+            solves += 1
+        pending = next_pending
+
+    transfers = []
+    delivered = np.zeros(stock.shape[1], dtype=np.int64)
+    unit_minutes = 0.0
+    if problems:
+        arc_codes, arc_from, arc_to, costs, flows = (
+            np.concatenate(parts) for parts in zip(*(problem.transfers() for problem in problems))
+        )
+        order = np.lexsort((arc_from, arc_to, arc_codes))
+        transfers = list(zip(arc_codes[order].tolist(), arc_from[order].tolist(), arc_to[order].tolist(),
+                             costs[order].tolist(), flows[order].tolist()))
+        np.add.at(delivered, arc_codes, flows)
+        unit_minutes = float(costs @ flows)
+
+    needed = deficit.sum(axis=0)
+    unmet = needed - delivered
+    return {
+        'transfers': transfers,
+        'resources': int(len(codes)),
+        'lp_solves': solves,
+        'pricing_rounds': rounds,
+        'total_deficit': int(needed.sum()),
+        'fulfilled': int(delivered.sum()),
+        'unit_minutes': round(unit_minutes, 1),
+        'unmet': {int(code): int(unmet[code]) for code in np.flatnonzero(unmet)}
+    }
+
+def summarize_trips(transfers) -> List[dict]:
+    """按 (调出仓库, 调入仓库) 汇总调拨单，每组对应一趟运输，按件数降序"""
+    trips: Dict[Tuple[int, int], dict] = {}
+    for code, origin, destination, minutes, quantity in transfers:
+        trip = trips.setdefault((origin, destination), {
+            'from': origin, 'to': destination, 'minutes': round(minutes, 1), 'resources': 0, 'quantity': 0
+        })
+        trip['resources'] += 1
+        trip['quantity'] += quantity
+    return sorted(trips.values(), key=lambda trip: -trip['quantity'])
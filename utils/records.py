@@ -0,0 +1,269 @@
+import sys
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 防护装备关键字（与界面中的装备支撑能力统计一致）
+PROTECTIVE_GEAR_KEYWORDS = ('呼吸器', '防护服', '面罩')
+
+def _scalar(value):
+    """pandas/numpy标量转换为Python原生值"""
+    return value.item() if hasattr(value, 'item') else value
+
+def _text(value):
+    """文本字段驻留，相同内容只保留一份"""
+    value = _scalar(value)
+    return sys.intern(value) if isinstance(value, str) else value
+
+@dataclass(frozen=True, slots=True)
+class WarehouseRecord:
+    """仓库记录（不含物资，物资按列存放在Inventory中）"""
+    id: str
+    name: str
+    address: str
+    longitude: float
+    latitude: float
+    city: str = ''
+    district: str = ''
+    total_area: Optional[float] = None
+    available_area: Optional[float] = None
+    max_weight: Optional[float] = None
+    manager: str = ''
+    phone: str = ''
+    emergency_phone: str = ''
+
+    @classmethod
+    def from_dict(cls, warehouse: dict) -> "WarehouseRecord":
+        """从 read_warehouse_data_from_xlsx 的仓库字典构建"""
+        location = warehouse.get('location', {})
+        capacity = warehouse.get('capacity', {})
+        contact = warehouse.get('contact', {})
+        return cls(
+            id=_text(warehouse['id']),
+            name=_text(warehouse['name']),
+            address=_text(location.get('address', '')),
+            longitude=float(location['longitude']),
+            latitude=float(location['latitude']),
+            city=_text(location.get('city', '')),
+            district=_text(location.get('district', '')),
+            total_area=_scalar(capacity.get('total_area')),
+            available_area=_scalar(capacity.get('available_area')),
+            max_weight=_scalar(capacity.get('max_weight')),
+            manager=_text(contact.get('manager', '')),
+            phone=_text(contact.get('phone', '')),
+            emergency_phone=_text(contact.get('emergency_phone', ''))
+        )
+
+    def to_dict(self) -> dict:
+        """转换为原有的仓库字典结构（不含resources）"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "location": {
+                "address": self.address,
+                "longitude": self.longitude,
+                "latitude": self.latitude,
+                "city": self.city,
+                "district": self.district
+            },
+            "capacity": {
+                "total_area": self.total_area,
+                "available_area": self.available_area,
+                "max_weight": self.max_weight
+            },
+            "contact": {
+                "manager": self.manager,
+                "phone": self.phone,
+                "emergency_phone": self.emergency_phone
+            }
+        }
+
+class ResourceCatalog:
+    """物资目录：相同的 (类别, 名称, 单位, 规格) 只登记一次，以整数编码引用"""
+
+    __slots__ = ('categories', 'names', 'units', 'specifications', '_codes')
+
+    def __init__(self):
+        self.categories: List[str] = []
+        self.names: List[str] = []
+        self.units: List[str] = []
+        self.specifications: List[str] = []
+        self._codes: Dict[Tuple, int] = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, category, name, unit, specification) -> int:
+        """登记物资并返回编码"""
+        key = (_text(category), _text(name), _text(unit), _text(specification))
+        code = self._codes.get(key)
+        if code is None:
+            code = self._codes[key] = len(self.names)
+            self.categories.append(key[0])
+            self.names.append(key[1])
+            self.units.append(key[2])
+            self.specifications.append(key[3])
+        return code
+
+    def codes_matching(self, keywords: Iterable[str]) -> np.ndarray:
+        """名称中包含任一关键字的物资编码"""
+        keywords = tuple(keywords)
+        return np.array(
+            [code for code, name in enumerate(self.names) if any(keyword in str(name) for keyword in keywords)],
+            dtype=np.int32
+        )
+
+    def describe(self, code: int) -> dict:
+        return {
+            "category": self.categories[code],
+            "name": self.names[code],
+            "unit": self.units[code],
+            "specification": self.specifications[code]
+        }
+
+class Inventory:
+    """按列存放的库存：每条记录为 (仓库下标, 物资编码, 数量)，均为int32数组"""
+
+    __slots__ = ('warehouse_index', 'resource_code', 'quantity', 'catalog')
+
+    def __init__(self, warehouse_index, resource_code, quantity, catalog: ResourceCatalog):
+        self.warehouse_index = np.asarray(warehouse_index, dtype=np.int32)
+        self.resource_code = np.asarray(resource_code, dtype=np.int32)
+        self.quantity = np.asarray(quantity, dtype=np.int32)
+        self.catalog = catalog
+
+    def __len__(self):
+        return len(self.quantity)
+
+    @property
+    def nbytes(self) -> int:
+        return self.warehouse_index.nbytes + self.resource_code.nbytes + self.quantity.nbytes
+
+    def totals_by_warehouse(self, warehouse_count: int, codes: Optional[Sequence[int]] = None) -> np.ndarray:
+        """各仓库的物资总数，可只统计指定编码的物资"""
+        if codes is None:
+            mask = slice(None)
+        else:
+            mask = np.isin(self.resource_code, np.asarray(codes, dtype=np.int32))
+        return np.bincount(
+            self.warehouse_index[mask], weights=self.quantity[mask], minlength=warehouse_count
+        ).astype(np.int64)
+
+    def totals_by_resource(self) -> np.ndarray:
+        """各物资编码在所有仓库中的总数"""
+        return np.bincount(
+            self.resource_code, weights=self.quantity, minlength=len(self.catalog)
+        ).astype(np.int64)
+
+    def rows_of(self, warehouse: int) -> np.ndarray:
+        """指定仓库的库存记录下标"""
+        return np.flatnonzero(self.warehouse_index == warehouse)
+
+class WarehouseTable:
+    """紧凑的仓库数据模型：冻结的仓库记录 + 按列存放的库存"""
+
+    __slots__ = ('records', 'inventory', '_by_id')
+
+    def __init__(self, records: Sequence[WarehouseRecord], inventory: Inventory):
+        self.records = tuple(records)
+        self.inventory = inventory
+        self._by_id = {record.id: index for index, record in enumerate(self.records)}
+
+    def __len__(self):
+        return len(self.records)
+
+    def index_of(self, warehouse_id) -> int:
+        return self._by_id[warehouse_id]
+
+    @property
+    def catalog(self) -> ResourceCatalog:
+        return self.inventory.catalog
+
+    @classmethod
+    def from_warehouse_data(cls, warehouse_data) -> "WarehouseTable":
+        """从 read_warehouse_data_from_xlsx 的结果构建"""
+        warehouses = warehouse_data['warehouses'] if isinstance(warehouse_data, dict) else warehouse_data
+        catalog = ResourceCatalog()
+        records = []
+        warehouse_index, resource_code, quantity = [], [], []
+        for index, warehouse in enumerate(warehouses):
+            records.append(WarehouseRecord.from_dict(warehouse))
+            for resource in warehouse.get('resources', []):
+                warehouse_index.append(index)
+                resource_code.append(catalog.intern(
+                    resource.get('category', ''), resource.get('name', ''),
+                    resource.get('unit', ''), resource.get('specification', '')
+                ))
+                quantity.append(_scalar(resource.get('quantity', 0)) or 0)
+        return cls(records, Inventory(warehouse_index, resource_code, quantity, catalog))
+
+    @classmethod
+    def from_frames(cls, basic_info_df, resources_df) -> "WarehouseTable":
+        """直接从Excel工作表（仓库基本信息、物资详细信息）构建，不经过嵌套字典"""
+        records = [
+            WarehouseRecord(
+                id=_text(row['仓库ID']), name=_text(row['仓库名称']), address=_text(row['地址']),
+                longitude=float(row['经度']), latitude=float(row['纬度']),
+                city=_text(row['城市']), district=_text(row['行政区']),
+                total_area=_scalar(row['总面积(平方米)']), available_area=_scalar(row['可用面积(平方米)']),
+                max_weight=_scalar(row['最大载重(吨)']),
+                manager=_text(row['负责人']), phone=_text(row['联系电话']), emergency_phone=_text(row['应急电话'])
+            )
+            for row in basic_info_df.to_dict('records')
+        ]
+        by_id = {record.id: index for index, record in enumerate(records)}
+
+        catalog = ResourceCatalog()
+        columns = ['物资类别', '物资名称', '单位', '规格说明']
+        keys = resources_df[columns].fillna('').astype(str).itertuples(index=False, name=None)
+        resource_code = [catalog.intern(*key) for key in keys]
+        warehouse_index = resources_df['仓库ID'].map(by_id)
+        known = warehouse_index.notna().to_numpy()
+        return cls(records, Inventory(
+            warehouse_index.to_numpy()[known].astype(np.int32),
+            np.asarray(resource_code, dtype=np.int32)[known],
+            resources_df['数量'].fillna(0).to_numpy()[known],
+            catalog
+        ))
+
+    def resources_of(self, warehouse: int) -> List[dict]:
+        """指定仓库的物资列表（原有的resources字典结构）"""
+        inventory = self.inventory
+        resources = []
+        for row in inventory.rows_of(warehouse):
+            resource = inventory.catalog.describe(int(inventory.resource_code[row]))
+            resource['quantity'] = int(inventory.quantity[row])
+            resources.append(resource)
+        return resources
+
+    def warehouse_dict(self, warehouse: int) -> dict:
+        """转换为原有的仓库字典结构"""
+        warehouse_info = self.records[warehouse].to_dict()
+        warehouse_info['resources'] = self.resources_of(warehouse)
+        return warehouse_info
+
+    def to_warehouses(self) -> List[dict]:
+        """转换为 read_warehouse_data_from_xlsx 中 warehouses 列表的结构"""
+        return [self.warehouse_dict(index) for index in range(len(self.records))]
+
+    def totals_by_warehouse(self, keywords: Optional[Iterable[str]] = None) -> np.ndarray:
+        """各仓库物资总数，可按名称关键字筛选"""
+        codes = None if keywords is None else self.catalog.codes_matching(keywords)
+        return self.inventory.totals_by_warehouse(len(self.records), codes)
+
+    def protective_gear_totals(self) -> np.ndarray:
+        """各仓库的防护装备（呼吸器/防护服/面罩）总数"""
+        return self.totals_by_warehouse(PROTECTIVE_GEAR_KEYWORDS)
+
+def read_warehouse_table_from_xlsx(xlsx_file_path) -> Optional[WarehouseTable]:
+    """从Excel文件直接读取紧凑的仓库数据模型，读取失败时返回None"""
+    import pandas as pd
+
+    try:
+        basic_info_df = pd.read_excel(xlsx_file_path, sheet_name='仓库基本信息')
+        resources_df = pd.read_excel(xlsx_file_path, sheet_name='物资详细信息')
+        return WarehouseTable.from_frames(basic_info_df, resources_df)
+    except Exception as e:
+        print(f"读取Excel文件时发生错误: {e}")
+        return None
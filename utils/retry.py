@@ -0,0 +1,244 @@
+import asyncio
+import bisect
+import math
+import random
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+class LatencyHistogram:
+    """单个操作的延迟直方图（固定分桶计数 + 滑动窗口分位数）"""
+
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, math.inf)
+
+    def __init__(self, name: str, window: int = 512):
+        self.name = name
+        self.bucket_counts = [0] * len(self.BUCKETS)
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total_seconds = 0.0
+        self.errors = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def observe(self, seconds: float):
+        """记录一次成功调用的耗时"""
+        self.count += 1
+        self.total_seconds += seconds
+        self.samples.append(seconds)
+        self.bucket_counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        """滑动窗口内的分位数（q取0~1），无样本时返回None"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出统计信息"""
+        def fmt(value):
+            return round(value, 4) if value is not None else None
+
+        return {
+            'count': self.count,
+            'mean': fmt(self.total_seconds / self.count) if self.count else None,
+            'p50': fmt(self.percentile(0.50)),
+            'p95': fmt(self.percentile(0.95)),
+            'p99': fmt(self.percentile(0.99)),
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'retries': self.retries,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'buckets': {
+                ('+Inf' if math.isinf(bound) else f"{bound:g}"): count
+                for bound, count in zip(self.BUCKETS, self.bucket_counts)
+            }
+        }
+
+class LatencyRegistry:
+    """按操作名称汇总的延迟直方图"""
+
+    def __init__(self):
+        self._histograms: Dict[str, LatencyHistogram] = {}
+
+    def get(self, name: str) -> LatencyHistogram:
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = LatencyHistogram(name)
+        return histogram
+
+    def reset(self):
+        """清空所有统计（基准测试在各轮之间调用）"""
+        self._histograms.clear()
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """所有操作的统计信息"""
+        return {name: histogram.snapshot() for name, histogram in sorted(self._histograms.items())}
+
+    def format_report(self) -> str:
+        """格式化为便于打印的文本"""
+        def seconds(value):
+            return f"{value}s" if value is not None else "-"
+
+        lines = []
+        for name, stats in self.report().items():
+            lines.append(
+                f"- {name}: {stats['count']}次, p50={seconds(stats['p50'])}, p95={seconds(stats['p95'])}, "
+                f"p99={seconds(stats['p99'])}, "
+                f"错误{stats['errors']}, 超时{stats['timeouts']}, 重试{stats['retries']}, "
+                f"对冲{stats['hedges']}(胜出{stats['hedge_wins']})"
+            )
+        return "\n".join(lines)
+
+# 进程级默认的延迟统计
+latency_registry = LatencyRegistry()
+
+class RetryError(Exception):
+    """所有尝试均失败"""
+
+    def __init__(self, operation: str, attempts: int, last_exception: Optional[BaseException] = None,
+                 last_result: Any = None):
+        self.operation = operation
+        self.attempts = attempts
+        self.last_exception = last_exception
+        self.last_result = last_result
+        reason = str(last_exception) if last_exception is not None else "结果校验未通过"
+        super().__init__(f"{operation} 在 {attempts} 次尝试后仍失败: {reason}")
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """重试策略：单次尝试超时、带抖动的指数退避和可选的对冲请求
+
+    对冲：单次尝试在超过该操作历史p95延迟后仍未返回时，再发出一个相同的请求，
+    取先成功返回的结果并取消另一个。
+    """
+    max_attempts: int = 3
+    attempt_timeout: Optional[float] = None
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    multiplier: float = 2.0
+    jitter: bool = True
+    hedge: bool = False
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 20
+    hedge_delay: Optional[float] = None  # 样本不足时使用的固定对冲延迟
+    retry_on: Tuple[type, ...] = (Exception,)
+
+    def with_options(self, **changes) -> "RetryPolicy":
+        """返回修改部分参数后的新策略"""
+        return replace(self, **changes)
+
+    def backoff(self, attempt: int) -> float:
+        """第attempt次（从1开始）失败后的等待时间（full jitter）"""
+        delay = min(self.max_delay, self.base_delay * (self.multiplier ** (attempt - 1)))
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def current_hedge_delay(self, histogram: LatencyHistogram) -> Optional[float]:
+        """根据历史延迟计算对冲触发时间，未启用对冲时返回None"""
+        if not self.hedge:
+            return None
+        if len(histogram.samples) >= self.hedge_min_samples:
+            return histogram.percentile(self.hedge_quantile)
+        return self.hedge_delay
+
+    async def _attempt(self, histogram, factory, is_success):
+        """执行一次（可能带对冲的）尝试，返回 (是否成功, 结果或异常)"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.attempt_timeout if self.attempt_timeout else None
+
+        primary = asyncio.ensure_future(factory())
+        tasks = {primary}
+        last = (False, None)
+        try:
+            hedge_delay = self.current_hedge_delay(histogram)
+            if hedge_delay is not None and (deadline is None or started + hedge_delay < deadline):
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                if not done:
+                    histogram.hedges += 1
+                    tasks.add(asyncio.ensure_future(factory()))
+
+            while tasks:
+                remaining = deadline - loop.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    break
+                done, _ = await asyncio.wait(tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    tasks.discard(task)
+                    if task.cancelled():
+                        continue
+                    exc = task.exception()
+                    if exc is not None:
+                        if not isinstance(exc, self.retry_on):
+                            raise exc
+                        last = (False, exc)
+                        continue
+                    result = task.result()
+                    if is_success is None or is_success(result):
+                        histogram.observe(loop.time() - started)
+                        if task is not primary:
+                            histogram.hedge_wins += 1
+                        return True, result
+                    last = (False, result)
+
+            if tasks:
+                histogram.timeouts += 1
+                return False, asyncio.TimeoutError(f"单次尝试超过 {self.attempt_timeout} 秒")
+            return last
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def run(self,
+                  operation: str,
+                  factory: Callable[[], Awaitable[Any]],
+                  is_success: Optional[Callable[[Any], bool]] = None,
+                  registry: Optional[LatencyRegistry] = None):
+        """按策略执行操作
+
+        Args:
+            operation: 操作名称，用于延迟统计和对冲阈值
+            factory: 无参数的协程工厂函数，每次尝试（及对冲）都会重新调用
+            is_success: 可选的结果校验函数，返回False时视为失败并重试
+
+        Returns:
+            tuple: (结果, 尝试次数)
+
+        Raises:
+            RetryError: 所有尝试均失败
+        """
+        histogram = (registry or latency_registry).get(operation)
+        last_exception = None
+        last_result = None
+
+        for attempt in range(1, self.max_attempts + 1):
+            if attempt > 1:
+                histogram.retries += 1
+            ok, outcome = await self._attempt(histogram, factory, is_success)
+            if ok:
+                return outcome, attempt
+
+            # 只保留最后一次尝试的结果或异常
+            if isinstance(outcome, BaseException):
+                histogram.errors += 1
+                last_exception, last_result = outcome, None
+            else:
+                last_exception, last_result = None, outcome
+
+            if attempt < self.max_attempts:
+                await asyncio.sleep(self.backoff(attempt))
+
+        raise RetryError(operation, self.max_attempts, last_exception, last_result)
+
+# 地图路线查询：单次尝试60秒超时，样本充足后在p95处发出对冲请求
+LOCATION_RETRY_POLICY = RetryPolicy(max_attempts=3, attempt_timeout=60.0, hedge=True, hedge_delay=20.0)
+
+# 决策LLM调用：生成耗时长且代价高，只重试不对冲
+DECISION_RETRY_POLICY = RetryPolicy(max_attempts=2, attempt_timeout=300.0, base_delay=2.0)
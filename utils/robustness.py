@@ -0,0 +1,184 @@
+import itertools
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 路段类型（参与随机数种子，保证同一路段在所有候选方案中使用同一组扰动）
+LEG_DEPARTURE, LEG_BETWEEN, LEG_INCIDENT, LEG_LOADING = 0, 1, 2, 3
+
+@dataclass(frozen=True, slots=True)
+class TravelUncertainty:
+    """行驶时间扰动模型
+
+    每段路程的实际时间 = 名义时间 × 全城拥堵系数 × 路段系数，两个系数均为均值为1的对数正态分布；
+    名义时间为估算值的路段使用更大的离散度。每个仓库的装载时间同样按对数正态分布扰动。
+    """
+    leg_sigma: float = 0.25
+    estimated_sigma: float = 0.4
+    common_sigma: float = 0.15
+    loading_minutes: float = 5.0
+    loading_sigma: float = 0.3
+
+def _lognormal_factors(rng: np.random.Generator, sigma: float, samples: int) -> np.ndarray:
+    """均值为1的对数正态系数"""
+    return np.exp(sigma * rng.standard_normal(samples) - sigma * sigma / 2)
+
+class RouteLegs:
+    """出发地→仓库、仓库→仓库、仓库→事发地 的名义行驶时间（分钟，不可达为inf）
+
+    estimated_* 标记名义时间为估算值（直线距离估算、超时降级等）的路段。
+    """
+
+    def __init__(self, departure, incident, between=None, departure_estimated=None, incident_estimated=None,
+                 names: Optional[Sequence[str]] = None):
+        self.departure = np.asarray(departure, dtype=np.float64)
+        self.incident = np.asarray(incident, dtype=np.float64)
+        count = len(self.departure)
+        self.between = (np.full((count, count), np.inf) if between is None
+                        else np.asarray(between, dtype=np.float64))
+        self.departure_estimated = (np.zeros(count, dtype=bool) if departure_estimated is None
+                                    else np.asarray(departure_estimated, dtype=bool))
+        self.incident_estimated = (np.zeros(count, dtype=bool) if incident_estimated is None
+                                   else np.asarray(incident_estimated, dtype=bool))
+        self.names = list(names) if names is not None else [str(index) for index in range(count)]
+
+    def __len__(self):
+        return len(self.departure)
+
+    @classmethod
+    def from_distance_results(cls, incident_distances, departure_distances, between=None) -> "RouteLegs":
+        """从两次距离计算的结果（calculate_distances_to_warehouses 的返回值）构建"""
+        from utils.dispatch import result_minutes
+
+        def minutes(results):
+            values, estimated = [], []
+            for result in results:
+                value = result_minutes(result)
+                values.append(np.inf if value is None else value)
+                estimated.append(bool(result.get('estimated')))
+            return values, estimated
+
+        departure, departure_estimated = minutes(departure_distances)
+        incident, incident_estimated = minutes(incident_distances)
+        return cls(departure, incident, between, departure_estimated, incident_estimated,
+                   names=[result['warehouse_name'] for result in incident_distances])
+
+    def nominal(self, route: Sequence[int]) -> float:
+        """按名义时间计算的到场时间（不含装载时间）"""
+        total = self.departure[route[0]] + self.incident[route[-1]]
+        for origin, destination in zip(route, route[1:]):
+            total += self.between[origin, destination]
+        return float(total)
+
+    def legs(self, route: Sequence[int], uncertainty: TravelUncertainty) -> List[Tuple[tuple, float, float]]:
+        """路线的各段：(路段键, 名义分钟, 离散度)"""
+        legs = [((LEG_DEPARTURE, route[0], 0), self.departure[route[0]],
+                 uncertainty.estimated_sigma if self.departure_estimated[route[0]] else uncertainty.leg_sigma)]
+        for origin, destination in zip(route, route[1:]):
+            legs.append(((LEG_BETWEEN, origin, destination), self.between[origin, destination], uncertainty.leg_sigma))
+        legs.append(((LEG_INCIDENT, route[-1], 0), self.incident[route[-1]],
+                     uncertainty.estimated_sigma if self.incident_estimated[route[-1]] else uncertainty.leg_sigma))
+        return legs
+
+def candidate_routes(legs: RouteLegs, max_stops: int = 2, pool_size: int = 8,
+                     indices: Optional[Sequence[int]] = None) -> List[Tuple[int, ...]]:
+    """候选取物资路线：名义 出发→仓库→事发地 时间最短的pool_size个仓库，
+    或指定的indices中，取1..max_stops个仓库的全部访问顺序"""
+    if indices is None:
+        single = legs.departure + legs.incident
+        reachable = np.flatnonzero(np.isfinite(single))
+        indices = reachable[np.argsort(single[reachable], kind='stable')][:pool_size].tolist()
+    routes = []
+    for stops in range(1, max_stops + 1):
+        for route in itertools.permutations(indices, stops):
+            if np.isfinite(legs.nominal(route)):
+                routes.append(route)
+    return routes
+
+def simulate_arrivals(legs: RouteLegs, routes: Sequence[Sequence[int]], samples: int = 5000, seed: int = 0,
+                      uncertainty: Optional[TravelUncertainty] = None) -> np.ndarray:
+    """各路线的到场时间样本 (路线数, samples)
+
+    扰动按 (种子, 路段) 生成：同一路段在所有路线中、不同进程中取到同一组样本（公共随机数），
+    方案之间的差异不会被抽样噪声掩盖。
+    """
+    uncertainty = uncertainty or TravelUncertainty()
+    common = _lognormal_factors(np.random.default_rng([seed, 0x5eed]), uncertainty.common_sigma, samples)
+    factors: Dict[tuple, np.ndarray] = {}
+
+    def leg_factors(key, sigma):
+        cached = factors.get(key)
+        if cached is None:
+            cached = factors[key] = _lognormal_factors(np.random.default_rng([seed, *key]), sigma, samples)
+        return cached
+
+    arrivals = np.empty((len(routes), samples), dtype=np.float64)
+    for row, route in enumerate(routes):
+        travel = np.zeros(samples)
+        for key, minutes, sigma in legs.legs(route, uncertainty):
+            travel += minutes * leg_factors(key, sigma)
+        arrivals[row] = travel * common
+        for stop in route:
+            arrivals[row] += uncertainty.loading_minutes * leg_factors((LEG_LOADING, stop, 0), uncertainty.loading_sigma)
+    return arrivals
+
+def summarize_arrivals(arrivals: np.ndarray, target_minutes: Optional[float] = None) -> List[dict]:
+    """每条路线的到场时间统计：均值、p50/p90/p95，以及在target_minutes内到场的概率"""
+    percentiles = np.percentile(arrivals, [50, 90, 95], axis=1)
+    means = arrivals.mean(axis=1)
+    on_time = (arrivals <= target_minutes).mean(axis=1) if target_minutes is not None else None
+    summaries = []
+    for row in range(len(arrivals)):
+        summary = {
+            'mean_minutes': round(float(means[row]), 1),
+            'p50_minutes': round(float(percentiles[0, row]), 1),
+            'p90_minutes': round(float(percentiles[1, row]), 1),
+            'p95_minutes': round(float(percentiles[2, row]), 1)
+        }
+        if on_time is not None:
+            summary['on_time_probability'] = round(float(on_time[row]), 4)
+        summaries.append(summary)
+    return summaries
+
+def _evaluate_chunk(legs, routes, samples, seed, uncertainty, target_minutes):
+    return summarize_arrivals(simulate_arrivals(legs, routes, samples, seed, uncertainty), target_minutes)
+
+def evaluate_routes(legs: RouteLegs, routes: Sequence[Sequence[int]], samples: int = 5000, seed: int = 0,
+                    target_minutes: Optional[float] = None, uncertainty: Optional[TravelUncertainty] = None,
+                    workers: Optional[int] = None, chunk_size: int = 64) -> List[dict]:
+    """蒙特卡洛评估候选路线，按p90到场时间（其次按准时概率、均值）排序
+
+    样本维度在NumPy中向量化；候选路线按chunk_size分块交给进程池（workers，默认CPU数），
+    只有一块或workers<=1时在当前进程计算。
+
+    Returns:
+        list: [{'route': (仓库下标...), 'warehouses': [名称...], 'nominal_minutes', 'mean_minutes',
+                'p50_minutes', 'p90_minutes', 'p95_minutes', 'on_time_probability'}, ...]
+    """
+    routes = [tuple(int(stop) for stop in route) for route in routes]
+    chunks = [routes[start:start + chunk_size] for start in range(0, len(routes), chunk_size)]
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    if workers <= 1 or len(chunks) <= 1:
+        summaries = [summary for chunk in chunks
+                     for summary in _evaluate_chunk(legs, chunk, samples, seed, uncertainty, target_minutes)]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            futures = [executor.submit(_evaluate_chunk, legs, chunk, samples, seed, uncertainty, target_minutes)
+                       for chunk in chunks]
+            summaries = [summary for future in futures for summary in future.result()]
+
+    results = []
+    for route, summary in zip(routes, summaries):
+        results.append({
+            'route': route,
+            'warehouses': [legs.names[stop] for stop in route],
+            'nominal_minutes': round(legs.nominal(route), 1),
+            **summary
+        })
+    results.sort(key=lambda result: (result['p90_minutes'], -result.get('on_time_probability', 0.0),
+                                     result['mean_minutes']))
+    return results
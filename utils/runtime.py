@@ -0,0 +1,214 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from agents.locate_agent import LocationAgent, create_location_agent
+from agents.decision_agent import DecisionAgent, create_decision_llm
+
+class _AgentSlot:
+    """连接池中的单个LocationAgent槽位，由独立的监督任务维护MCP长连接"""
+
+    def __init__(self, pool: "LocationAgentPool", index: int):
+        self.pool = pool
+        self.index = index
+        self.agent: Optional[LocationAgent] = None
+        self.connect_error: Optional[Exception] = None
+        self.last_health_check = 0.0
+        self.ready = asyncio.Event()
+        self.reconnect = asyncio.Event()
+        self.supervisor = asyncio.create_task(self._supervise())
+
+    async def _supervise(self):
+        """维护LocationAgent的MCP长连接
+
+        SSE客户端要求连接的建立和关闭发生在同一个任务中，
+        因此由该任务负责连接的整个生命周期，其他任务只通过事件通知重连。
+        """
+        loop = asyncio.get_running_loop()
+        while not self.pool.stopping:
+            agent = None
+            try:
+                agent = await create_location_agent(self.pool.server_config_path, self.pool.tool_budget)
+                self.agent = agent
+                self.connect_error = None
+                self.last_health_check = loop.time()
+                self.ready.set()
+                await self.reconnect.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.connect_error = e
+                print(f"[连接池] 槽位{self.index} 连接地图服务失败: {e}")
+                # 唤醒等待者，使其立即得到失败结果而不是一直阻塞
+                self.ready.set()
+                await asyncio.sleep(self.pool.reconnect_delay)
+            finally:
+                self.ready.clear()
+                self.reconnect.clear()
+                self.agent = None
+                if agent is not None:
+                    try:
+                        await agent.disconnect()
+                    except Exception as e:
+                        print(f"[连接池] 槽位{self.index} 断开MCP连接时出错: {e}")
+
+    async def get_healthy_agent(self) -> LocationAgent:
+        """获取通过健康检查的LocationAgent，必要时触发重连"""
+        loop = asyncio.get_running_loop()
+        for _ in range(2):
+            await asyncio.wait_for(self.ready.wait(), self.pool.connect_timeout)
+            agent = self.agent
+            if agent is None:
+                raise ConnectionError(f"地图服务不可用: {self.connect_error}")
+
+            if loop.time() - self.last_health_check < self.pool.health_check_interval:
+                return agent
+            if await agent.ping(self.pool.ping_timeout):
+                self.last_health_check = loop.time()
+                return agent
+
+            print(f"[连接池] 槽位{self.index} 健康检查失败，正在重建MCP连接...")
+            self.ready.clear()
+            self.reconnect.set()
+
+        raise ConnectionError("地图服务健康检查失败")
+
+class LocationAgentPool:
+    """预连接的LocationAgent连接池（必须在运行中的事件循环内创建）
+
+    每个LocationAgent持有独立的MCP会话和对话历史，同一时刻只租给一个调用方。
+    tool_budget 为各代理的工具循环预算（ToolLoopBudget），默认 DEFAULT_TOOL_BUDGET。
+    """
+
+    def __init__(self,
+                 server_config_path="configs/servers_config.json",
+                 size: int = 1,
+                 health_check_interval: float = 30.0,
+                 ping_timeout: float = 5.0,
+                 connect_timeout: float = 30.0,
+                 reconnect_delay: float = 2.0,
+                 tool_budget=None):
+        self.server_config_path = server_config_path
+        self.tool_budget = tool_budget
+        self.size = size
+        self.health_check_interval = health_check_interval
+        self.ping_timeout = ping_timeout
+        self.connect_timeout = connect_timeout
+        self.reconnect_delay = reconnect_delay
+        self.stopping = False
+
+        self._slots = [_AgentSlot(self, i) for i in range(size)]
+        self._idle: asyncio.Queue = asyncio.Queue()
+        for slot in self._slots:
+            self._idle.put_nowait(slot)
+
+    @property
+    def available(self) -> int:
+        """当前空闲的槽位数量"""
+        return self._idle.qsize()
+
+    @asynccontextmanager
+    async def lease(self):
+        """独占租用一个LocationAgent（租用前做健康检查并清空对话历史）"""
+        slot = await self._idle.get()
+        try:
+            agent = await slot.get_healthy_agent()
+            agent.reset_conversation()
+            yield agent
+        finally:
+            self._idle.put_nowait(slot)
+
+    async def probe(self) -> bool:
+        """探测地图服务是否可用：租用一个通过健康检查的代理（必要时重连）直接调用MCP工具
+
+        供熔断器的后台探测使用，不依赖某个可能已被重连替换的会话
+        """
+        async with self.lease() as agent:
+            return await agent.probe()
+
+    async def close(self):
+        """关闭所有MCP连接"""
+        self.stopping = True
+        for slot in self._slots:
+            slot.reconnect.set()
+        for slot in self._slots:
+            try:
+                await asyncio.wait_for(slot.supervisor, self.connect_timeout)
+            except Exception:
+                slot.supervisor.cancel()
+
+class DispatchRuntime:
+    """进程级后台事件循环，持有预连接的LocationAgent连接池和共享的决策LLM客户端"""
+
+    def __init__(self,
+                 server_config_path="configs/servers_config.json",
+                 pool_size: int = 1,
+                 **pool_options):
+        self.server_config_path = server_config_path
+        self.pool_size = pool_size
+        self.pool_options = pool_options
+
+        # 后台事件循环线程
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="dispatch-runtime", daemon=True)
+        self._started = False
+
+        # 连接池只能在后台事件循环中创建和使用
+        self.pool: Optional[LocationAgentPool] = None
+
+        # 决策代理共享的LLM客户端
+        self.decision_llm = None
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def start(self):
+        """启动后台事件循环并预先建立MCP连接"""
+        if not self._started:
+            self._thread.start()
+            self.run(self._setup())
+            self._started = True
+        return self
+
+    async def _setup(self):
+        self.pool = LocationAgentPool(self.server_config_path, self.pool_size, **self.pool_options)
+        self.decision_llm = create_decision_llm()
+
+    def location_agent(self):
+        """从连接池独占租用一个LocationAgent（异步上下文管理器）"""
+        return self.pool.lease()
+
+    def new_decision_agent(self) -> DecisionAgent:
+        """创建复用共享LLM客户端的决策代理"""
+        return DecisionAgent(llm=self.decision_llm)
+
+    def submit(self, coro) -> Future:
+        """将协程提交到后台事件循环执行"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """提交协程并阻塞等待结果"""
+        return self.submit(coro).result(timeout)
+
+    def shutdown(self):
+        """关闭MCP连接并停止后台事件循环"""
+        if not self._started:
+            return
+        try:
+            self.run(self.pool.close(), timeout=self.pool.connect_timeout + 5)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
+            self._started = False
+
+# 便捷函数
+def create_dispatch_runtime(server_config_path="configs/servers_config.json", pool_size: int = 1) -> DispatchRuntime:
+    """创建并启动调度运行时"""
+    return DispatchRuntime(server_config_path, pool_size).start()
@@ -0,0 +1,211 @@
+import heapq
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.geo import EARTH_RADIUS_KM
+
+def _to_unit_vectors(lngs, lats) -> np.ndarray:
+    """经纬度转换为单位球面上的三维坐标，弦长与大圆距离单调对应，不受投影变形影响"""
+    lng = np.radians(np.asarray(lngs, dtype=np.float64))
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)))
+
+def _chord_to_km(chord):
+    """单位球弦长转换为大圆距离（公里）"""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0.0, 1.0))
+
+def _km_to_chord(km: float) -> float:
+    """大圆距离（公里）转换为单位球弦长"""
+    return 2 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2)
+
+class SpatialIndex:
+    """静态KD树空间索引，支持k近邻和半径查询
+
+    建树时按方差最大的维度取中位数切分，节点信息存放在数组中；
+    叶子节点内的点用NumPy批量计算距离。
+    """
+
+    def __init__(self, lngs, lats, leaf_size: int = 16):
+        self.points = _to_unit_vectors(lngs, lats)
+        self.size = len(self.points)
+        self.leaf_size = max(1, leaf_size)
+        self.order = np.arange(self.size)
+
+        # 节点数组：切分维度（叶子为-1）、切分值、左右子节点、叶子覆盖的order区间
+        self._dims: List[int] = []
+        self._values: List[float] = []
+        self._children: List[Tuple[int, int]] = []
+        self._ranges: List[Tuple[int, int]] = []
+        if self.size:
+            self._build(0, self.size)
+        # 叶子查询时按order排列的坐标，避免每次花式索引
+        self._ordered_points = self.points[self.order]
+
+    def _build(self, start: int, end: int) -> int:
+        node = len(self._dims)
+        self._dims.append(-1)
+        self._values.append(0.0)
+        self._children.append((-1, -1))
+        self._ranges.append((start, end))
+        if end - start <= self.leaf_size:
+            return node
+
+        indices = self.order[start:end]
+        coords = self.points[indices]
+        dim = int(np.argmax(coords.max(axis=0) - coords.min(axis=0)))
+        mid = (end - start) // 2
+        partition = np.argpartition(coords[:, dim], mid)
+        self.order[start:end] = indices[partition]
+
+        self._dims[node] = dim
+        self._values[node] = float(self.points[self.order[start + mid], dim])
+        left = self._build(start, start + mid)
+        right = self._build(start + mid, end)
+        self._children[node] = (left, right)
+        return node
+
+    def _leaf_distances(self, node: int, target: np.ndarray):
+        start, end = self._ranges[node]
+        diff = self._ordered_points[start:end] - target
+        return self.order[start:end], np.sqrt(np.einsum('ij,ij->i', diff, diff))
+
+    def nearest(self, lng: float, lat: float, k: int = 1) -> List[Tuple[int, float]]:
+        """距离最近的k个点
+
+        Returns:
+            list: [(点下标, 大圆距离公里), ...]，按距离升序
+        """
+        if not self.size or k <= 0:
+            return []
+        k = min(k, self.size)
+        target = _to_unit_vectors([lng], [lat])[0]
+        # 最大堆保存当前最近的k个点：(-弦长, 下标)
+        best: List[Tuple[float, int]] = []
+
+        def bound():
+            return -best[0][0] if len(best) == k else math.inf
+
+        stack = [(0, 0.0)]
+        while stack:
+            node, plane_distance = stack.pop()
+            if plane_distance > bound():
+                continue
+            dim = self._dims[node]
+            if dim < 0:
+                indices, chords = self._leaf_distances(node, target)
+                for index, chord in zip(indices.tolist(), chords.tolist()):
+                    if len(best) < k:
+                        heapq.heappush(best, (-chord, index))
+                    elif chord < -best[0][0]:
+                        heapq.heapreplace(best, (-chord, index))
+                continue
+            delta = target[dim] - self._values[node]
+            left, right = self._children[node]
+            near, far = (left, right) if delta < 0 else (right, left)
+            # 先压入远侧，保证近侧先被访问
+            stack.append((far, abs(delta)))
+            stack.append((near, plane_distance))
+
+        best.sort(key=lambda item: -item[0])
+        return [(index, float(_chord_to_km(-negative))) for negative, index in best]
+
+    def within(self, lng: float, lat: float, radius_km: float) -> List[Tuple[int, float]]:
+        """半径范围内的所有点
+
+        Returns:
+            list: [(点下标, 大圆距离公里), ...]，按距离升序
+        """
+        if not self.size or radius_km < 0:
+            return []
+        target = _to_unit_vectors([lng], [lat])[0]
+        radius = _km_to_chord(radius_km)
+        found = []
+
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            dim = self._dims[node]
+            if dim < 0:
+                indices, chords = self._leaf_distances(node, target)
+                mask = chords <= radius
+                found.extend(zip(indices[mask].tolist(), chords[mask].tolist()))
+                continue
+            delta = target[dim] - self._values[node]
+            left, right = self._children[node]
+            if delta - radius <= 0:
+                stack.append(left)
+            if delta + radius >= 0:
+                stack.append(right)
+
+        found.sort(key=lambda item: item[1])
+        return [(index, float(_chord_to_km(chord))) for index, chord in found]
+
+class WarehouseSpatialIndex:
+    """仓库空间索引，查询结果直接返回仓库记录"""
+
+    def __init__(self, warehouses, leaf_size: int = 16):
+        self.warehouses = list(warehouses)
+        self.index = SpatialIndex(
+            [float(warehouse['location']['longitude']) for warehouse in self.warehouses],
+            [float(warehouse['location']['latitude']) for warehouse in self.warehouses],
+            leaf_size=leaf_size
+        )
+
+    def __len__(self):
+        return len(self.warehouses)
+
+    def nearest(self, lng: float, lat: float, k: int = 1) -> List[Tuple[dict, float]]:
+        """最近的k个仓库，返回 [(仓库, 直线距离公里), ...]"""
+        return [(self.warehouses[index], km) for index, km in self.index.nearest(lng, lat, k)]
+
+    def within(self, lng: float, lat: float, radius_km: float) -> List[Tuple[dict, float]]:
+        """半径范围内的仓库，返回 [(仓库, 直线距离公里), ...]"""
+        return [(self.warehouses[index], km) for index, km in self.index.within(lng, lat, radius_km)]
+
+    def nearest_indices(self, lng: float, lat: float, k: int = 1) -> List[int]:
+        """最近的k个仓库在原列表中的下标"""
+        return [index for index, _ in self.index.nearest(lng, lat, k)]
+
+def warehouse_data_version(warehouses) -> int:
+    """仓库数据版本：仓库ID和坐标不变时索引可以复用"""
+    return hash(tuple(
+        (str(warehouse.get('id')), float(warehouse['location']['longitude']), float(warehouse['location']['latitude']))
+        for warehouse in warehouses
+    ))
+
+_INDEX_CACHE: Dict[int, WarehouseSpatialIndex] = {}
+
+def get_warehouse_index(warehouses, max_versions: int = 4) -> WarehouseSpatialIndex:
+    """按数据版本缓存的仓库空间索引，每个版本只建一次"""
+    version = warehouse_data_version(warehouses)
+    index = _INDEX_CACHE.get(version)
+    if index is None:
+        if len(_INDEX_CACHE) >= max_versions:
+            _INDEX_CACHE.pop(next(iter(_INDEX_CACHE)))
+        index = _INDEX_CACHE[version] = WarehouseSpatialIndex(warehouses)
+    return index
+
+def select_candidate_indices(warehouses, coordinates, k: Optional[int] = None,
+                             radius_km: Optional[float] = None) -> List[int]:
+    """路线查询前的候选仓库筛选：各起点的k近邻和半径范围内仓库的并集（按原顺序返回下标）
+
+    Args:
+        coordinates: 起点 (经度, 纬度) 列表，None 表示坐标未知
+        k: 每个起点保留的最近仓库数
+        radius_km: 半径范围（公里）
+    """
+    origins = [coords for coords in coordinates if coords is not None]
+    if not origins or (k is None and radius_km is None):
+        return list(range(len(warehouses)))
+
+    index = get_warehouse_index(warehouses).index
+    selected = set()
+    for lng, lat in origins:
+        if k is not None:
+            selected.update(i for i, _ in index.nearest(lng, lat, k))
+        if radius_km is not None:
+            selected.update(i for i, _ in index.within(lng, lat, radius_km))
+    return sorted(selected)
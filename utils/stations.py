@@ -0,0 +1,201 @@
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.geo import parse_coordinates
+from utils.tool_results import parse_route_text
+
+# 默认的出发地点登记表（由 scripts/json_to_xlsx_converter.py 维护）
+DEFAULT_STATIONS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'stations.json'
+)
+
+def _normalize(name: str) -> str:
+    """地点名称规范化：去掉所有空白"""
+    return ''.join(str(name).split())
+
+def _warehouse_coordinates(warehouse) -> str:
+    return f"{warehouse['location']['longitude']},{warehouse['location']['latitude']}"
+
+def _same_point(a, b) -> bool:
+    """两个"经度,纬度"字符串是否为同一点（忽略格式差异）"""
+    a, b = parse_coordinates(a), parse_coordinates(b)
+    return a is not None and b is not None and abs(a[0] - b[0]) < 1e-6 and abs(a[1] - b[1]) < 1e-6
+
+class StationRegistry:
+    """已知出发地点（消防站）登记表及其到各仓库的预计算行驶距离/时间
+
+    文件结构：
+        {
+          "stations": [{"name": "成都消防", "aliases": [...], "coordinates": "经度,纬度"}],
+          "routes": {"成都消防": {"仓库ID": {"coordinates": "仓库经度,纬度", "distance": "..", "duration": ".."}}},
+          "updated": "..."
+        }
+    仓库坐标与记录时不同（仓库搬迁）的路线视为失效。
+    """
+
+    def __init__(self, stations: Optional[List[dict]] = None,
+                 routes: Optional[Dict[str, Dict[str, dict]]] = None, path=None):
+        self.path = path
+        self.stations: List[dict] = []
+        self.routes: Dict[str, Dict[str, dict]] = {}
+        self._by_key: Dict[str, dict] = {}
+        for station in stations or []:
+            self.add_station(station['name'], station['coordinates'], station.get('aliases', ()))
+        for name, table in (routes or {}).items():
+            if name in self.routes:
+                self.routes[name].update(table)
+
+    def __len__(self):
+        return len(self.stations)
+
+    @classmethod
+    def load(cls, path=None) -> "StationRegistry":
+        """读取登记表，文件不存在时返回空登记表"""
+        path = path or DEFAULT_STATIONS_PATH
+        if not os.path.exists(path):
+            return cls(path=path)
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data.get('stations', []), data.get('routes', {}), path=path)
+
+    def save(self, path=None):
+        """写出登记表（先写临时文件再替换，读取方不会看到写了一半的文件）"""
+        path = path or self.path or DEFAULT_STATIONS_PATH
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        data = {
+            'stations': self.stations,
+            'routes': self.routes,
+            'updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.path = path
+
+    def add_station(self, name: str, coordinates: str, aliases: Iterable[str] = ()) -> dict:
+        """登记出发地点；名称（或别名）已登记时更新该地点的坐标和别名（坐标变化时清除其路线）
+
+        name 先按已登记的名称和别名解析，别名不会再被登记为另一个地点；
+        别名已属于其他地点时抛出 ValueError。
+        """
+        if parse_coordinates(coordinates) is None:
+            raise ValueError(f"出发地点 {name} 的坐标格式无效: {coordinates!r}（应为 经度,纬度）")
+        station = self._by_key.get(_normalize(name))
+        for alias in aliases:
+            owner = self._by_key.get(_normalize(alias))
+            if owner is not None and owner is not station:
+                raise ValueError(f"别名 {alias} 已属于出发地点 {owner['name']}")
+        if station is None:
+            station = {'name': name, 'aliases': [], 'coordinates': coordinates}
+            self.stations.append(station)
+            self.routes[station['name']] = {}
+        elif not _same_point(station['coordinates'], coordinates):
+            station['coordinates'] = coordinates
+            self.routes[station['name']] = {}
+        for alias in aliases:
+            if alias not in station['aliases'] and _normalize(alias) != _normalize(station['name']):
+                station['aliases'].append(alias)
+        for key in [station['name'], *station['aliases']]:
+            self._by_key[_normalize(key)] = station
+        return station
+
+    def find(self, location) -> Optional[dict]:
+        """按名称、别名或坐标查找已登记的出发地点"""
+        if not isinstance(location, str):
+            return None
+        station = self._by_key.get(_normalize(location))
+        if station is not None:
+            return station
+        if parse_coordinates(location) is not None:
+            for station in self.stations:
+                if _same_point(station['coordinates'], location):
+                    return station
+        return None
+
+    def route(self, station: dict, warehouse) -> Optional[dict]:
+        """预计算的路线，没有记录或仓库坐标已变化时返回None"""
+        entry = self.routes.get(station['name'], {}).get(str(warehouse['id']))
+        if entry is None or not _same_point(entry['coordinates'], _warehouse_coordinates(warehouse)):
+            return None
+        return entry
+
+    def set_route(self, station: dict, warehouse, distance: str, duration: str,
+                  distance_m: Optional[float] = None, duration_s: Optional[float] = None):
+        """记录出发地点到仓库的实测路线（展示文本及米、秒数值）"""
+        self.routes.setdefault(station['name'], {})[str(warehouse['id'])] = {
+            'coordinates': _warehouse_coordinates(warehouse),
+            'distance': distance,
+            'duration': duration,
+            'distance_m': distance_m,
+            'duration_s': duration_s
+        }
+
+    def missing_routes(self, warehouses) -> List[Tuple[dict, dict]]:
+        """尚未预计算（或已失效）的 (出发地点, 仓库) 组合"""
+        return [
+            (station, warehouse)
+            for station in self.stations
+            for warehouse in warehouses
+            if self.route(station, warehouse) is None
+        ]
+
+    def covers(self, location, warehouses) -> bool:
+        """location是否为已登记地点，且到所有仓库的路线都已预计算"""
+        station = self.find(location)
+        return station is not None and all(self.route(station, warehouse) is not None for warehouse in warehouses)
+
+    def route_result(self, station: dict, warehouse) -> Optional[dict]:
+        """预计算路线转换为与 calculate_single_warehouse_distance 相同结构的结果（标记precomputed）"""
+        entry = self.route(station, warehouse)
+        if entry is None:
+            return None
+        warehouse_location = _warehouse_coordinates(warehouse)
+        warehouse_address = warehouse['location']['address']
+        meters, seconds = entry.get('distance_m'), entry.get('duration_s')
+        if meters is None or seconds is None:
+            # 早期的登记表只记录了文本
+            parsed = parse_route_text(f"{entry['distance']} {entry['duration']}")
+            meters, seconds = meters if meters is not None else parsed[0], seconds if seconds is not None else parsed[1]
+        return {
+            'warehouse_name': warehouse['name'],
+            'warehouse_address': warehouse_address,
+            'warehouse_coordinates': warehouse_location,
+            'origin': station['coordinates'],
+            'destination': f"{warehouse_address} ({warehouse_location})",
+            'distance': entry['distance'],
+            'duration': entry['duration'],
+            'distance_m': meters,
+            'duration_s': seconds,
+            'success': True,
+            'attempts': 0,
+            'precomputed': True
+        }
+
+_registry_lock = threading.Lock()
+_registry_cache: Dict[str, Tuple[Optional[float], StationRegistry]] = {}
+
+def get_station_registry(path=None) -> StationRegistry:
+    """进程内共享的登记表，文件修改后自动重新读取"""
+    path = path or DEFAULT_STATIONS_PATH
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    with _registry_lock:
+        cached = _registry_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            registry = StationRegistry.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"读取出发地点登记表失败（{path}）: {e}")
+            registry = StationRegistry(path=path)
+        _registry_cache[path] = (mtime, registry)
+        return registry
@@ -0,0 +1,181 @@
+import heapq
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from utils.robustness import RouteLegs
+
+# 每件物资的装载用时（分钟，按一名队员计），未列出的类别使用 DEFAULT_LOADING_MINUTES
+LOADING_MINUTES_PER_UNIT = {
+    '灭火设备': 0.5,
+    '救援装备': 0.4,
+    '医疗用品': 0.2,
+    '通信设备': 0.3,
+    '疏散设备': 0.3,
+    '重型装备': 3.0,
+    '后勤保障': 0.2,
+    '指挥中心': 1.0
+}
+DEFAULT_LOADING_MINUTES = 0.5
+
+# 事件类型；同一时刻先处理装载完成（释放装卸位），再处理到达
+EVENT_DEPART, EVENT_ARRIVE_WAREHOUSE, EVENT_QUEUE, EVENT_LOAD_START, EVENT_LOAD_FINISH, EVENT_ARRIVE_INCIDENT = (
+    '出发', '到达仓库', '排队等待', '开始装载', '完成装载', '到达现场'
+)
+_LOADED, _ARRIVE = 0, 1
+
+@dataclass(slots=True)
+class Truck:
+    """车辆：crew 名队员（参与装载），start_minutes 为出发时刻（相对T+0）"""
+    name: str
+    crew: int = 5
+    start_minutes: float = 0.0
+
+@dataclass(slots=True)
+class TimelineResult:
+    """模拟结果：各车到场时刻、全部到场时刻、各类物资全部到场时刻、排队总时长及事件时间线"""
+    arrivals: List[Optional[float]]
+    makespan: float
+    first_arrival: float
+    category_arrivals: Dict[str, float]
+    wait_minutes: float
+    events: List[Tuple[float, int, str, Optional[int], str]] = field(default_factory=list)
+
+class FetchSimulator:
+    """多车取物资离散事件模拟
+
+    每辆车从出发地依次前往分配给它的仓库，在仓库占用一个装卸位装载后前往下一仓库或事发地；
+    装卸位已满时按到达顺序排队。装载用时 = 每站固定用时 + Σ(件数 × 每件用时) ÷ 参与装载人数。
+    行驶时间取自 RouteLegs（出发地→仓库、仓库→仓库、仓库→事发地），不经过仓库的车辆使用 direct_minutes。
+
+    allocation[i] 为第i辆车的停靠列表 [(仓库下标, {物资类别: 件数}), ...]。
+    """
+
+    def __init__(self, legs: RouteLegs, docks=2, loading_minutes: Optional[Mapping[str, float]] = None,
+                 setup_minutes: float = 3.0, max_loaders: int = 4, direct_minutes: Optional[float] = None):
+        self.legs = legs
+        self.docks = [docks] * len(legs) if isinstance(docks, int) else list(docks)
+        self.loading_minutes = dict(LOADING_MINUTES_PER_UNIT if loading_minutes is None else loading_minutes)
+        self.setup_minutes = setup_minutes
+        self.max_loaders = max_loaders
+        self.direct_minutes = direct_minutes
+        # 热点路径中直接索引Python列表，比逐个访问NumPy标量快得多
+        self._departure = legs.departure.tolist()
+        self._incident = legs.incident.tolist()
+        self._between = legs.between.tolist()
+
+    def loading_time(self, truck: Truck, items: Mapping[str, int]) -> float:
+        work = sum(quantity * self.loading_minutes.get(category, DEFAULT_LOADING_MINUTES)
+                   for category, quantity in items.items())
+        return self.setup_minutes + work / max(1, min(truck.crew, self.max_loaders))
+
+    def run(self, trucks: Sequence[Truck], allocation: Sequence[Sequence[Tuple[int, Mapping[str, int]]]],
+            record: bool = True) -> TimelineResult:
+        """模拟一个分配方案；record=False 时不记录事件时间线（搜索循环中使用）"""
+        events = []
+        arrivals: List[Optional[float]] = [None] * len(trucks)
+        free = list(self.docks)
+        queues: Dict[int, List[int]] = {}
+        queued_at: Dict[int, float] = {}
+        position = [0] * len(trucks)
+        wait = 0.0
+        heap = []
+        sequence = 0
+
+        def leave(now, index, warehouse):
+            """离开仓库（或出发地）前往下一站"""
+            nonlocal sequence
+            stops = allocation[index]
+            step = position[index]
+            if step < len(stops):
+                target = stops[step][0]
+                minutes = self._departure[target] if warehouse is None else self._between[warehouse][target]
+                heapq.heappush(heap, (now + minutes, _ARRIVE, sequence, index, target))
+            else:
+                minutes = self.direct_minutes if warehouse is None else self._incident[warehouse]
+                if minutes is None:
+                    raise ValueError(f"{trucks[index].name} 没有分配仓库，需要提供出发地到事发地的时间")
+                heapq.heappush(heap, (now + minutes, _ARRIVE, sequence, index, None))
+            sequence += 1
+
+        def start_loading(now, index, warehouse):
+            nonlocal sequence
+            items = allocation[index][position[index]][1]
+            if record:
+                events.append((now, index, EVENT_LOAD_START, warehouse, _describe_items(items)))
+            heapq.heappush(heap, (now + self.loading_time(trucks[index], items), _LOADED, sequence, index, warehouse))
+            sequence += 1
+
+        for index, truck in enumerate(trucks):
+            if record:
+                events.append((truck.start_minutes, index, EVENT_DEPART, None, ''))
+            leave(truck.start_minutes, index, None)
+
+        while heap:
+            now, kind, _, index, warehouse = heapq.heappop(heap)
+            if kind == _LOADED:
+                if record:
+                    events.append((now, index, EVENT_LOAD_FINISH, warehouse, ''))
+                position[index] += 1
+                waiting = queues.get(warehouse)
+                if waiting:
+                    following = waiting.pop(0)
+                    wait += now - queued_at.pop(following)
+                    start_loading(now, following, warehouse)
+                else:
+                    free[warehouse] += 1
+                leave(now, index, warehouse)
+            elif warehouse is None:
+                arrivals[index] = now
+                if record:
+                    events.append((now, index, EVENT_ARRIVE_INCIDENT, None, ''))
+            else:
+                if record:
+                    events.append((now, index, EVENT_ARRIVE_WAREHOUSE, warehouse, ''))
+                if free[warehouse] > 0:
+                    free[warehouse] -= 1
+                    start_loading(now, index, warehouse)
+                else:
+                    queues.setdefault(warehouse, []).append(index)
+                    queued_at[index] = now
+                    if record:
+                        events.append((now, index, EVENT_QUEUE, warehouse, ''))
+
+        category_arrivals: Dict[str, float] = {}
+        for index, stops in enumerate(allocation):
+            for _, items in stops:
+                for category, quantity in items.items():
+                    if quantity > 0 and arrivals[index] is not None:
+                        category_arrivals[category] = max(category_arrivals.get(category, 0.0), arrivals[index])
+        reached = [arrival for arrival in arrivals if arrival is not None]
+        return TimelineResult(
+            arrivals=arrivals,
+            makespan=max(reached, default=0.0),
+            first_arrival=min(reached, default=0.0),
+            category_arrivals=category_arrivals,
+            wait_minutes=wait,
+            events=events
+        )
+
+def _describe_items(items: Mapping[str, int]) -> str:
+    return '、'.join(f"{category}{quantity}件" for category, quantity in items.items() if quantity > 0)
+
+_EVENT_TEXT = {
+    EVENT_DEPART: "{truck}出发",
+    EVENT_ARRIVE_WAREHOUSE: "{truck}到达{place}",
+    EVENT_QUEUE: "{truck}在{place}排队等待装卸位",
+    EVENT_LOAD_START: "{truck}在{place}开始装载",
+    EVENT_LOAD_FINISH: "{truck}完成装载，驶离{place}",
+    EVENT_ARRIVE_INCIDENT: "{truck}到达现场"
+}
+
+def format_timeline(result: TimelineResult, trucks: Sequence[Truck], names: Sequence[str]) -> str:
+    """时间线转换为 "T+X分钟：..." 文本（分钟保留一位小数）"""
+    lines = []
+    for minutes, index, kind, warehouse, detail in result.events:
+        text = _EVENT_TEXT[kind].format(truck=trucks[index].name, place=names[warehouse] if warehouse is not None else '')
+        if detail:
+            text += f"（{detail}）"
+        lines.append(f"- T+{minutes:.1f}分钟：{text}")
+    lines.append(f"- 首车到场 T+{result.first_arrival:.1f}分钟，全部到场 T+{result.makespan:.1f}分钟"
+                 + (f"，仓库排队共{result.wait_minutes:.1f}分钟" if result.wait_minutes > 0 else ''))
+    return "\n".join(lines)
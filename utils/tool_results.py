@@ -0,0 +1,181 @@
+import json
+import re
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# 交给模型的单个工具结果的最大字符数（超出部分截断）
+MAX_TOOL_RESULT_CHARS = 1500
+
+def tool_result_text(result) -> str:
+    """MCP CallToolResult 中的文本内容（多段文本按行拼接）"""
+    content = getattr(result, "content", None)
+    if not content:
+        return str(result)
+    parts = [getattr(item, "text", None) for item in content]
+    return "\n".join(part for part in parts if part is not None) or str(result)
+
+def _number(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _route_summary(distance, duration) -> Dict[str, Any]:
+    """高德返回的 米/秒 数值，附带便于模型转述的 公里/分钟 文本"""
+    summary: Dict[str, Any] = {}
+    meters, seconds = _number(distance), _number(duration)
+    if meters is not None:
+        summary["distance_m"] = round(meters)
+        summary["distance"] = f"{meters / 1000:.1f}公里"
+    if seconds is not None:
+        summary["duration_s"] = round(seconds)
+        summary["duration"] = f"{max(1, round(seconds / 60))}分钟"
+    return summary
+
+def _extract_geo(payload: dict) -> dict:
+    keys = ("formatted_address", "province", "city", "district", "location", "level")
+    results = payload.get("results") or payload.get("geocodes") or []
+    return {"results": [{key: item.get(key) for key in keys if item.get(key)} for item in results[:3]]}
+
+def _extract_regeocode(payload: dict) -> dict:
+    keys = ("formatted_address", "province", "city", "district")
+    source = payload.get("regeocode", payload)
+    return {key: source.get(key) for key in keys if source.get(key)}
+
+def _extract_direction(payload: dict) -> dict:
+    """驾车/步行/骑行路线：只保留起终点和各方案的距离、时间，去掉逐段导航和坐标串"""
+    route = payload.get("route", payload)
+    paths = route.get("paths") or []
+    extracted = {"origin": route.get("origin"), "destination": route.get("destination")}
+    extracted["paths"] = [_route_summary(path.get("distance"), path.get("duration")) for path in paths[:2]]
+    return {key: value for key, value in extracted.items() if value}
+
+def _extract_transit(payload: dict) -> dict:
+    route = payload.get("route", payload)
+    transits = []
+    for transit in (route.get("transits") or [])[:2]:
+        summary = _route_summary(transit.get("distance") or route.get("distance"), transit.get("duration"))
+        walking = _number(transit.get("walking_distance"))
+        if walking is not None:
+            summary["walking_distance_m"] = round(walking)
+        transits.append(summary)
+    extracted = {"origin": route.get("origin"), "destination": route.get("destination"), "transits": transits}
+    return {key: value for key, value in extracted.items() if value}
+
+def _extract_distance(payload: dict) -> dict:
+    results = payload.get("results") or []
+    return {"results": [
+        {"origin_id": item.get("origin_id"), **_route_summary(item.get("distance"), item.get("duration"))}
+        for item in results[:10]
+    ]}
+
+def _extract_pois(payload: dict) -> dict:
+    keys = ("name", "address", "location", "typecode", "id")
+    return {"pois": [{key: poi.get(key) for key in keys if poi.get(key)} for poi in (payload.get("pois") or [])[:5]]}
+
+def _extract_detail(payload: dict) -> dict:
+    keys = ("name", "address", "location", "city", "type")
+    return {key: payload.get(key) for key in keys if payload.get(key)}
+
+# 按工具名称提取模型需要的字段；未列出的工具保留原文（受长度上限约束）
+TOOL_EXTRACTORS: Dict[str, Callable[[dict], dict]] = {
+    "maps_geo": _extract_geo,
+    "maps_regeocode": _extract_regeocode,
+    "maps_direction_driving": _extract_direction,
+    "maps_direction_walking": _extract_direction,
+    "maps_bicycling": _extract_direction,
+    "maps_direction_bicycling": _extract_direction,
+    "maps_direction_transit_integrated": _extract_transit,
+    "maps_distance": _extract_distance,
+    "maps_text_search": _extract_pois,
+    "maps_around_search": _extract_pois,
+    "maps_search_detail": _extract_detail
+}
+
+def _truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}…（已截断，原文{len(text)}字符）"
+
+def compact_tool_result(name: str, result, max_chars: int = MAX_TOOL_RESULT_CHARS) -> Tuple[str, str]:
+    """把MCP工具结果压缩为交给模型的简短文本
+
+    已知工具的JSON结果只保留距离、时间、地址、坐标等字段（紧凑JSON），其他结果保留原文；
+    两种情况都截断到max_chars。
+
+    Returns:
+        tuple: (交给模型的文本, 原始文本) — 原始文本只用于调试，不进入对话历史
+    """
+    raw = tool_result_text(result)
+    if getattr(result, "isError", False):
+        return _truncate(f"Error: {raw}", max_chars), raw
+    extractor = TOOL_EXTRACTORS.get(name)
+    if extractor is not None:
+        try:
+            payload = json.loads(raw)
+            if isinstance(payload, dict):
+                compact = json.dumps(extractor(payload), ensure_ascii=False, separators=(",", ":"))
+                return _truncate(compact, max_chars), raw
+        except (ValueError, TypeError, AttributeError):
+            pass
+    return _truncate(raw, max_chars), raw
+
+# 返回路线距离和时间的工具：查询路线时调用成功即可结束工具循环，直接取结构化数值
+ROUTE_TOOLS = frozenset({
+    "maps_direction_driving", "maps_direction_walking", "maps_bicycling", "maps_direction_bicycling",
+    "maps_direction_transit_integrated", "maps_distance"
+})
+
+def route_measurement(name: str, raw: str) -> Optional[Tuple[float, float]]:
+    """路线工具原始JSON结果中第一个方案的 (距离米, 时间秒)，不是路线结果或缺少数值时返回None"""
+    if name not in ROUTE_TOOLS:
+        return None
+    try:
+        payload = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(payload, dict):
+        return None
+    route = payload.get("route", payload)
+    options = route.get("paths") or route.get("transits") or payload.get("results") or []
+    if not options:
+        return None
+    option = options[0]
+    meters = _number(option.get("distance") or route.get("distance"))
+    seconds = _number(option.get("duration"))
+    if meters is None or seconds is None:
+        return None
+    return meters, seconds
+
+# 自由文本（模型回复、预计算路线表中的文本）的距离和时间，只在没有结构化数值时使用
+_DISTANCE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(公里|千米|km|米|m(?![a-z]))", re.IGNORECASE)
+_DURATION_RE = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(?:个)?(?:小时|hours?|h(?![a-z]))\s*(?:(\d+(?:\.\d+)?)\s*(?:分钟|分|min(?:ute)?s?))?"
+    r"|(\d+(?:\.\d+)?)\s*(?:分钟|min(?:ute)?s?)"
+    r"|(\d+(?:\.\d+)?)\s*(?:秒|sec(?:ond)?s?|s(?![a-z]))",
+    re.IGNORECASE
+)
+
+def parse_route_text(text) -> Tuple[Optional[float], Optional[float]]:
+    """从文本中取第一个距离和第一个时间，返回 (距离米, 时间秒)，取不到的为None"""
+    text = str(text or "")
+    meters = seconds = None
+    match = _DISTANCE_RE.search(text)
+    if match:
+        value = float(match.group(1))
+        meters = value if match.group(2).lower() in ("米", "m") else value * 1000
+    match = _DURATION_RE.search(text)
+    if match:
+        hours, hour_minutes, minutes, secs = match.groups()
+        if hours is not None:
+            seconds = float(hours) * 3600 + float(hour_minutes or 0) * 60
+        elif minutes is not None:
+            seconds = float(minutes) * 60
+        else:
+            seconds = float(secs)
+    return meters, seconds
+
+def format_route(meters: Optional[float], seconds: Optional[float]) -> Tuple[str, str]:
+    """距离、时间的展示文本（"12.35公里"、"26分钟"）"""
+    distance = f"{meters / 1000:.2f}公里" if meters is not None else "距离未知"
+    duration = f"{round(seconds / 60)}分钟" if seconds is not None else "时间未知"
+    return distance, duration
@@ -1,10 +1,7 @@
 import json
-import pandas as pd
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
-from openpyxl.utils.dataframe import dataframe_to_rows
 import os
-import json
+
+# pandas 导入较慢，只在读取Excel的函数中导入
 
 def read_warehouse_data_from_xlsx(xlsx_file_path):
     """
@@ -16,6 +13,8 @@ def read_warehouse_data_from_xlsx(xlsx_file_path):
     Returns:
         dict: 包含仓库信息的字典，格式化为大模型友好的结构
     """
+    import pandas as pd
+    
     try:
         # 读取各个工作表
         basic_info_df = pd.read_excel(xlsx_file_path, sheet_name='仓库基本信息')
@@ -109,6 +108,33 @@ def read_warehouse_data_from_xlsx(xlsx_file_path):
         print(f"读取Excel文件时发生错误: {e}")
         return None
 
+def load_warehouse_data(xlsx_file_path, columnar_dir=None):
+    """
+    读取仓库数据：列式数据存在且不早于Excel文件时内存映射读取，否则读取Excel
+    
+    Args:
+        xlsx_file_path (str): Excel文件路径
+        columnar_dir (str): 列式数据目录，默认为Excel文件同目录下的 columnar
+    
+    Returns:
+        dict: 与 read_warehouse_data_from_xlsx 相同的结构
+    """
+    if columnar_dir is None:
+        columnar_dir = os.path.join(os.path.dirname(os.path.abspath(xlsx_file_path)), 'columnar')
+    
+    from utils.columnar import METADATA_FILE, has_columnar_tables
+    
+    # metadata.json 在所有表写完后才写出，以它的修改时间判断列式数据是否过期
+    metadata_path = os.path.join(columnar_dir, METADATA_FILE)
+    if has_columnar_tables(columnar_dir) and os.path.exists(metadata_path) and (
+            not os.path.exists(xlsx_file_path) or os.path.getmtime(metadata_path) >= os.path.getmtime(xlsx_file_path)):
+        from utils.columnar import read_warehouse_data_from_columnar
+        warehouse_data = read_warehouse_data_from_columnar(columnar_dir)
+        if warehouse_data is not None:
+            return warehouse_data
+        print("列式数据读取失败，改为读取Excel文件")
+    return read_warehouse_data_from_xlsx(xlsx_file_path)
+
 def format_warehouse_data_for_llm(warehouse_data):
     """
     将仓库数据格式化为更适合大模型理解的文本格式
@@ -182,220 +208,176 @@ def format_warehouse_data_for_llm(warehouse_data):
     
     return warehouse_text, distance_text
 
-def convert_json_to_xlsx(json_file_path, xlsx_file_path):
-    """
-    将JSON格式的仓库数据转换为Excel格式
+# resource.json 中物资类别键对应的中文名称
+RESOURCE_CATEGORY_NAMES = {
+    'fire_extinguishing': '灭火设备',
+    'rescue_equipment': '救援装备',
+    'medical_supplies': '医疗用品',
+    'communication': '通信设备',
+    'evacuation': '疏散设备',
+    'heavy_equipment': '重型装备',
+    'logistics': '后勤保障',
+    'command_center': '指挥中心'
+}
+
+BASIC_INFO_HEADER = ['仓库ID', '仓库名称', '地址', '经度', '纬度', '城市', '行政区',
+                     '总面积(平方米)', '可用面积(平方米)', '最大载重(吨)', '负责人', '联系电话', '应急电话']
+RESOURCE_HEADER = ['仓库ID', '仓库名称', '物资类别', '物资名称', '数量', '单位', '规格说明']
+SUMMARY_HEADER = ['物资名称', '物资类别', '总数量', '单位']
+DISTANCE_HEADER = ['起始仓库ID', '起始仓库名称', '目标仓库ID', '目标仓库名称', '距离', '预计时间',
+                   '距离(公里)', '时间(分钟)', '计算状态', '尝试次数']
+
+def write_warehouse_xlsx(warehouses, metadata, xlsx_file_path, distances=None, columnar_dir=None):
     """
-    # 读取JSON文件
-    with open(json_file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    # 创建Excel工作簿
-    wb = Workbook()
+    将仓库数据流式写出为Excel文件
     
-    # 删除默认工作表
-    wb.remove(wb.active)
+    只遍历一次仓库数据：基本信息和物资明细逐行写出，汇总表在同一遍中累加，
+    不构建中间DataFrame，列宽在写行时同步统计。
     
-    # 1. 创建仓库基本信息工作表
-    ws_basic = wb.create_sheet("仓库基本信息")
-    basic_data = []
+    Args:
+        warehouses: 仓库字典的可迭代对象（resource.json 中 warehouses 的结构），只遍历一次
+        metadata: resource.json 中的 metadata，也可以是返回metadata的函数
+                  （流式读取时metadata可能位于warehouses之后，遍历完仓库后才调用）
+        distances: 可选的仓库间距离结果列表（calculate_all_warehouse_distances 的返回值）
+        columnar_dir: 可选，同时在该目录下写出列式数据（Arrow/Parquet，需要pyarrow），
+                      各表与工作表内容相同，在同一遍中写出
     
-    for warehouse in data['warehouses']:
-        basic_info = {
-            '仓库ID': warehouse['id'],
-            '仓库名称': warehouse['name'],
-            '地址': warehouse['location']['address'],
-            '经度': warehouse['location']['longitude'],
-            '纬度': warehouse['location']['latitude'],
-            '城市': warehouse['location']['city'],
-            '行政区': warehouse['location']['district'],
-            '总面积(平方米)': warehouse['capacity']['total_area'],
-            '可用面积(平方米)': warehouse['capacity']['available_area'],
-            '最大载重(吨)': warehouse['capacity']['max_weight'],
-            '负责人': warehouse['contact']['manager'],
-            '联系电话': warehouse['contact']['phone'],
-            '应急电话': warehouse['contact']['emergency_phone']
+    Returns:
+        dict: 转换统计（仓库数量、物资条目总数、物资种类数、工作表数量）
+    """
+    from utils.xlsx_writer import STYLE_HEADER, STYLE_KEY, StreamingXlsxWriter
+    
+    columnar = {}
+    if columnar_dir:
+        from utils.columnar import ColumnarTableWriter, remove_table
+        columnar = {
+            name: ColumnarTableWriter(columnar_dir, name)
+            for name in (['basic_info', 'inventory', 'summary'] + (['distances'] if distances else []))
         }
-        basic_data.append(basic_info)
-    
-    df_basic = pd.DataFrame(basic_data)
-    
-    # 将数据写入工作表
-    for r in dataframe_to_rows(df_basic, index=False, header=True):
-        ws_basic.append(r)
-    
-    # 设置标题样式
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    
-    for cell in ws_basic[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal="center")
-    
-    # 自动调整列宽
-    for column in ws_basic.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws_basic.column_dimensions[column_letter].width = adjusted_width
-    
-    # 2. 创建物资详细信息工作表
-    ws_resources = wb.create_sheet("物资详细信息")
-    resources_data = []
-    
-    for warehouse in data['warehouses']:
-        warehouse_id = warehouse['id']
-        warehouse_name = warehouse['name']
+        if not distances:
+            remove_table(columnar_dir, 'distances')
+    
+    with StreamingXlsxWriter(xlsx_file_path) as writer:
+        # 1. 仓库基本信息 / 2. 物资详细信息 / 3. 物资统计汇总（工作表顺序与原先一致）
+        ws_basic = writer.add_sheet("仓库基本信息", max_width=50)
+        ws_resources = writer.add_sheet("物资详细信息", max_width=50)
+        ws_summary = writer.add_sheet("物资统计汇总", max_width=30)
+        ws_basic.append(BASIC_INFO_HEADER, style=STYLE_HEADER)
+        ws_resources.append(RESOURCE_HEADER, style=STYLE_HEADER)
+        ws_summary.append(SUMMARY_HEADER, style=STYLE_HEADER)
         
-        for category, items in warehouse['resources'].items():
-            category_name = {
-                'fire_extinguishing': '灭火设备',
-                'rescue_equipment': '救援装备',
-                'medical_supplies': '医疗用品',
-                'communication': '通信设备',
-                'evacuation': '疏散设备',
-                'heavy_equipment': '重型装备',
-                'logistics': '后勤保障',
-                'command_center': '指挥中心'
-            }.get(category, category)
-            
-            for item_key, item_info in items.items():
-                resource_info = {
-                    '仓库ID': warehouse_id,
-                    '仓库名称': warehouse_name,
-                    '物资类别': category_name,
-                    '物资名称': item_info['type'],
-                    '数量': item_info['quantity'],
-                    '单位': item_info['unit'],
-                    '规格说明': item_info['specification']
-                }
-                resources_data.append(resource_info)
-    
-    df_resources = pd.DataFrame(resources_data)
-    
-    # 将数据写入工作表
-    for r in dataframe_to_rows(df_resources, index=False, header=True):
-        ws_resources.append(r)
-    
-    # 设置标题样式
-    for cell in ws_resources[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal="center")
-    
-    # 自动调整列宽
-    for column in ws_resources.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws_resources.column_dimensions[column_letter].width = adjusted_width
-    
-    # 3. 创建物资统计汇总工作表
-    ws_summary = wb.create_sheet("物资统计汇总")
-    
-    # 按物资类别统计总数量
-    summary_data = {}
-    for warehouse in data['warehouses']:
-        for category, items in warehouse['resources'].items():
-            category_name = {
-                'fire_extinguishing': '灭火设备',
-                'rescue_equipment': '救援装备',
-                'medical_supplies': '医疗用品',
-                'communication': '通信设备',
-                'evacuation': '疏散设备',
-                'heavy_equipment': '重型装备',
-                'logistics': '后勤保障',
-                'command_center': '指挥中心'
-            }.get(category, category)
+        summary_data = {}
+        warehouse_count = 0
+        for warehouse in warehouses:
+            warehouse_count += 1
+            location = warehouse['location']
+            capacity = warehouse['capacity']
+            contact = warehouse['contact']
+            basic_row = [
+                warehouse['id'], warehouse['name'], location['address'],
+                location['longitude'], location['latitude'], location['city'], location['district'],
+                capacity['total_area'], capacity['available_area'], capacity['max_weight'],
+                contact['manager'], contact['phone'], contact['emergency_phone']
+            ]
+            ws_basic.append(basic_row)
+            if columnar:
+                columnar['basic_info'].append(basic_row)
             
-            for item_key, item_info in items.items():
-                item_name = item_info['type']
-                quantity = item_info['quantity']
-                unit = item_info['unit']
-                
-                if item_name not in summary_data:
-                    summary_data[item_name] = {
-                        '物资名称': item_name,
-                        '物资类别': category_name,
-                        '总数量': 0,
-                        '单位': unit
-                    }
-                summary_data[item_name]['总数量'] += quantity
-    
-    df_summary = pd.DataFrame(list(summary_data.values()))
-    df_summary = df_summary.sort_values(['物资类别', '物资名称'])
-    
-    # 将数据写入工作表
-    for r in dataframe_to_rows(df_summary, index=False, header=True):
-        ws_summary.append(r)
-    
-    # 设置标题样式
-    for cell in ws_summary[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal="center")
-    
-    # 自动调整列宽
-    for column in ws_summary.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 30)
-        ws_summary.column_dimensions[column_letter].width = adjusted_width
-    
-    # 4. 创建元数据信息工作表
-    ws_metadata = wb.create_sheet("元数据信息")
-    metadata = data['metadata']
-    
-    metadata_info = [
-        ['数据库描述', metadata['description']],
-        ['版本', metadata['version']],
-        ['最后更新时间', metadata['last_updated']],
-        ['坐标系统', metadata['coordinate_system']],
-        ['距离单位', metadata['units']['distance']],
-        ['重量单位', metadata['units']['weight']],
-        ['面积单位', metadata['units']['area']]
-    ]
-    
-    for row in metadata_info:
-        ws_metadata.append(row)
-    
-    # 设置元数据工作表样式
-    for row in ws_metadata.iter_rows():
-        row[0].font = Font(bold=True)
-        row[0].fill = PatternFill(start_color="E6E6FA", end_color="E6E6FA", fill_type="solid")
+            for category, items in warehouse['resources'].items():
+                category_name = RESOURCE_CATEGORY_NAMES.get(category, category)
+                for item_info in items.values():
+                    item_name = item_info['type']
+                    quantity = item_info['quantity']
+                    resource_row = [
+                        warehouse['id'], warehouse['name'], category_name,
+                        item_name, quantity, item_info['unit'], item_info['specification']
+                    ]
+                    ws_resources.append(resource_row)
+                    if columnar:
+                        columnar['inventory'].append(resource_row)
+                    
+                    # 按物资名称累加汇总
+                    summary = summary_data.get(item_name)
+                    if summary is None:
+                        summary = summary_data[item_name] = [item_name, category_name, 0, item_info['unit']]
+                    summary[2] += quantity
+        
+        for row in sorted(summary_data.values(), key=lambda summary: (summary[1], summary[0])):
+            ws_summary.append(row)
+            if columnar:
+                columnar['summary'].append(row)
+        
+        # 4. 元数据信息
+        if callable(metadata):
+            metadata = metadata()
+        ws_metadata = writer.add_sheet("元数据信息", widths={1: 20, 2: 40})
+        for row in [
+            ['数据库描述', metadata['description']],
+            ['版本', metadata['version']],
+            ['最后更新时间', metadata['last_updated']],
+            ['坐标系统', metadata['coordinate_system']],
+            ['距离单位', metadata['units']['distance']],
+            ['重量单位', metadata['units']['weight']],
+            ['面积单位', metadata['units']['area']]
+        ]:
+            ws_metadata.append(row, first_cell_style=STYLE_KEY)
+        
+        # 5. 仓库间距离（可选）
+        if distances:
+            ws_distances = writer.add_sheet("仓库间距离", max_width=30)
+            ws_distances.append(DISTANCE_HEADER, style=STYLE_HEADER)
+            for dist in distances:
+                distance_row = [
+                    dist['from_id'], dist['from_warehouse'], dist['to_id'], dist['to_warehouse'],
+                    dist['distance'], dist['duration'], dist['distance_km'], dist['duration_min'],
+                    '成功' if dist['success'] else '失败', dist['attempts']
+                ]
+                ws_distances.append(distance_row)
+                if columnar:
+                    columnar['distances'].append(distance_row)
+        
+        sheet_count = len(writer.sheets)
+    
+    if columnar:
+        from utils.columnar import write_resource_metadata
+        for table_writer in columnar.values():
+            table_writer.close()
+        write_resource_metadata(columnar_dir, metadata)
+    
+    return {
+        'warehouses': warehouse_count,
+        'resources': ws_resources.row_count - 1,
+        'resource_types': len(summary_data),
+        'sheets': sheet_count
+    }
+
+def print_conversion_stats(stats):
+    """打印转换统计信息"""
+    print(f"\n转换统计:")
+    print(f"- 仓库数量: {stats['warehouses']}")
+    print(f"- 物资条目总数: {stats['resources']}")
+    print(f"- 物资种类数: {stats['resource_types']}")
+    print(f"- 工作表数量: {stats['sheets']}")
+
+def convert_json_to_xlsx(json_file_path, xlsx_file_path, columnar_dir=None):
+    """
+    将JSON格式的仓库数据转换为Excel格式
     
-    ws_metadata.column_dimensions['A'].width = 20
-    ws_metadata.column_dimensions['B'].width = 40
+    按仓库逐个流式读取JSON，读取和写出在同一遍中完成，峰值内存与库存规模无关；
+    指定columnar_dir时同时写出列式数据
+    """
+    from utils.json_stream import StreamingResourceJson
     
-    # 保存Excel文件
-    wb.save(xlsx_file_path)
+    source = StreamingResourceJson(json_file_path)
+    stats = write_warehouse_xlsx(source.warehouses(), lambda: source.metadata, xlsx_file_path,
+                                 columnar_dir=columnar_dir)
     print(f"转换完成！Excel文件已保存到: {xlsx_file_path}")
+    if columnar_dir:
+        print(f"列式数据已保存到: {columnar_dir}")
     
     # 打印统计信息
-    print(f"\n转换统计:")
-    print(f"- 仓库数量: {len(data['warehouses'])}")
-    print(f"- 物资条目总数: {len(resources_data)}")
-    print(f"- 物资种类数: {len(summary_data)}")
-    print(f"- 工作表数量: {len(wb.worksheets)}")
+    print_conversion_stats(stats)
+    return stats
 
 if __name__=="__main__":
     warehouse_data = read_warehouse_data_from_xlsx("e:/proj_lab/Emergency_Agent/data/resource.xlsx")
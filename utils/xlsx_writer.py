@@ -0,0 +1,258 @@
+import math
+import tempfile
+import zipfile
+from typing import Dict, Iterable, List, Optional, Sequence
+from xml.sax.saxutils import escape
+
+# 样式编号（对应 _STYLES_XML 中 cellXfs 的顺序）
+STYLE_DEFAULT = 0
+STYLE_HEADER = 1  # 标题行：白色粗体、深蓝底色、居中
+STYLE_KEY = 2     # 元数据键列：粗体、浅紫底色
+
+# 文本转义表：XML特殊字符替换为实体，XML 1.0 不允许的控制字符直接删除（一次translate完成）
+_XML_TEXT_TABLE = {ord('&'): '&amp;', ord('<'): '&lt;', ord('>'): '&gt;'}
+_XML_TEXT_TABLE.update({code: None for code in [*range(0x00, 0x09), 0x0b, 0x0c, *range(0x0e, 0x20)]})
+
+_CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{sheets}'
+    '</Types>'
+)
+
+_ROOT_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="3">'
+    '<font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><color rgb="FFFFFFFF"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font>'
+    '</fonts>'
+    '<fills count="4">'
+    '<fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="00366092"/><bgColor rgb="00366092"/></patternFill></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="00E6E6FA"/><bgColor rgb="00E6E6FA"/></patternFill></fill>'
+    '</fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="3">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="2" borderId="0" xfId="0" applyFont="1" applyFill="1" applyAlignment="1">'
+    '<alignment horizontal="center"/></xf>'
+    '<xf numFmtId="0" fontId="2" fillId="3" borderId="0" xfId="0" applyFont="1" applyFill="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+def column_letter(index: int) -> str:
+    """列号（从1开始）转换为Excel列字母"""
+    letters = ''
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def _cell_xml(reference: str, value, text: str, style_attr: str) -> str:
+    """单元格XML，None/NaN返回空字符串；text为 str(value)"""
+    value_type = type(value)
+    if value_type is str:
+        return (f'<c r="{reference}" t="inlineStr"{style_attr}><is><t xml:space="preserve">'
+                f'{text.translate(_XML_TEXT_TABLE)}</t></is></c>')
+    if value_type is int:
+        return f'<c r="{reference}"{style_attr}><v>{text}</v></c>'
+    if value is None:
+        return ''
+    if value_type is bool:
+        return f'<c r="{reference}" t="b"{style_attr}><v>{int(value)}</v></c>'
+    if hasattr(value, 'item'):
+        # numpy/pandas 标量
+        value = value.item()
+        text = str(value)
+        if type(value) is str:
+            return _cell_xml(reference, value, text, style_attr)
+    if isinstance(value, (int, float)):
+        if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+            return ''
+        return f'<c r="{reference}"{style_attr}><v>{text}</v></c>'
+    return (f'<c r="{reference}" t="inlineStr"{style_attr}><is><t xml:space="preserve">'
+            f'{text.translate(_XML_TEXT_TABLE)}</t></is></c>')
+
+class StreamingSheet:
+    """只追加的工作表：行XML直接写入临时文件，同时记录每列的最大宽度"""
+
+    def __init__(self, title: str, max_width: Optional[int] = 50, widths: Optional[Dict[int, float]] = None):
+        self.title = title
+        self.max_width = max_width
+        self.fixed_widths = dict(widths or {})
+        self.column_lengths: List[int] = []
+        self._letters: List[str] = []
+        self.row_count = 0
+        self._buffer = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+
+    def append(self, values: Sequence, style: int = STYLE_DEFAULT, first_cell_style: Optional[int] = None):
+        """追加一行
+
+        Args:
+            style: 整行的样式编号
+            first_cell_style: 可选，只作用于第一列的样式编号（如元数据键列）
+        """
+        self.row_count += 1
+        row = self.row_count
+        lengths = self.column_lengths
+        letters = self._letters
+        style_attr = f' s="{style}"' if style else ''
+        cells = []
+        for column, value in enumerate(values):
+            if column >= len(lengths):
+                lengths.append(0)
+                letters.append(column_letter(column + 1))
+            # 与原先按 str(cell.value) 计算列宽的规则一致
+            text = str(value)
+            if len(text) > lengths[column]:
+                lengths[column] = len(text)
+            if column == 0 and first_cell_style is not None:
+                cell_style_attr = f' s="{first_cell_style}"' if first_cell_style else ''
+            else:
+                cell_style_attr = style_attr
+            cells.append(_cell_xml(f"{letters[column]}{row}", value, text, cell_style_attr))
+        self._buffer.write(f'<row r="{row}">{"".join(cells)}</row>')
+
+    def column_widths(self) -> Dict[int, float]:
+        """列宽：固定宽度优先，其余为 最大长度+2（不超过max_width）"""
+        widths = {}
+        for column, length in enumerate(self.column_lengths, 1):
+            width = length + 2
+            widths[column] = min(width, self.max_width) if self.max_width else width
+        widths.update(self.fixed_widths)
+        return widths
+
+    def write_to(self, out):
+        """写出完整的工作表XML（列宽在所有行写完后才确定，因此最后拼接）"""
+        out.write(
+            b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        )
+        widths = self.column_widths()
+        if widths:
+            cols = ''.join(
+                f'<col min="{column}" max="{column}" width="{width}" customWidth="1"/>'
+                for column, width in sorted(widths.items())
+            )
+            out.write(f'<cols>{cols}</cols>'.encode('utf-8'))
+        out.write(b'<sheetData>')
+        self._buffer.seek(0)
+        while True:
+            chunk = self._buffer.read(1 << 20)
+            if not chunk:
+                break
+            out.write(chunk.encode('utf-8'))
+        out.write(b'</sheetData></worksheet>')
+
+    def close(self):
+        self._buffer.close()
+
+class StreamingXlsxWriter:
+    """流式xlsx写出器：内存占用与行数无关，列宽在写行的同一遍中统计
+
+    用法：
+        with StreamingXlsxWriter(path) as writer:
+            sheet = writer.add_sheet("工作表", max_width=50)
+            sheet.append(header, style=STYLE_HEADER)
+            for row in rows:
+                sheet.append(row)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sheets: List[StreamingSheet] = []
+
+    def add_sheet(self, title: str, max_width: Optional[int] = 50,
+                  widths: Optional[Dict[int, float]] = None) -> StreamingSheet:
+        sheet = StreamingSheet(title, max_width=max_width, widths=widths)
+        self.sheets.append(sheet)
+        return sheet
+
+    def save(self):
+        """写出xlsx文件"""
+        sheet_overrides = ''.join(
+            f'<Override PartName="/xl/worksheets/sheet{index}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for index in range(1, len(self.sheets) + 1)
+        )
+        titles = [escape(sheet.title, {'"': '&quot;'}) for sheet in self.sheets]
+        workbook_sheets = ''.join(
+            f'<sheet name="{title}" sheetId="{index}" r:id="rId{index}"/>'
+            for index, title in enumerate(titles, 1)
+        )
+        workbook_rels = ''.join(
+            f'<Relationship Id="rId{index}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            f'Target="worksheets/sheet{index}.xml"/>'
+            for index in range(1, len(self.sheets) + 1)
+        )
+        styles_id = len(self.sheets) + 1
+
+        with zipfile.ZipFile(self.path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('[Content_Types].xml', _CONTENT_TYPES_XML.format(sheets=sheet_overrides))
+            archive.writestr('_rels/.rels', _ROOT_RELS_XML)
+            archive.writestr(
+                'xl/workbook.xml',
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+                f'<sheets>{workbook_sheets}</sheets></workbook>'
+            )
+            archive.writestr(
+                'xl/_rels/workbook.xml.rels',
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                f'{workbook_rels}'
+                f'<Relationship Id="rId{styles_id}" '
+                'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+                'Target="styles.xml"/>'
+                '</Relationships>'
+            )
+            archive.writestr('xl/styles.xml', _STYLES_XML)
+            for index, sheet in enumerate(self.sheets, 1):
+                with archive.open(f'xl/worksheets/sheet{index}.xml', 'w', force_zip64=True) as out:
+                    sheet.write_to(out)
+
+    def close(self):
+        for sheet in self.sheets:
+            sheet.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.save()
+        finally:
+            self.close()
+
+def write_table(writer: StreamingXlsxWriter, title: str, header: Sequence[str], rows: Iterable[Sequence],
+                max_width: Optional[int] = 50) -> StreamingSheet:
+    """写出带标题行样式的表格"""
+    sheet = writer.add_sheet(title, max_width=max_width)
+    sheet.append(header, style=STYLE_HEADER)
+    for row in rows:
+        sheet.append(row)
+    return sheet